@@ -324,6 +324,60 @@ DECLARE
 
 COMMENT ON FUNCTION public.claim_next_scraper_job(worker_type_filter text) IS 'Atomically claims the next pending or initializing scraper job for a given worker type. It selects, locks, updates the job status, and then returns the claimed job''s details including the competitor_id from the associated scraper. Uses FOR UPDATE SKIP LOCKED for improved concurrency.';
 
+--
+-- Name: claim_scraper_jobs(text, integer); Type: FUNCTION; Schema: public; Owner: -
+--
+
+CREATE FUNCTION public.claim_scraper_jobs(worker_type_filter text, max_jobs integer DEFAULT 1) RETURNS TABLE(id uuid, created_at timestamp with time zone, scraper_id uuid, user_id uuid, status text, is_test_run boolean, fetched_competitor_id uuid)
+    LANGUAGE plpgsql
+    AS $$
+BEGIN
+  -- Lock up to max_jobs runnable jobs, skipping rows other workers are claiming,
+  -- and mark them running in the same statement.
+  RETURN QUERY
+  WITH candidate_jobs AS (
+    SELECT sr_inner.id
+    FROM scraper_runs sr_inner
+    JOIN scrapers s_inner ON s_inner.id = sr_inner.scraper_id
+    WHERE sr_inner.status IN ('pending', 'initializing')
+      AND COALESCE(s_inner.scraper_type, 'python') = worker_type_filter
+    ORDER BY
+      CASE WHEN sr_inner.status = 'initializing' THEN 0 ELSE 1 END, -- Prioritize 'initializing' jobs
+      sr_inner.created_at                                           -- Then oldest jobs first
+    LIMIT GREATEST(max_jobs, 1)
+    FOR UPDATE OF sr_inner SKIP LOCKED
+  ),
+  claimed_jobs AS (
+    UPDATE scraper_runs sr_update
+    SET
+      status = 'running',
+      started_at = NOW(),
+      claimed_by_worker_at = NOW(),
+      error_message = NULL -- Clear any info messages when worker claims the job
+    FROM candidate_jobs cj
+    WHERE sr_update.id = cj.id
+    RETURNING sr_update.id, sr_update.created_at, sr_update.scraper_id, sr_update.user_id, sr_update.status, sr_update.is_test_run
+  )
+  SELECT
+    cl.id,
+    cl.created_at,
+    cl.scraper_id,
+    cl.user_id,
+    CAST(cl.status AS TEXT),
+    cl.is_test_run,
+    s.competitor_id AS fetched_competitor_id
+  FROM claimed_jobs cl
+  JOIN scrapers s ON s.id = cl.scraper_id
+  ORDER BY cl.created_at;
+END;
+$$;
+
+--
+-- Name: FUNCTION claim_scraper_jobs(worker_type_filter text, max_jobs integer); Type: COMMENT; Schema: public; Owner: -
+--
+
+COMMENT ON FUNCTION public.claim_scraper_jobs(worker_type_filter text, max_jobs integer) IS 'Atomically claims up to max_jobs pending or initializing scraper jobs whose scraper matches the given worker type, in a single statement. Uses FOR UPDATE SKIP LOCKED so concurrent workers claim disjoint sets instead of contending for the oldest row.';
+
 --
 -- Name: cleanup_old_debug_logs(); Type: FUNCTION; Schema: public; Owner: -
 --
@@ -1676,6 +1730,32 @@ BEGIN
 
 COMMENT ON FUNCTION public.normalize_sku(sku text) IS 'Normalizes SKU by removing separators and converting to uppercase. Used for fuzzy SKU matching.';
 
+--
+-- Name: notify_pending_scraper_run(); Type: FUNCTION; Schema: public; Owner: -
+--
+
+CREATE FUNCTION public.notify_pending_scraper_run() RETURNS trigger
+    LANGUAGE plpgsql
+    AS $$
+BEGIN
+  -- Wake up listening workers when a run is queued or re-queued
+  IF NEW.status IN ('pending', 'initializing')
+     AND (TG_OP = 'INSERT' OR OLD.status IS DISTINCT FROM NEW.status) THEN
+    PERFORM pg_notify(
+      'scraper_run_pending',
+      json_build_object('id', NEW.id, 'scraper_type', NEW.scraper_type)::text
+    );
+  END IF;
+  RETURN NEW;
+END;
+$$;
+
+--
+-- Name: FUNCTION notify_pending_scraper_run(); Type: COMMENT; Schema: public; Owner: -
+--
+
+COMMENT ON FUNCTION public.notify_pending_scraper_run() IS 'Sends a scraper_run_pending notification when a scraper run enters pending or initializing, so workers can pick it up without polling.';
+
 --
 -- Name: optimize_scraper_schedules(); Type: FUNCTION; Schema: public; Owner: -
 --
@@ -2432,6 +2512,12 @@ CREATE TRIGGER trigger_update_conversation_timestamp AFTER INSERT ON public.supp
 
 CREATE TRIGGER update_professional_scraper_requests_updated_at BEFORE UPDATE ON public.professional_scraper_requests FOR EACH ROW EXECUTE FUNCTION public.update_updated_at_column();
 
+--
+-- Name: scraper_runs notify_pending_scraper_run_trigger; Type: TRIGGER; Schema: public; Owner: -
+--
+
+CREATE TRIGGER notify_pending_scraper_run_trigger AFTER INSERT OR UPDATE OF status ON public.scraper_runs FOR EACH ROW EXECUTE FUNCTION public.notify_pending_scraper_run();
+
 --
 -- Name: scraper_runs update_scraper_status_trigger; Type: TRIGGER; Schema: public; Owner: -
 --
@@ -21,11 +21,15 @@ For reliability, define all constants *inside* each function that uses them,
 rather than at the global scope. This prevents "name not defined" errors.
 """
 
+import os # For the worker's progress and control channels
 import json
 import sys # For stderr/stdout
 import argparse # For command-line arguments
 import traceback # For error reporting
-from typing import Dict, List, Any, Optional
+import threading # For the per-host throttles shared by concurrent fetches
+import time
+import itertools # For capping the streamed product URLs on test runs
+from typing import Dict, Iterable, List, Any, Optional, Tuple
 # Add necessary imports for your scraper here, e.g.:
 # from bs4 import BeautifulSoup
 # Note: requests is imported in the fetch_page function
@@ -39,23 +43,456 @@ def log_progress(message: str, phase: int = None):
         message: The progress message to log
         phase: Optional phase number (1 for URL collection, 2 for product processing)
     """
+    # One write per line, so lines from concurrent fetch threads never interleave
     if phase is not None:
-        print(f"PROGRESS: Phase {phase}: {message}", file=sys.stderr, flush=True)
+        sys.stderr.write(f"PROGRESS: Phase {phase}: {message}\n")
     else:
-        print(f"PROGRESS: {message}", file=sys.stderr, flush=True)
+        sys.stderr.write(f"PROGRESS: {message}\n")
+    sys.stderr.flush()
 
 def log_error(message: str, exc_info=False):
     """Prints an error message to stderr."""
-    print(f"ERROR: {message}", file=sys.stderr, flush=True)
-    if exc_info:
-        print(traceback.format_exc(), file=sys.stderr, flush=True)
+    sys.stderr.write(f"ERROR: {message}\n" + (traceback.format_exc() + "\n" if exc_info else ""))
+    sys.stderr.flush()
+
+def report_progress(phase: int, current: int, total: int, products: Optional[int] = None, message: Optional[str] = None):
+    """Reports machine-readable progress (current/total) to the worker.
+
+    The worker hands the script a progress channel and names its fd in
+    PRICETRACKER_PROGRESS_FD; each call writes one JSON frame to it. Use this
+    for progress counts and log_progress() for free text, so messages like
+    "attempt 1/3" are never mistaken for progress. Without a channel (e.g.
+    when run by hand) it falls back to a PROGRESS line on stderr.
+
+    Args:
+        phase: Phase number (1 for URL collection, 2 for product processing)
+        current: Items done so far in this phase
+        total: Total items in this phase
+        products: Optional number of products output so far
+        message: Optional human-readable message
+    """
+    frame = {"phase": phase, "current": current, "total": total}
+    if products is not None:
+        frame["products"] = products
+    if message:
+        frame["message"] = message
+    if not send_progress_frame(frame):
+        log_progress(f"{message} ({current}/{total})" if message else f"{current}/{total}", phase=phase)
+
+def send_progress_frame(frame: Dict[str, Any]) -> bool:
+    """Writes one JSON frame to the worker's progress channel. Returns False if there is none."""
+    if not hasattr(send_progress_frame, "channel"):
+        send_progress_frame.channel = None
+        progress_fd = os.environ.get("PRICETRACKER_PROGRESS_FD")
+        if progress_fd:
+            try:
+                send_progress_frame.channel = os.fdopen(int(progress_fd), "w", encoding="utf-8", buffering=1)
+            except (OSError, ValueError):
+                pass
+    if send_progress_frame.channel is not None:
+        try:
+            send_progress_frame.channel.write(json.dumps(frame) + "\n")
+            return True
+        except OSError:
+            send_progress_frame.channel = None
+    return False
+
+def should_stop() -> bool:
+    """Returns True once the worker has asked the scraper to stop.
+
+    The worker hands the script a control channel and names its fd in
+    PRICETRACKER_CONTROL_FD. It sends a stop command when it needs no more
+    products from this run: the product limit is reached, or every own product
+    has been found. Check this in your crawl loops and finish normally when it
+    returns True; the worker kills scripts that keep going. Without a channel
+    (e.g. when run by hand) it always returns False.
+    """
+    if getattr(should_stop, "stopped", False):
+        return True
+    if not hasattr(should_stop, "channel"):
+        should_stop.channel = None
+        control_fd = os.environ.get("PRICETRACKER_CONTROL_FD")
+        if control_fd:
+            try:
+                should_stop.channel = int(control_fd)
+                os.set_blocking(should_stop.channel, False)
+            except (OSError, ValueError):
+                should_stop.channel = None
+    if should_stop.channel is None:
+        return False
+    try:
+        os.read(should_stop.channel, 4096)
+    except BlockingIOError:
+        return False # Nothing sent yet
+    except OSError:
+        should_stop.channel = None
+        return False
+    # A command, or EOF because the worker closed its end: either way, stop
+    should_stop.stopped = True
+    return True
 
 # --- Helper Functions ---
 # Define any helper functions needed for fetching, parsing, data extraction, etc.
 # Ensure they use log_progress and log_error for output.
 
+class HostThrottle:
+    """Adaptive politeness for one host: an AIMD concurrency window plus, once needed, a token bucket.
+
+    A new host gets the caller's full per-host concurrency (max_concurrency) and no
+    rate limit beyond max_rate, so polite sites are crawled at full speed. The
+    first time the host pushes back - a 429 or 503, a high error rate, or latency
+    well above its recent norm - the window is halved and a token bucket starts at
+    half the rate the host was serving. From then on growth is additive: about +1
+    request/second each second, and +1 concurrent request per window of responses,
+    and each further push back halves both again (at most once per cooldown). A
+    Retry-After header pauses the host entirely. Decisions are logged and sent to
+    the worker as progress frames.
+    """
+    MIN_RATE = 0.2  # requests/second
+    LATENCY_FACTOR = 2.0  # Recent latency this many times the long-run average counts as congestion
+    ERROR_RATE_LIMIT = 0.25  # Share of recent requests failing with a connection error or 5xx
+    MAX_RETRY_AFTER = 300.0  # Longest pause honored from a Retry-After header
+
+    def __init__(self, host: str, max_concurrency: int = 16, max_rate: Optional[float] = None):
+        self.host = host
+        self.max_concurrency = max_concurrency
+        self.max_rate = max_rate  # Requests/second ceiling, None for no ceiling
+        self.window = None  # Concurrency window, None (max_concurrency) until the host first pushes back
+        self.rate = None  # Token bucket rate, None (max_rate) until the host first pushes back
+        self._cond = threading.Condition()
+        self._tokens = 1.0
+        self._refilled = time.monotonic()
+        self._in_flight = 0
+        self._paused_until = 0.0
+        self._cooldown_until = 0.0
+        self._latency_fast = None  # EWMAs of response latency in seconds
+        self._latency_slow = None
+        self._samples = 0
+        self._error_rate = 0.0
+
+    def set_limits(self, max_concurrency: int, max_rate: Optional[float]) -> Tuple[int, Optional[float]]:
+        """Changes the caps of this host; returns the previous (max_concurrency, max_rate) for restoring them."""
+        with self._cond:
+            previous = (self.max_concurrency, self.max_rate)
+            self.max_concurrency, self.max_rate = max_concurrency, max_rate
+            self._cond.notify_all()  # A raised cap may let waiting requests through
+        return previous
+
+    def limit(self) -> int:
+        """Requests currently allowed in flight to this host."""
+        if self.window is None:
+            return max(1, self.max_concurrency)
+        return max(1, min(self.max_concurrency, int(self.window)))
+
+    def current_rate(self) -> Optional[float]:
+        """Requests/second currently allowed to this host, or None when unbounded."""
+        if self.rate is None:
+            return self.max_rate
+        return self.rate if self.max_rate is None else min(self.rate, self.max_rate)
+
+    def acquire(self):
+        """Blocks until the host may receive another request."""
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                rate = self.current_rate()
+                wait = self._paused_until - now
+                if wait <= 0 and self._in_flight < self.limit():
+                    if rate is None:
+                        self._in_flight += 1
+                        return
+                    self._tokens = min(max(1.0, rate), self._tokens + (now - self._refilled) * rate)
+                    self._refilled = now
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        self._in_flight += 1
+                        return
+                    wait = (1 - self._tokens) / rate
+                # Without a timeout, a release() wakes us when a slot frees up
+                self._cond.wait(timeout=wait if wait > 0 else None)
+
+    def release(self, status: Optional[int], latency: Optional[float], retry_after: Optional[float] = None):
+        """Records how a request went: status is None for connection errors and timeouts."""
+        decision = None
+        with self._cond:
+            self._in_flight -= 1
+            now = time.monotonic()
+            failed = status is None or status >= 500
+            self._error_rate += ((1.0 if failed else 0.0) - self._error_rate) * 0.2
+            if status is not None and latency is not None:
+                self._samples += 1
+                self._latency_fast = latency if self._latency_fast is None else self._latency_fast + (latency - self._latency_fast) * 0.3
+                self._latency_slow = latency if self._latency_slow is None else self._latency_slow + (latency - self._latency_slow) * 0.02
+            if retry_after:
+                self._paused_until = max(self._paused_until, now + min(retry_after, self.MAX_RETRY_AFTER))
+
+            reason = None
+            if status in (429, 503):
+                reason = f"HTTP {status}"
+            elif self._error_rate > self.ERROR_RATE_LIMIT:
+                reason = f"error rate {self._error_rate:.0%}"
+            elif self._samples >= 10 and self._latency_fast > self.LATENCY_FACTOR * self._latency_slow:
+                reason = f"latency {self._latency_fast * 1000:.0f} ms vs {self._latency_slow * 1000:.0f} ms usual"
+
+            if reason is not None:
+                if now >= self._cooldown_until:
+                    # Multiplicative decrease, once per cooldown so a burst of failures in flight counts once
+                    rate = self.current_rate()
+                    if rate is None:
+                        # First push back: start the bucket from what the host was serving (window / latency)
+                        rate = self.limit() / max(self._latency_fast or 1.0, 0.001)
+                    self.window = max(1.0, self.limit() / 2)
+                    self.rate = max(self.MIN_RATE, rate / 2)
+                    self._tokens = min(self._tokens, 1.0)
+                    self._refilled = now
+                    self._cooldown_until = now + max(1.0, self._latency_fast or 0.0)
+                    decision = ("decrease", reason)
+            elif not failed and self.window is not None:
+                # Additive increase, only while recovering from a push back
+                previous_limit = self.limit()
+                self.window = min(float(self.max_concurrency), self.window + 1 / self.window)
+                self.rate += 1 / self.rate
+                if self.max_rate is not None:
+                    self.rate = min(self.rate, self.max_rate)
+                if self.limit() > previous_limit:
+                    decision = ("increase", "healthy")
+            self._cond.notify_all()
+
+        if decision is not None:
+            rate = self.current_rate()
+            frame = {"host": self.host, "action": decision[0], "reason": decision[1], "concurrency": self.limit(),
+                     "rate": round(rate, 2) if rate is not None else None,
+                     "retry_after": round(retry_after, 1) if retry_after else None}
+            rate_text = f"{frame['rate']} req/s" if rate is not None else "unlimited req/s"
+            log_progress(f"Throttle {self.host}: {decision[0]} to {frame['concurrency']} concurrent, {rate_text} ({decision[1]})")
+            send_progress_frame({"throttle": frame})
+
+def get_host_throttle(host: str) -> HostThrottle:
+    """Returns the HostThrottle shared by all requests of this run to host."""
+    if not hasattr(get_host_throttle, "throttles"):
+        get_host_throttle.throttles = {}
+        get_host_throttle.lock = threading.Lock()
+    with get_host_throttle.lock:
+        if host not in get_host_throttle.throttles:
+            get_host_throttle.throttles[host] = HostThrottle(host)
+        return get_host_throttle.throttles[host]
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait from a Retry-After header (delay in seconds or an HTTP date), or None."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        from email.utils import parsedate_to_datetime
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError, IndexError, OverflowError):
+        return None
+
+class HttpCache:
+    """Pages of earlier runs of this scraper, revalidated with conditional requests.
+
+    Stores each page's ETag/Last-Modified and its zlib-compressed body in a SQLite
+    file. fetch_page sends If-None-Match/If-Modified-Since for cached pages and,
+    on 304 Not Modified, decodes the stored body exactly as it would a fresh one.
+    Least recently used pages are dropped beyond max_bytes. The worker enables it
+    by naming the file in PRICETRACKER_HTTP_CACHE (one file per scraper).
+    """
+
+    def __init__(self, path: str, max_bytes: int):
+        import sqlite3
+        self.max_bytes = max_bytes
+        self.hits = 0  # 304s served from the cache
+        self.misses = 0  # Full downloads
+        self.bytes_saved = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS pages (
+                url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT,
+                body BLOB NOT NULL, size INTEGER NOT NULL, last_used REAL NOT NULL
+            )""")
+        self._db.commit()
+
+    def get(self, url: str):
+        """Returns (etag, last_modified, body bytes) of a cached page, or None."""
+        import zlib
+        with self._lock:
+            row = self._db.execute("SELECT etag, last_modified, body FROM pages WHERE url = ?", (url,)).fetchone()
+        if row is None:
+            return None
+        return row[0], row[1], zlib.decompress(row[2])
+
+    def touch(self, url: str, size: int):
+        """Records a 304 for url."""
+        with self._lock:
+            self.hits += 1
+            self.bytes_saved += size
+            self._db.execute("UPDATE pages SET last_used = ? WHERE url = ?", (time.time(), url))
+            self._db.commit()
+
+    def store(self, url: str, response):
+        """Keeps a 200 response if it carries a validator; otherwise forgets the page."""
+        import zlib
+        etag, last_modified = response.headers.get('ETag'), response.headers.get('Last-Modified')
+        with self._lock:
+            self.misses += 1
+            if not etag and not last_modified:
+                self._db.execute("DELETE FROM pages WHERE url = ?", (url,))
+            else:
+                body = zlib.compress(response.content, 6)
+                self._db.execute("INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?)",
+                                 (url, etag, last_modified, body, len(body), time.time()))
+                self._evict()
+            self._db.commit()
+
+    def _evict(self):
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM pages").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Drop least recently used pages down to 90% of the bound
+        excess = total - int(self.max_bytes * 0.9)
+        for url, size in self._db.execute("SELECT url, size FROM pages ORDER BY last_used").fetchall():
+            if excess <= 0:
+                break
+            self._db.execute("DELETE FROM pages WHERE url = ?", (url,))
+            excess -= size
+
+def get_http_cache() -> Optional[HttpCache]:
+    """Returns the run's HttpCache, or None when the worker did not enable one."""
+    if not hasattr(get_http_cache, "cache"):
+        get_http_cache.cache = None
+        path = os.environ.get("PRICETRACKER_HTTP_CACHE")
+        if path:
+            try:
+                max_mb = float(os.environ.get("PRICETRACKER_HTTP_CACHE_MAX_MB", "200"))
+                get_http_cache.cache = HttpCache(path, int(max_mb * 1024 * 1024))
+            except Exception as e:
+                log_error(f"HTTP cache unavailable, fetching without it: {e}")
+    return get_http_cache.cache
+
+def get_http_client(pool_connections: int = 10, pool_maxsize: int = 10, max_retries: int = 3, backoff_factor: float = 0.5):
+    """Returns the run's shared requests.Session, creating it on first use.
+
+    Keeping one session for the whole run means keep-alive connections (and their
+    TLS sessions) are reused for every request to the same host, instead of a new
+    TCP+TLS handshake per page. Connections are pooled per host: up to
+    pool_connections hosts are kept, with up to pool_maxsize open connections each
+    (raise it when fetching concurrently). Connection errors and 500/502/504
+    responses are retried max_retries times with exponential backoff; 429 and 503
+    are left to fetch_page and the host's HostThrottle. Arguments only take
+    effect on the first call; use http_stats() for connection reuse and timings.
+    """
+    if getattr(get_http_client, "session", None) is not None:
+        return get_http_client.session
+
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+
+    session = requests.Session()
+    retries = Retry(
+        total=max_retries,
+        backoff_factor=backoff_factor,  # Exponential backoff
+        status_forcelist=[500, 502, 504],  # Retry on these status codes; 429/503 must reach the HostThrottle
+        allowed_methods=["GET", "POST"]  # Allow retries for these methods
+    )
+    # Counts of host pools that were evicted or closed, plus time to first byte of every response
+    stats = {"requests": 0, "connections": 0, "responses": 0, "ttfb_seconds": 0.0}
+    stats_lock = threading.Lock()  # Fetch threads update stats concurrently
+    adapters = []
+    for prefix in ('http://', 'https://'):
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=retries)
+        pools = adapter.poolmanager.pools
+        def count_and_dispose(pool, dispose=pools.dispose_func):
+            with stats_lock:
+                stats["requests"] += pool.num_requests
+                stats["connections"] += pool.num_connections
+            if dispose:
+                dispose(pool)
+        pools.dispose_func = count_and_dispose
+        session.mount(prefix, adapter)
+        adapters.append(adapter)
+
+    def record_ttfb(response, *args, **kwargs):
+        # elapsed runs from sending the request until the response headers were parsed
+        with stats_lock:
+            stats["responses"] += 1
+            stats["ttfb_seconds"] += response.elapsed.total_seconds()
+    session.hooks["response"].append(record_ttfb)
+
+    session.headers.update({
+        'User-Agent': USER_AGENT,
+        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+        'Accept-Language': 'en-US,en;q=0.5',
+        'Connection': 'keep-alive',
+        'Upgrade-Insecure-Requests': '1',
+        'Cache-Control': 'max-age=0'
+    })
+
+    get_http_client.session = session
+    get_http_client.adapters = adapters
+    get_http_client.stats = stats
+    get_http_client.stats_lock = stats_lock
+    return session
+
+def http_stats() -> Dict[str, Any]:
+    """Connection reuse and latency of the shared HTTP client so far in this run.
+
+    Returns requests sent, connections opened (each a TCP and, for https, TLS
+    handshake), requests that reused an open connection, and the mean time to
+    first byte in milliseconds. With the HTTP cache enabled, also pages served
+    from it (304), full downloads, the hit rate and the bytes not downloaded.
+    """
+    stats = getattr(get_http_client, "stats", None) or {"requests": 0, "connections": 0, "responses": 0, "ttfb_seconds": 0.0}
+    # Held over the live pools too, so a pool disposed meanwhile is counted exactly once
+    with getattr(get_http_client, "stats_lock", None) or threading.Lock():
+        requests_sent, connections = stats["requests"], stats["connections"]
+        responses, ttfb_seconds = stats["responses"], stats["ttfb_seconds"]
+        for adapter in getattr(get_http_client, "adapters", []):
+            pools = adapter.poolmanager.pools
+            for key in pools.keys():
+                pool = pools.get(key)
+                if pool is not None:
+                    requests_sent += pool.num_requests
+                    connections += pool.num_connections
+    result = {
+        "requests": requests_sent,
+        "connections": connections,
+        "reused": max(0, requests_sent - connections),
+        "mean_ttfb_ms": round(ttfb_seconds / responses * 1000, 1) if responses else None,
+    }
+    cache = getattr(get_http_cache, "cache", None)
+    if cache is not None:
+        with cache._lock:
+            hits, misses, bytes_saved = cache.hits, cache.misses, cache.bytes_saved
+        lookups = hits + misses
+        result.update(cache_hits=hits, cache_misses=misses, cache_bytes_saved=bytes_saved,
+                      cache_hit_rate=round(hits / lookups, 3) if lookups else None)
+    return result
+
+def report_http_stats():
+    """Logs http_stats() and hands them to the worker, which adds them to the run's stats."""
+    stats = http_stats()
+    log_progress(f"HTTP: {stats['requests']} requests over {stats['connections']} connections "
+                 f"({stats['reused']} reused), mean time to first byte {stats['mean_ttfb_ms']} ms")
+    if "cache_hits" in stats:
+        log_progress(f"HTTP cache: {stats['cache_hits']} pages unchanged (304), {stats['cache_misses']} downloaded, "
+                     f"hit rate {stats['cache_hit_rate']}")
+    send_progress_frame({"http": stats})
+
 def fetch_page(url: str, max_retries: int = 3, timeout: int = 15) -> Optional[str]:
-    """Fetches the content of a given URL with retry logic.
+    """Fetches the content of a given URL with retry logic, using the shared HTTP client.
+
+    Every attempt waits for the host's HostThrottle, which adapts request rate and
+    concurrency to how the site responds and honors Retry-After. With the worker's
+    HTTP cache enabled, pages from earlier runs are revalidated and a 304 returns
+    the same text as a full download would.
 
     Args:
         url: The URL to fetch
@@ -68,43 +505,45 @@ def fetch_page(url: str, max_retries: int = 3, timeout: int = 15) -> Optional[st
     Raises:
         RuntimeError: If critical errors occur and raise_errors=True
     """
-    USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-
     log_progress(f"Fetching URL: {url}")
 
     # Import requests inside the function to ensure it's available
     try:
         import requests
-        from requests.adapters import HTTPAdapter
-        from urllib3.util.retry import Retry
+        session = get_http_client()
     except ImportError as e:
         log_error(f"Failed to import required libraries for fetch_page: {e}")
         return None
 
-    # Create a session with retry logic
-    session = requests.Session()
-    retries = Retry(
-        total=max_retries,
-        backoff_factor=0.5,  # Exponential backoff
-        status_forcelist=[429, 500, 502, 503, 504],  # Retry on these status codes
-        allowed_methods=["GET", "POST"]  # Allow retries for these methods
-    )
-    session.mount('http://', HTTPAdapter(max_retries=retries))
-    session.mount('https://', HTTPAdapter(max_retries=retries))
-
-    headers = {
-        'User-Agent': USER_AGENT,
-        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-        'Accept-Language': 'en-US,en;q=0.5',
-        'Connection': 'keep-alive',
-        'Upgrade-Insecure-Requests': '1',
-        'Cache-Control': 'max-age=0'
-    }
+    from urllib.parse import urlsplit
+    throttle = get_host_throttle(urlsplit(url).hostname or "")
+    cache = get_http_cache()
+    cached = cache.get(url) if cache is not None else None
+    conditional_headers = {}
+    if cached is not None:
+        if cached[0]:
+            conditional_headers['If-None-Match'] = cached[0]
+        if cached[1]:
+            conditional_headers['If-Modified-Since'] = cached[1]
 
     for attempt in range(max_retries):
         try:
-            response = session.get(url, headers=headers, timeout=timeout)
+            throttle.acquire()
+            try:
+                response = session.get(url, headers=conditional_headers, timeout=timeout)
+            except Exception:
+                throttle.release(None, None)
+                raise
+            throttle.release(response.status_code, response.elapsed.total_seconds(),
+                             parse_retry_after(response.headers.get('Retry-After')))
+            if response.status_code == 304 and cached is not None:
+                cache.touch(url, len(cached[2]))
+                log_progress(f"Not modified since last run: {url}")
+                # Decoded like response.text with the forced UTF-8 encoding below
+                return str(cached[2], 'utf-8', errors='replace')
             response.raise_for_status()
+            if cache is not None and response.status_code == 200:
+                cache.store(url, response)
             # Explicitly set encoding to UTF-8 before accessing .text
             response.encoding = 'utf-8'
             log_progress(f"Successfully fetched {url} (attempt {attempt+1}/{max_retries})")
@@ -134,6 +573,90 @@ def fetch_page(url: str, max_retries: int = 3, timeout: int = 15) -> Optional[st
     log_error(f"All {max_retries} attempts to fetch {url} failed")
     return None
 
+def fetch_pages_concurrently(urls: Iterable[str], per_host: int = 4, host_limits: Optional[Dict[str, int]] = None,
+                             max_workers: int = 16, timeout: int = 15, max_rate: Optional[float] = None):
+    """Fetches pages with fetch_page() on a thread pool and yields (url, html) as each completes.
+
+    At most per_host requests run against one host at a time (host_limits overrides
+    it for individual host names) and at most max_workers overall, so fetches to a
+    competitor overlap without hammering it. Each host starts at that cap and its
+    HostThrottle lowers it (and rate-limits the host) once the host pushes back;
+    max_rate, if given, caps every host's requests/second. The caps are set once per
+    host and the host's previous ones are restored on return. Results come in
+    completion order, not in the order of urls; html is None when the fetch failed. The loop body runs on
+    the calling thread, so parsing, printing products and limit checks need no
+    locking. urls may be a generator (such as phase 1's collect_product_urls()): it
+    is read lazily, only as far ahead as keeps the pool busy, so the first pages are
+    fetched while it is still finding URLs. Call close() on the generator when
+    leaving the loop early: fetches that have not started are cancelled and urls is
+    closed too. Keep per_host within the pool_maxsize of
+    get_http_client() (10 by default) so every connection is kept alive.
+    """
+    from collections import deque
+    from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+    from urllib.parse import urlsplit
+
+    host_limits = host_limits or {}
+    url_iter = iter(urls)
+    exhausted = False
+    queued = 0
+    pending = {}  # host -> urls not started yet
+    running = {}  # host -> fetches in flight
+    in_flight = {}  # future -> (host, url)
+    throttles = {}  # host -> its HostThrottle, capped for this call
+    previous_limits = {}  # host -> caps the throttle had before this call
+
+    executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="fetch")
+    try:
+        while True:
+            # Start fetches while their host (as far as its HostThrottle allows) and the pool have room
+            for host in list(pending):
+                limit = throttles[host].limit()
+                while pending[host] and running[host] < limit and len(in_flight) < max_workers:
+                    url = pending[host].popleft()
+                    in_flight[executor.submit(fetch_page, url, timeout=timeout)] = (host, url)
+                    running[host] += 1
+                    queued -= 1
+                if not pending[host]:
+                    del pending[host]
+
+            # Hand over finished pages first, then read one more url, and only block when neither is possible.
+            # Read-ahead stops at twice the pool size so a slow host cannot make us drain urls.
+            done = {future for future in in_flight if future.done()}
+            if not done:
+                if not exhausted and queued < max_workers * 2:
+                    url = next(url_iter, None)
+                    if url is None:
+                        exhausted = True
+                    else:
+                        host = urlsplit(url).hostname or ""
+                        pending.setdefault(host, deque()).append(url)
+                        running.setdefault(host, 0)
+                        if host not in throttles:
+                            throttles[host] = get_host_throttle(host)
+                            previous_limits[host] = throttles[host].set_limits(max(1, host_limits.get(host, per_host)), max_rate)
+                        queued += 1
+                    continue
+                if not in_flight:
+                    break  # urls is exhausted and every page has been handed over
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                host, url = in_flight.pop(future)
+                running[host] -= 1
+                try:
+                    html = future.result()
+                except Exception as e:
+                    log_error(f"Error fetching {url}: {e}")
+                    html = None
+                yield url, html
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+        for host, (max_concurrency, host_max_rate) in previous_limits.items():
+            throttles[host].set_limits(max_concurrency, host_max_rate)  # Later fetch_page() calls get the host's own caps back
+        if hasattr(url_iter, "close"):
+            url_iter.close()  # Stops phase 1 from crawling for URLs nobody will fetch
+
 # --- Core Scraper Functions ---
 
 def get_metadata() -> Dict[str, Any]:
@@ -156,17 +679,69 @@ def get_metadata() -> Dict[str, Any]:
     }
     return metadata
 
+class UniqueUrls:
+    """Passes on each URL of an iterable once, in discovery order; count is how many were passed on."""
+
+    def __init__(self, urls):
+        self._urls = urls
+        self._seen = set()
+        self.count = 0
+
+    def __iter__(self):
+        import hashlib
+        for url in self._urls:
+            digest = hashlib.blake2b(url.encode('utf-8'), digest_size=8).digest()
+            if digest in self._seen:
+                continue
+            self._seen.add(digest)
+            self.count += 1
+            yield url
+
+def collect_product_urls(base_url: str):
+    """Phase 1: yields product URLs as the crawl finds them (replace the example logic).
+
+    Yield each product URL as soon as it is found rather than collecting them all
+    first: phase 2 fetches them while the crawl goes on, and stops the crawl
+    (by closing this generator) once the run needs no more products. Repeats are
+    fine, they are dropped by UniqueUrls.
+    """
+    # Example: Fetch initial page using our robust fetch_page function
+    try:
+        initial_html = fetch_page(base_url)
+        if not initial_html:
+            raise RuntimeError("Failed to fetch initial page - empty response")
+    except Exception as e:
+        log_error(f"Failed to fetch initial page: {e}")
+        sys.exit(1)  # Exit with error code
+
+    # Example: Find product links (replace with actual logic)
+    # In a real implementation, you might need to:
+    # 1. Parse the initial page to find category links
+    # 2. Visit each category page to find product links
+    # 3. Handle pagination on category pages
+    # This is just a dummy example
+    for i in range(1, 25):
+        if should_stop():
+            log_progress("Worker asked to stop, ending URL collection.", phase=1)
+            return
+        yield f"{base_url}/item{i}"
+        # Report progress during URL collection
+        if i % 5 == 0:
+            log_progress(f"Collecting URLs: {i} product URLs found so far...", phase=1)
+    log_progress("URL collection finished.", phase=1)
+
 def scrape(context: Dict[str, Any]):
     """
     Main scraping function. It should:
     1. Perform the scraping logic (fetching pages, parsing data).
     2. Apply filtering based on the provided context if necessary.
     3. Print one JSON object per valid product found to stdout.
-    4. Print progress and error messages to stderr using log_progress() and log_error().
+    4. Report progress counts with report_progress() and print messages and errors to stderr using log_progress() and log_error().
     IMPORTANT: Output one JSON object per product, per line (JSONL).
     """
     log_progress("Scrape function started.")
-    log_progress(f"Received context: {context}") # Be careful logging full context if it contains sensitive info
+    # Log a summary only: the context can hold every own product EAN/SKU of the user
+    log_progress(f"Received context for run {context.get('run_id', 'N/A')} ({len(context.get('own_product_eans') or [])} own product EANs)")
 
     # --- Import required libraries listed in get_metadata() HERE ---
     try:
@@ -186,6 +761,10 @@ def scrape(context: Dict[str, Any]):
     scrape_only_own_products = context.get('scrape_only_own_products', False)
     own_product_eans = set(context.get('own_product_eans', [])) if scrape_only_own_products else None
     own_product_sku_brands = context.get('own_product_sku_brands', []) if scrape_only_own_products else []
+    # Hashed lookups: a product check must not scan the whole own product list
+    own_product_sku_brand_keys = {(p.get('sku'), p.get('brand')) for p in own_product_sku_brands}
+    own_product_skus_of_active_brands = {p.get('sku') for p in own_product_sku_brands
+                                         if active_brand_ids and p.get('brand_id') in active_brand_ids}
 
     # --- Scraper Implementation ---
     # Replace this example logic with your actual scraping code.
@@ -194,72 +773,45 @@ def scrape(context: Dict[str, Any]):
     base_url = "https://example.com/products" # Get from metadata or define here
     log_progress(f"Starting scrape for base URL: {base_url}", phase=1)
 
-    # --- PHASE 1: URL Collection ---
-    log_progress("Collecting product URLs...", phase=1)
-
-    # Track URLs to avoid duplicates
-    product_urls = set()
-
-    # Example: Fetch initial page using our robust fetch_page function
-    try:
-        initial_html = fetch_page(base_url)
-        if not initial_html:
-            raise RuntimeError("Failed to fetch initial page - empty response")
-    except Exception as e:
-        log_error(f"Failed to fetch initial page: {e}")
-        sys.exit(1)  # Exit with error code
-
-    # Example: Find product links (replace with actual logic)
-    # In a real implementation, you might need to:
-    # 1. Parse the initial page to find category links
-    # 2. Visit each category page to find product links
-    # 3. Handle pagination on category pages
-
-    # IMPORTANT: Always use a set to avoid duplicate URLs
-    # This is just a dummy example
-    for i in range(1, 25):
-        product_url = f"{base_url}/item{i}"
-        # Only add if not already in the set
-        if product_url not in product_urls:
-            product_urls.add(product_url)
-            # Report progress during URL collection
-            if len(product_urls) % 5 == 0 or len(product_urls) == 24:
-                log_progress(f"Collecting URLs: {len(product_urls)} unique URLs found so far...", phase=1)
-
-    # Convert set to list for processing
-    product_links = list(product_urls)
-    log_progress(f"Found {len(product_links)} unique product URLs.", phase=1)
-
-    # --- PHASE 2: Product Processing ---
-    log_progress("Processing product pages...", phase=2)
+    # --- PHASE 1 -> PHASE 2: URL collection streams into product processing ---
+    # collect_product_urls() yields product URLs while it crawls, UniqueUrls drops repeats,
+    # and phase 2 starts fetching the first products before the category crawl is done.
+    log_progress("Collecting product URLs and processing product pages as they are found...", phase=1)
+    unique_links = UniqueUrls(collect_product_urls(base_url))
+    product_links = unique_links
 
     if is_test_run:
         log_progress("Test run detected, limiting to 5 products.", phase=2)
-        product_links = product_links[:5]
+        # Phase 1 stops as soon as 5 product URLs are found
+        product_links = itertools.islice(unique_links, 5)
 
     product_count = 0
     # Get limit from context. None means no limit.
     limit_products = context.get('limit_products')
 
-    total_links = len(product_links)
-    for i, link in enumerate(product_links):
+    # Pages are fetched concurrently (at most PER_HOST_CONCURRENCY at a time per site) and
+    # handed to the loop below one by one as they arrive, so parsing stays sequential
+    PER_HOST_CONCURRENCY = 4
+    product_pages = fetch_pages_concurrently(product_links, per_host=PER_HOST_CONCURRENCY)
+    processed_links = 0
+    for link, product_html in product_pages:
         # Apply limit only if it's explicitly set (not None)
         if limit_products is not None and product_count >= limit_products:
             log_progress(f"Reached product limit ({limit_products}), stopping.", phase=2)
             break
+        # The worker also enforces the limit and knows when every own product has been found
+        if should_stop():
+            log_progress("Worker asked to stop, ending the crawl.", phase=2)
+            break
 
+        processed_links += 1
         try:
-            # Report progress with current/total format
-            log_progress(f"Processing product {i+1}/{total_links}: {link}", phase=2)
-            # Example: Fetch product page with our robust fetch_page function
-            try:
-                product_html = fetch_page(link)
-                if not product_html:
-                    log_progress(f"Skipping product link due to empty response: {link}", phase=2)
-                    continue # Skip if fetch returned empty
-            except Exception as fetch_error:
-                log_error(f"Error fetching product page {link}: {fetch_error}")
-                continue # Skip this product and continue with the next
+            # Report progress with current/total counts; the total grows while phase 1 is still finding URLs
+            report_progress(2, processed_links, unique_links.count, products=product_count, message=f"Processing product: {link}")
+            # The page was fetched by fetch_pages_concurrently (with fetch_page's retries)
+            if not product_html:
+                log_progress(f"Skipping product link due to empty response: {link}", phase=2)
+                continue # Skip if fetch returned empty
 
             # Example: Parse product data (replace with actual parsing)
             # soup = BeautifulSoup(product_html, 'html.parser')
@@ -291,6 +843,8 @@ def scrape(context: Dict[str, Any]):
             }
 
             # --- Filtering Logic (Optional) ---
+            # The worker applies the same brand/own-product filters to everything printed,
+            # so this only saves output; skipped products never reach the database either way.
             # Example: Filter by active brand
             if filter_by_active_brands and brand not in active_brand_names:
                  log_progress(f"Skipping product (inactive brand): {name} ({brand})")
@@ -304,14 +858,9 @@ def scrape(context: Dict[str, Any]):
                 if ean and ean in own_product_eans:
                     is_own_product = True
 
-                # Check SKU/Brand match
+                # Check SKU/Brand match, or the SKU of an own product of an active brand
                 if not is_own_product:
-                    for product_info in own_product_sku_brands:
-                        if (product_info.get('sku') == sku and
-                            (product_info.get('brand') == brand or
-                             product_info.get('brand_id') in active_brand_ids)):
-                            is_own_product = True
-                            break
+                    is_own_product = (sku, brand) in own_product_sku_brand_keys or sku in own_product_skus_of_active_brands
 
                 if not is_own_product:
                     log_progress(f"Skipping product (not own product): {name} (SKU: {sku}, Brand: {brand})")
@@ -329,7 +878,10 @@ def scrape(context: Dict[str, Any]):
             log_error(f"Unexpected error processing link {link}: {e}", exc_info=True)
             # Continue to the next link, but you could also exit with sys.exit(1) for critical errors
 
-    log_progress(f"Processed {total_links} links, found {product_count} valid products.", phase=2)
+    product_pages.close() # Cancels fetches not started yet and ends URL collection if the loop ended early
+
+    log_progress(f"Processed {processed_links} of {unique_links.count} unique links, found {product_count} valid products.", phase=2)
+    report_http_stats()
     log_progress(f"Scrape finished successfully.")
 
     # If we didn't find any products, that's an error condition
@@ -344,6 +896,7 @@ if __name__ == '__main__':
         parser = argparse.ArgumentParser(description='PriceTracker Python Scraper')
         parser.add_argument('command', choices=['metadata', 'scrape'], help='Command to execute')
         parser.add_argument('--context', type=str, help='JSON string containing execution context for scrape command')
+        parser.add_argument('--context-file', type=str, help='Path to a JSON file with the execution context (used by the worker for large contexts)')
         parser.add_argument('--validate', action='store_true', help='Run in validation mode')
         parser.add_argument('--limit-urls', type=int, default=10, help='Limit number of URLs to process in validation mode')
         parser.add_argument('--limit-products', type=int, default=10, help='Limit number of products to return in validation mode')
@@ -358,11 +911,15 @@ if __name__ == '__main__':
                 log_error(f"Error generating metadata: {e}", exc_info=True)
                 sys.exit(1)
         elif args.command == 'scrape':
-            if not args.context:
+            if not args.context and not args.context_file:
                 log_error("Missing --context argument for scrape command")
                 sys.exit(1)
             try:
-                context_data = json.loads(args.context)
+                if args.context_file:
+                    with open(args.context_file, 'r', encoding='utf-8') as f:
+                        context_data = json.load(f)
+                else:
+                    context_data = json.loads(args.context)
                 # Add validation flags if present
                 if args.validate:
                     context_data['is_validation'] = True
@@ -6,16 +6,34 @@ import json
 import logging
 import sys
 from datetime import datetime, timezone
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Tuple
 import traceback
+import io
 import subprocess # Added for subprocess execution
-import tempfile # Added for temporary script files
+import tempfile
+import threading
+import queue
+import select
+import selectors
+import socket
+import codecs
+import ast
+import re
+import hashlib
+import marshal
+import sqlite3
+import importlib.util
+from collections import OrderedDict, deque
+from decimal import Decimal, ROUND_HALF_UP
+from concurrent.futures import ThreadPoolExecutor
 
 import psycopg2
 import psycopg2.extras # For dictionary cursor
+import psycopg2.errorcodes
 # import requests # No longer needed directly by worker
 from dotenv import load_dotenv
-import hashlib
+
+from script_forkserver import ForkServerClient
 
 # --- Configuration & Setup ---
 load_dotenv() # Load environment variables from .env file
@@ -24,7 +42,55 @@ DATABASE_URL = os.getenv("DATABASE_URL")
 WORKER_POLL_INTERVAL = int(os.getenv("WORKER_POLL_INTERVAL", 30)) # Seconds - Increased to 30 for better stability
 WORKER_ID = f"py-worker-{os.getpid()}" # Basic worker identifier
 SCRIPT_TIMEOUT_SECONDS = 7200 # Timeout for scraper script execution (2 hours)
-DB_BATCH_SIZE = 100 # How many products to buffer before saving to DB
+SCRIPT_INACTIVITY_TIMEOUT_SECONDS = 300 # Kill a script that produces no output for 5 minutes
+STDERR_TAIL_LINES = 50 # Recent stderr lines kept for error_details
+SCRIPT_ERRORS_KEPT = 50 # Most recent script-reported ERROR lines kept for error_details
+TAIL_LINE_MAX_CHARS = 2000 # Longer lines are clipped before they go into the ring buffers
+PROGRESS_FD_ENV = "PRICETRACKER_PROGRESS_FD" # Tells the script which fd carries JSON progress frames
+CONTROL_FD_ENV = "PRICETRACKER_CONTROL_FD" # Tells the script which fd carries worker commands (e.g. stop)
+# Progress parsing for scripts that only print "PROGRESS: Phase N: ... X/Y" to stderr
+LEGACY_PHASE_RE = re.compile(r'Phase (\d+):')
+LEGACY_PROGRESS_RE = re.compile(r'\b(\d+)\s*\/\s*(\d+)\b')
+DB_BATCH_SIZE = 100 # Products handed to the run's writer at a time, and the starting DB batch size for INSERT
+WORKER_INGEST_MODE = os.getenv("WORKER_INGEST_MODE", "insert").lower() # 'insert' (execute_values) or 'copy' (COPY FROM STDIN)
+WORKER_COPY_BATCH_SIZE = max(1, int(os.getenv("WORKER_COPY_BATCH_SIZE", 5000))) # Starting products per COPY in 'copy' mode
+INGEST_BATCH_SIZE = WORKER_COPY_BATCH_SIZE if WORKER_INGEST_MODE == "copy" else DB_BATCH_SIZE
+WORKER_MAX_CONCURRENT_JOBS = max(1, int(os.getenv("WORKER_MAX_CONCURRENT_JOBS", 1))) # Job slots run in parallel by this process
+WORKER_DB_POOL_SIZE = max(1, int(os.getenv("WORKER_DB_POOL_SIZE", WORKER_MAX_CONCURRENT_JOBS + 1))) # Idle connections kept for reuse
+WORKER_DB_IDLE_CHECK_SECONDS = float(os.getenv("WORKER_DB_IDLE_CHECK_SECONDS", 30)) # Ping a connection before use only after this long unchecked
+WORKER_PREPARED_STATEMENTS = os.getenv("WORKER_PREPARED_STATEMENTS", "false").lower() in ("1", "true", "yes") # Server-side prepared status updates; needs a session-mode connection
+WORKER_FILTER_CACHE_MAX_MB = float(os.getenv("WORKER_FILTER_CACHE_MAX_MB", 64)) # Memory bound of the shared brand/own-product filter cache
+WORKER_FILTER_CACHE_TTL_SECONDS = float(os.getenv("WORKER_FILTER_CACHE_TTL_SECONDS", 3600)) # Reload cached filter data at least this often
+WORKER_LISTEN_NOTIFY = os.getenv("WORKER_LISTEN_NOTIFY", "true").lower() in ("1", "true", "yes") # Wake up on scraper_run_pending notifications
+WORKER_NOTIFY_FALLBACK_INTERVAL = int(os.getenv("WORKER_NOTIFY_FALLBACK_INTERVAL", 300)) # Seconds - Slow safety poll while notifications are flowing
+JOB_NOTIFY_CHANNEL = "scraper_run_pending" # Channel used by the notify_pending_scraper_run trigger
+WORKER_TYPE = "python" # worker_type_filter passed to claim_scraper_jobs
+FORKSERVER_SUPPORTED = hasattr(os, "fork") and hasattr(socket, "send_fds") and hasattr(socket, "AF_UNIX")
+WORKER_SCRIPT_RUNNER = os.getenv("WORKER_SCRIPT_RUNNER", "forkserver" if FORKSERVER_SUPPORTED else "subprocess").lower() # 'forkserver' or 'subprocess'
+WORKER_FORKSERVER_PRELOAD = [m.strip() for m in os.getenv("WORKER_FORKSERVER_PRELOAD", "requests,urllib3,bs4").split(",") if m.strip()] # Imported once by the fork server
+WORKER_SCRIPT_CACHE_DIR = os.getenv("WORKER_SCRIPT_CACHE_DIR") or os.path.join(tempfile.gettempdir(), "py-worker-script-cache")
+WORKER_SCRIPT_CACHE_MAX_MB = max(1, int(os.getenv("WORKER_SCRIPT_CACHE_MAX_MB", 64))) # LRU bound for cached scripts and bytecode
+WORKER_RAW_CAPTURE_DIR = os.getenv("WORKER_RAW_CAPTURE_DIR") # Optional: spill raw script stdout/stderr to files here
+WORKER_RAW_CAPTURE_MAX_MB = int(os.getenv("WORKER_RAW_CAPTURE_MAX_MB", 256)) # Per run and stream
+WORKER_CONTEXT_ARGV_MAX_BYTES = int(os.getenv("WORKER_CONTEXT_ARGV_MAX_BYTES", 32768)) # Larger contexts go through --context-file when the script accepts it
+WORKER_DEDUP_KEY = os.getenv("WORKER_DEDUP_KEY", "url+ean+sku+brand") # Product fields that identify a duplicate within a run, or 'off'
+WORKER_ENFORCE_FILTERS = os.getenv("WORKER_ENFORCE_FILTERS", "true").lower() in ("1", "true", "yes") # Apply brand/own-product filters and the product limit in the worker
+WORKER_SCRIPT_STOP_GRACE_SECONDS = float(os.getenv("WORKER_SCRIPT_STOP_GRACE_SECONDS", 30)) # How long a script asked to stop may keep running
+WORKER_CATALOG_MATCHING = os.getenv("WORKER_CATALOG_MATCHING", "false").lower() in ("1", "true", "yes") # Match EAN/brand+SKU in the worker before insert
+WORKER_PRICE_CACHE_PATH = os.getenv("WORKER_PRICE_CACHE_PATH") # Optional SQLite file: skip staging pre-matched rows whose price is unchanged
+WORKER_PRICE_CACHE_TTL_HOURS = float(os.getenv("WORKER_PRICE_CACHE_TTL_HOURS", 168)) # Re-stage a product at least this often
+WORKER_HTTP_CACHE_DIR = os.getenv("WORKER_HTTP_CACHE_DIR") # Optional directory for the template's conditional-request cache (one SQLite file per scraper)
+WORKER_HTTP_CACHE_MAX_MB = float(os.getenv("WORKER_HTTP_CACHE_MAX_MB", 200)) # Size bound of each scraper's HTTP cache
+WORKER_WRITE_QUEUE_BATCHES = max(1, int(os.getenv("WORKER_WRITE_QUEUE_BATCHES", 50))) # Handed-over batches (of up to DB_BATCH_SIZE) buffered in memory per run before spilling
+WORKER_WRITE_BATCH_MIN = max(1, int(os.getenv("WORKER_WRITE_BATCH_MIN", 20))) # Bounds for the adaptive DB batch size
+WORKER_WRITE_BATCH_MAX = max(WORKER_WRITE_BATCH_MIN, int(os.getenv("WORKER_WRITE_BATCH_MAX", 5000)))
+WORKER_WRITE_TARGET_MS = float(os.getenv("WORKER_WRITE_TARGET_MS", 2000)) # Commit latency the batch size is tuned for
+WORKER_WRITE_FLUSH_MIN_SECONDS = float(os.getenv("WORKER_WRITE_FLUSH_MIN_SECONDS", 1)) # Bounds for how long a partial batch waits for more rows
+WORKER_WRITE_FLUSH_MAX_SECONDS = max(WORKER_WRITE_FLUSH_MIN_SECONDS, float(os.getenv("WORKER_WRITE_FLUSH_MAX_SECONDS", 15)))
+WORKER_WRITE_SPILL_DIR = os.getenv("WORKER_WRITE_SPILL_DIR") or None # Where product batches spill when the DB falls behind (default: system temp dir)
+WORKER_WRITE_SPILL_MAX_MB = int(os.getenv("WORKER_WRITE_SPILL_MAX_MB", 256)) # Per run; beyond this, ingest waits for the DB
+WORKER_PROGRESS_FLUSH_INTERVAL = float(os.getenv("WORKER_PROGRESS_FLUSH_INTERVAL", 2)) # Seconds - Max frequency of 'running' progress writes per run
+ARGV_MAX_ARG_BYTES = 131072 # Linux MAX_ARG_STRLEN: longest single argument execve() accepts
 
 # --- Logging Setup ---
 # Configure structured logging according to the plan
@@ -54,6 +120,31 @@ logger.propagate = False # Prevent duplicate logging if root logger is configure
 
 # --- Database Utilities ---
 
+class WorkerConnection(psycopg2.extensions.connection):
+    """psycopg2 connection that remembers when it was last known to be alive and what it has prepared."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.last_checked = time.monotonic() # Connecting proves the server answered
+        self.prepared_statements = set() # Names of server-side prepared statements on this session
+        self.prepared_statements_lost = 0 # Times the server turned out to have dropped them
+        self._prepared_enabled = WORKER_PREPARED_STATEMENTS
+        self._prepared_lock = threading.Lock()
+
+    @property
+    def prepared_enabled(self) -> bool:
+        with self._prepared_lock:
+            return self._prepared_enabled
+
+    def record_prepared_lost(self) -> bool:
+        """Counts a loss of this session's prepared statements; returns False once they are turned off for it."""
+        with self._prepared_lock:
+            self.prepared_statements_lost += 1
+            if self.prepared_statements_lost > 1:
+                self._prepared_enabled = False
+            return self._prepared_enabled
+
+
 def get_db_connection():
     """Establishes a connection to the PostgreSQL database with proper SSL and timeout configuration."""
     if not DATABASE_URL:
@@ -69,6 +160,7 @@ def get_db_connection():
         'keepalives_interval': 30,  # Send keepalive every 30 seconds
         'keepalives_count': 3,  # Drop connection after 3 failed keepalives
         'application_name': f'py-worker-{os.getpid()}',  # Help identify connections in logs
+        'connection_factory': WorkerConnection,
     }
 
     # Add SSL configuration for Supabase
@@ -80,11 +172,8 @@ def get_db_connection():
 
     for attempt in range(max_retries):
         try:
-            conn = psycopg2.connect(**connection_params)
-            # Test the connection with a simple query
-            with conn.cursor() as test_cur:
-                test_cur.execute("SELECT 1")
-                test_cur.fetchone()
+            conn = psycopg2.connect(**connection_params) # The handshake already proves the connection works
+            METRICS.incr('db_connects')
             return conn
         except psycopg2.OperationalError as e:
             if attempt < max_retries - 1:
@@ -106,6 +195,10 @@ def validate_and_reconnect_if_needed(conn):
     """
     Validates a database connection and reconnects if necessary.
     Returns a valid connection or raises an exception if unable to connect.
+
+    psycopg2 marks a connection closed as soon as a statement fails on a dead socket, so
+    that check costs no round-trip. The SELECT 1 ping only runs for a connection that has
+    gone unchecked for WORKER_DB_IDLE_CHECK_SECONDS, e.g. one left idle between jobs.
     """
     if conn is None:
         return get_db_connection()
@@ -115,16 +208,33 @@ def validate_and_reconnect_if_needed(conn):
         if conn.closed:
             logger.info("Connection is closed, getting new connection", 
                        extra={'phase': 'DB_CONNECTION', 'run_id': 'N/A'})
+            METRICS.incr('db_reconnects')
             return get_db_connection()
 
-        # Test the connection with a simple query
+        # A transaction left aborted by an earlier error would fail every following statement
+        if conn.get_transaction_status() == psycopg2.extensions.TRANSACTION_STATUS_INERROR:
+            conn.rollback()
+
+        now = time.monotonic()
+        last_checked = getattr(conn, 'last_checked', None)
+        if last_checked is not None and now - last_checked < WORKER_DB_IDLE_CHECK_SECONDS:
+            conn.last_checked = now
+            METRICS.incr('db_pings_skipped')
+            return conn
+
+        # Idle for a while: test the connection with a simple query
+        METRICS.incr('db_pings')
         with conn.cursor() as test_cur:
             test_cur.execute("SELECT 1")
             test_cur.fetchone()
+        METRICS.incr('db_pings_wasted') # The connection was fine after all
+        if last_checked is not None:
+            conn.last_checked = now
 
         return conn  # Connection is valid
     except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
         # Connection is broken, get a new one
+        METRICS.incr('db_reconnects')
         logger.warning(f"Database connection validation failed: {e}. Getting new connection.", 
                       extra={'phase': 'DB_CONNECTION', 'run_id': 'N/A'})
         try:
@@ -134,6 +244,7 @@ def validate_and_reconnect_if_needed(conn):
         return get_db_connection()
     except Exception as e:
         # For any other error, try to get a new connection
+        METRICS.incr('db_reconnects')
         logger.warning(f"Unexpected error validating connection: {e}. Getting new connection.", 
                       extra={'phase': 'DB_CONNECTION', 'run_id': 'N/A'})
         try:
@@ -142,6 +253,56 @@ def validate_and_reconnect_if_needed(conn):
             pass
         return get_db_connection()
 
+class ConnectionPool:
+    """
+    Idle connections shared by the main loop and the per-run product writers, so claiming a
+    job or starting a run reuses an open connection instead of connecting again. At most
+    max_idle connections are kept; checkouts go through validate_and_reconnect_if_needed.
+    """
+
+    def __init__(self, max_idle: int):
+        self.max_idle = max_idle
+        self._idle: List[Any] = []
+        self._lock = threading.Lock()
+
+    def getconn(self):
+        METRICS.incr('db_checkouts')
+        with self._lock:
+            conn = self._idle.pop() if self._idle else None
+        if conn is not None:
+            METRICS.incr('db_checkouts_reused')
+        return validate_and_reconnect_if_needed(conn)
+
+    def putconn(self, conn):
+        """Returns a connection for reuse; broken ones and those beyond max_idle are closed."""
+        if conn is None or conn.closed:
+            return
+        try:
+            conn.rollback() # No round-trip unless a transaction was left open
+        except Exception:
+            try: conn.close()
+            except Exception: pass
+            return
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+                return
+        try: conn.close()
+        except Exception: pass
+
+
+_db_pool: Optional[ConnectionPool] = None
+_db_pool_lock = threading.Lock()
+
+
+def get_db_pool() -> ConnectionPool:
+    global _db_pool
+    with _db_pool_lock:
+        if _db_pool is None:
+            _db_pool = ConnectionPool(WORKER_DB_POOL_SIZE)
+        return _db_pool
+
+
 def log_event(level: str, phase: str, run_id: Optional[str], message: str, data: Optional[Dict] = None):
     """Logs messages in the structured format."""
     extra = {'phase': phase, 'run_id': run_id or 'N/A'}
@@ -201,162 +362,156 @@ def log_event(level: str, phase: str, run_id: Optional[str], message: str, data:
     #                 db_conn_log.close()
     #             except Exception: pass # Ignore close errors
 
+# --- Worker Metrics ---
+
+class WorkerMetrics:
+    """Thread-safe in-process counters and timings, logged with the periodic worker health check."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, float] = {}
+        self._timings: Dict[str, Dict[str, float]] = {}
+
+    def incr(self, name: str, amount: float = 1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def observe(self, name: str, value: float):
+        """Records one sample of a timing/size metric (count, total and max are kept)."""
+        with self._lock:
+            timing = self._timings.setdefault(name, {'count': 0, 'total': 0.0, 'max': 0.0})
+            timing['count'] += 1
+            timing['total'] += value
+            timing['max'] = max(timing['max'], value)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            result: Dict[str, Any] = dict(self._counters)
+            for name, timing in self._timings.items():
+                result[name] = {
+                    'count': timing['count'],
+                    'avg': round(timing['total'] / timing['count'], 2) if timing['count'] else 0,
+                    'max': round(timing['max'], 2),
+                }
+            return result
+
+METRICS = WorkerMetrics()
+
 # --- Job Search & Claim ---
 
-def find_and_claim_job(conn):
+def claim_jobs(conn, max_jobs: int = 1) -> List[Dict[str, Any]]:
     """
-    Finds a pending Python scraper job and attempts to claim it atomically.
-    Returns the job details if successful, otherwise None.
+    Claims up to max_jobs pending Python scraper jobs in a single round-trip through
+    claim_scraper_jobs (FOR UPDATE SKIP LOCKED), so concurrent workers take disjoint jobs.
+    Returns the claimed job details, or an empty list if nothing could be claimed.
     """
     # Validate and reconnect if needed
     try:
         conn = validate_and_reconnect_if_needed(conn)
     except Exception as e:
         log_event("ERROR", "DB_CONNECTION", None, f"Failed to establish database connection: {str(e)}")
-        return None # Cannot proceed
+        return [] # Cannot proceed
 
-    # Add retry logic for job search
-    max_retries = 3  # Increased from 2 to 3 for more resilience
+    # Add retry logic for job claiming
+    max_retries = 3
     retry_count = 0
 
     while retry_count <= max_retries:
         try:
-            log_event("INFO", "JOB_SEARCH", None, "Searching for pending Python scraper jobs...")
+            log_event("INFO", "JOB_SEARCH", None, f"Searching for pending Python scraper jobs (up to {max_jobs})...")
+            claim_started = time.perf_counter()
             with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
-                # Query to find pending or initializing jobs for Python scrapers
-                # Modified to prioritize jobs that have been waiting longer
-                sql_query = """
-                    SELECT sr.id, sr.scraper_id, sr.user_id, sr.is_test_run, s.competitor_id, sr.created_at
-                    FROM scraper_runs sr
-                    INNER JOIN scrapers s ON sr.scraper_id = s.id
-                    WHERE sr.status IN ('pending', 'initializing')
-                    AND (s.scraper_type = 'python' OR s.scraper_type IS NULL) -- Also handle NULL type initially
-                    ORDER BY
-                        CASE WHEN sr.status = 'initializing' THEN 0 ELSE 1 END, -- Prioritize 'initializing' jobs
-                        sr.created_at ASC                                       -- Then oldest jobs first
-                    LIMIT 1;
-                """
-                cur.execute(sql_query)
-                job = cur.fetchone()
-
-                if not job:
-                    log_event("INFO", "JOB_SEARCH", None, "No pending Python scraper jobs found.")
-                    return None
-
+                cur.execute("SELECT * FROM claim_scraper_jobs(%s, %s);", (WORKER_TYPE, max_jobs))
+                rows = cur.fetchall()
+            conn.commit() # Commit the claim
+            claim_ms = (time.perf_counter() - claim_started) * 1000
+            METRICS.observe('claim_latency_ms', claim_ms)
+            METRICS.incr('claim_attempts')
+
+            if not rows:
+                METRICS.incr('claims_empty')
+                log_event("INFO", "JOB_SEARCH", None, "No pending Python scraper jobs found.")
+                return []
+
+            METRICS.incr('jobs_claimed', len(rows))
+            jobs = []
+            for row in rows:
+                job = {
+                    'id': row['id'],
+                    'scraper_id': row['scraper_id'],
+                    'user_id': row['user_id'],
+                    'is_test_run': row['is_test_run'],
+                    'competitor_id': row['fetched_competitor_id'],
+                    'created_at': row['created_at'],
+                }
                 # Calculate how long the job has been waiting
                 if job['created_at']:
-                    wait_time = datetime.now(timezone.utc) - job['created_at'].replace(tzinfo=timezone.utc)
-                    wait_seconds = wait_time.total_seconds()
-                    log_event("INFO", "JOB_SEARCH", None,
-                             f"Found pending job: {job['id']} for scraper {job['scraper_id']} (waiting for {wait_seconds:.1f} seconds)")
+                    wait_seconds = (datetime.now(timezone.utc) - job['created_at'].replace(tzinfo=timezone.utc)).total_seconds()
+                    METRICS.observe('queue_wait_seconds', wait_seconds)
+                    log_event("INFO", "JOB_CLAIM", job['id'],
+                             f"Successfully claimed job {job['id']} for scraper {job['scraper_id']} (waited {wait_seconds:.1f} seconds, claim took {claim_ms:.1f} ms)")
                 else:
-                    log_event("INFO", "JOB_SEARCH", None,
-                             f"Found pending job: {job['id']} for scraper {job['scraper_id']} (created_at timestamp missing)")
-
-                # Use advisory lock for atomic claiming
-                lock_key = int(hashlib.md5(job['id'].encode()).hexdigest(), 16) % 2147483647
-                cur.execute("SELECT pg_try_advisory_xact_lock(%s)", (lock_key,))
-                lock_acquired = cur.fetchone()[0]
-
-                if not lock_acquired:
-                    log_event("INFO", "JOB_CLAIM", None, f"Could not acquire lock for job {job['id']}, another worker may be claiming it.")
-                    conn.rollback() # Release transaction context
-                    # Short sleep to avoid tight loop on lock contention
-                    time.sleep(0.5)
-                    return None
-
-                # Re-verify status before claiming (important with advisory lock)
-                cur.execute("SELECT status FROM scraper_runs WHERE id = %s FOR UPDATE", (job['id'],))
-                current_status = cur.fetchone()
-                if not current_status or (current_status['status'] != 'pending' and current_status['status'] != 'initializing'):
-                     log_event("INFO", "JOB_CLAIM", job['id'], f"Job status changed to '{current_status['status'] if current_status else 'unknown'}' before claim could be finalized.")
-                     conn.rollback()
-                     return None
-
-                # Attempt to claim the job and clear any info messages
-                claim_sql = """
-                    UPDATE scraper_runs
-                    SET status = 'running',
-                        started_at = NOW(),
-                        claimed_by_worker_at = NOW(),
-                        error_message = NULL
-                    WHERE id = %s AND status IN ('pending', 'initializing')
-                    RETURNING id;
-                """
-                cur.execute(claim_sql, (job['id'],))
-                claimed = cur.fetchone()
-
-                if claimed:
-                    log_event("INFO", "JOB_CLAIM", job['id'], f"Successfully claimed job {job['id']}")
-                    # Update error message to indicate the job was picked up by the worker
-                    # This helps distinguish between "never picked up" and "failed during execution"
-                    update_sql = """
-                        UPDATE scraper_runs
-                        SET error_message = NULL
-                        WHERE id = %s;
-                    """
-                    cur.execute(update_sql, (job['id'],))
-                    conn.commit() # Commit the claim
-                    return job # Return the job details
-                else:
-                    # This case should be rare with the advisory lock + re-verify, but handle defensively
-                    log_event("WARN", "JOB_CLAIM", job['id'], "Failed to claim job after acquiring lock (status might have changed unexpectedly).")
-                    conn.rollback()
-                    return None
-
-            # If we get here, we've either returned a job or None, so break the retry loop
-            break
+                    log_event("INFO", "JOB_CLAIM", job['id'],
+                             f"Successfully claimed job {job['id']} for scraper {job['scraper_id']} (claim took {claim_ms:.1f} ms)")
+                jobs.append(job)
+            return jobs
 
         except psycopg2.Error as db_err:
-            log_event("ERROR", "JOB_SEARCH", None, f"Database error during job search/claim (attempt {retry_count+1}/{max_retries}): {db_err}")
+            METRICS.incr('claim_errors')
+            log_event("ERROR", "JOB_SEARCH", None, f"Database error during job claim (attempt {retry_count+1}/{max_retries}): {db_err}")
             try: conn.rollback() # Rollback on error
             except Exception: pass
             retry_count += 1
             if retry_count <= max_retries:
-                log_event("INFO", "JOB_SEARCH", None, "Retrying job search after DB error...")
+                log_event("INFO", "JOB_SEARCH", None, "Retrying job claim after DB error...")
                 time.sleep(1)
                 # Ensure connection is still valid
                 try:
                     conn = validate_and_reconnect_if_needed(conn)
                 except Exception as reconn_err:
                     log_event("ERROR", "DB_CONNECTION", None, f"Failed to reconnect after DB error: {reconn_err}")
-                    return None # Cannot continue without DB
+                    return [] # Cannot continue without DB
             else:
                 log_event("ERROR", "JOB_SEARCH", None, f"Exhausted retries after DB error: {traceback.format_exc()}")
-                return None
+                return []
         except Exception as e:
-            log_event("ERROR", "JOB_SEARCH", None, f"Unexpected error during job search/claim (attempt {retry_count+1}/{max_retries}): {e}")
+            METRICS.incr('claim_errors')
+            log_event("ERROR", "JOB_SEARCH", None, f"Unexpected error during job claim (attempt {retry_count+1}/{max_retries}): {e}")
             try: conn.rollback()
             except Exception: pass
             retry_count += 1
             if retry_count <= max_retries:
-                 log_event("INFO", "JOB_SEARCH", None, "Retrying job search after unexpected error...")
+                 log_event("INFO", "JOB_SEARCH", None, "Retrying job claim after unexpected error...")
                  time.sleep(1)
                  # Ensure connection is still valid
                  try:
                      conn = validate_and_reconnect_if_needed(conn)
                  except Exception as reconn_err:
                      log_event("ERROR", "DB_CONNECTION", None, f"Failed to reconnect after error: {reconn_err}")
-                     return None # Cannot continue without DB
+                     return [] # Cannot continue without DB
             else:
                  log_event("ERROR", "JOB_SEARCH", None, f"Exhausted retries after unexpected error: {traceback.format_exc()}")
-                 return None
+                 return []
 
     # If loop finishes without returning, means retries exhausted
-    return None
+    return []
 
 
-def fetch_scraper_details(conn, scraper_id: str) -> Optional[Dict[str, Any]]:
-    """Fetches scraper script and configuration with retries."""
+def fetch_scraper_details(conn, scraper_id: str, include_script: bool = True) -> Optional[Dict[str, Any]]:
+    """
+    Fetches scraper script and configuration with retries.
+    With include_script=False the python_script column is skipped; updated_at is enough to validate the script cache.
+    """
     max_retries = 2
     retry_count = 0
+    script_column = "python_script, " if include_script else ""
     while retry_count <= max_retries:
         try:
             conn = validate_and_reconnect_if_needed(conn) # Ensure connection
             with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
                 cur.execute(
-                    """
-                    SELECT python_script, filter_by_active_brands, scrape_only_own_products
+                    f"""
+                    SELECT {script_column}updated_at, filter_by_active_brands, scrape_only_own_products
                     FROM scrapers
                     WHERE id = %s;
                     """,
@@ -366,7 +521,7 @@ def fetch_scraper_details(conn, scraper_id: str) -> Optional[Dict[str, Any]]:
                 if not scraper_data:
                     log_event("ERROR", "SETUP", None, f"Scraper with ID {scraper_id} not found.")
                     return None
-                if not scraper_data['python_script']:
+                if include_script and not scraper_data['python_script']:
                      log_event("ERROR", "SETUP", None, f"Scraper {scraper_id} has no Python script.")
                      return None
                 return dict(scraper_data) # Success
@@ -391,77 +546,200 @@ def fetch_scraper_details(conn, scraper_id: str) -> Optional[Dict[str, Any]]:
     return None # Should not be reached if retries exhausted properly
 
 
+# Fixed scraper_runs statements, one per update shape, as (parameter types, SQL). Unset fields keep
+# their value through COALESCE, so the statement text never varies and can be prepared once per connection.
+RUN_FINAL_SQL = """
+    UPDATE scraper_runs
+    SET status = '{status}', completed_at = NOW(), error_message = COALESCE($2, error_message),
+        product_count = COALESCE($3, product_count), current_batch = COALESCE($4, current_batch),
+        total_batches = COALESCE($5, total_batches), current_phase = COALESCE($6, current_phase),
+        execution_time_ms = COALESCE($7, execution_time_ms), products_per_second = COALESCE($8, products_per_second)
+    WHERE id = $1
+"""
+RUN_FINAL_PARAM_TYPES = "uuid, text, integer, integer, integer, integer, bigint, numeric"
+RUN_STATUS_STATEMENTS = {
+    'worker_run_progress': ("uuid, text, integer, integer, integer, integer, text", """
+        UPDATE scraper_runs
+        SET status = $2, product_count = COALESCE($3, product_count), current_batch = COALESCE($4, current_batch),
+            total_batches = COALESCE($5, total_batches), current_phase = COALESCE($6, current_phase),
+            error_message = COALESCE($7, error_message)
+        WHERE id = $1
+    """),
+    'worker_run_completed': (RUN_FINAL_PARAM_TYPES, RUN_FINAL_SQL.format(status='completed')),
+    'worker_run_failed': (RUN_FINAL_PARAM_TYPES, RUN_FINAL_SQL.format(status='failed')),
+    'worker_run_log_append': ("uuid, text[]", """
+        UPDATE scraper_runs
+        SET progress_messages = COALESCE(progress_messages, ARRAY[]::text[]) || $2
+        WHERE id = $1
+    """),
+}
+# Plain-text form of the same statements for when WORKER_PREPARED_STATEMENTS is off
+RUN_STATUS_PLAIN_SQL = {name: re.sub(r'\$(\d+)', r'%(p\1)s', sql) for name, (_, sql) in RUN_STATUS_STATEMENTS.items()}
+
+_status_round_trips: Dict[str, int] = {} # run_id -> status round-trips so far
+_status_round_trips_lock = threading.Lock()
+
+
+def run_status_statements(run_id: str, status: str, error_message: Optional[str] = None,
+                          error_details: Optional[str] = None, product_count: Optional[int] = None,
+                          execution_time_ms: Optional[int] = None, products_per_second: Optional[float] = None,
+                          current_batch: Optional[int] = None, total_batches: Optional[int] = None,
+                          current_phase: Optional[int] = None, run_stats: Optional[Dict[str, Any]] = None):
+    """Returns the (statement name, parameters) pairs that record the given run update."""
+    # Truncate error message if too long for DB column
+    if error_message is not None:
+        error_message = error_message[:1000]
+    if status in ('completed', 'failed'):
+        params = [run_id, error_message, product_count, current_batch, total_batches, current_phase,
+                  execution_time_ms, products_per_second]
+        statements = [(f'worker_run_{status}', params)]
+    else:
+        statements = [('worker_run_progress', [run_id, status, product_count, current_batch, total_batches, current_phase, error_message])]
+
+    # Entries appended to progress_messages in this update
+    progress_entries = []
+
+    # Store detailed error information in progress_messages if provided
+    if error_details is not None:
+        # Truncate error details if needed
+        truncated_details = error_details[:4000] # Example limit
+        error_log_entry = {
+            "ts": datetime.now(timezone.utc).isoformat(),
+            "type": "error_details", # Distinguish from regular logs
+            "details": truncated_details
+        }
+        progress_entries.append(json.dumps(error_log_entry))
+
+    # Ingest counts of a finished run (kept/duplicate products, staged rows), also readable as a status message
+    if run_stats:
+        stats_entry = {
+            "ts": datetime.now(timezone.utc).isoformat(),
+            "type": "run_stats",
+            "msg": ", ".join(f"{key.replace('_', ' ')}: {value}" for key, value in run_stats.items()),
+            **run_stats,
+        }
+        progress_entries.append(json.dumps(stats_entry))
+
+    if progress_entries:
+        statements.append(('worker_run_log_append', [run_id, progress_entries]))
+    return statements
+
+
+def _send_run_statements(conn, statements: List[Tuple[str, List[Any]]], use_prepared: bool) -> Tuple[int, List[str]]:
+    """Sends the statements in one message; returns (round trips, names newly prepared). Raises on failure."""
+    newly_prepared = []
+    in_transaction = conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE
+    autocommit = conn.autocommit
+    try:
+        with conn.cursor() as cur:
+            parts = []
+            for name, params in statements:
+                if use_prepared:
+                    if name not in conn.prepared_statements and name not in newly_prepared:
+                        param_types, sql = RUN_STATUS_STATEMENTS[name]
+                        parts.append(f"PREPARE {name} ({param_types}) AS {sql.strip()}")
+                        newly_prepared.append(name)
+                    parts.append(cur.mogrify(f"EXECUTE {name} ({', '.join(['%s'] * len(params))})", params).decode())
+                else:
+                    parts.append(cur.mogrify(RUN_STATUS_PLAIN_SQL[name], {f'p{i}': v for i, v in enumerate(params, 1)}).decode())
+            # In autocommit mode psycopg2 sends no separate BEGIN, and a multi-statement message is atomic on its own
+            if not in_transaction:
+                conn.autocommit = True
+            cur.execute(";\n".join(parts))
+        round_trips = 1
+        if in_transaction:
+            conn.commit()
+            round_trips += 1
+    except Exception:
+        if newly_prepared:
+            # PREPARE is not undone by the failed transaction; start over on the next call
+            _deallocate_prepared_statements(conn)
+        raise
+    finally:
+        if not conn.closed and conn.autocommit != autocommit:
+            conn.autocommit = autocommit
+    return round_trips, newly_prepared
+
+
+def _deallocate_prepared_statements(conn):
+    """Drops every prepared statement of the session and forgets them, best effort."""
+    conn.prepared_statements.clear()
+    try:
+        if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            conn.rollback() # DEALLOCATE cannot run in the aborted transaction
+        autocommit = conn.autocommit
+        conn.autocommit = True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("DEALLOCATE ALL")
+        finally:
+            conn.autocommit = autocommit
+    except Exception as e:
+        log_event("WARN", "DB_PREPARED", None, f"DEALLOCATE ALL failed: {e}")
+
+
+def execute_run_statements(conn, statements: List[Tuple[str, List[Any]]], run_ids: List[str]):
+    """
+    Sends the run statements to the server in a single round-trip, as one implicit transaction,
+    preparing any the connection has not prepared yet in the same message. Raises on failure.
+
+    If the server no longer has a statement this connection prepared (DISCARD, a backend
+    reset, or a transaction pooler handing us another backend), the statements are
+    prepared again and the update is retried once. A connection that loses them a
+    second time is behind a pooler: it then uses plain SQL for the rest of its life.
+    """
+    use_prepared = getattr(conn, 'prepared_enabled', False)
+    in_transaction = conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE
+    try:
+        round_trips, newly_prepared = _send_run_statements(conn, statements, use_prepared)
+    except psycopg2.Error as e:
+        if not use_prepared or e.pgcode != psycopg2.errorcodes.INVALID_SQL_STATEMENT_NAME:
+            raise
+        METRICS.incr('status_prepared_lost')
+        _deallocate_prepared_statements(conn)
+        if not conn.record_prepared_lost():
+            use_prepared = False
+            log_event("WARN", "DB_PREPARED", None,
+                      "Server keeps dropping prepared statements (transaction pooler?); using plain SQL on this connection")
+        if in_transaction:
+            raise # The caller's transaction is gone with the failure; the next call prepares again
+        round_trips, newly_prepared = _send_run_statements(conn, statements, use_prepared)
+        round_trips += 1
+    if use_prepared:
+        conn.prepared_statements.update(newly_prepared)
+        METRICS.incr('status_statements_prepared', len(newly_prepared))
+    METRICS.incr('status_statements', len(statements))
+    METRICS.incr('status_round_trips', round_trips)
+    with _status_round_trips_lock:
+        for run_id in run_ids:
+            _status_round_trips[run_id] = _status_round_trips.get(run_id, 0) + round_trips
+
+
+def pop_status_round_trips(run_id: str) -> int:
+    """Returns and forgets how many status round-trips the run has used."""
+    with _status_round_trips_lock:
+        return _status_round_trips.pop(run_id, 0)
+
+
 def update_job_status(conn, run_id: str, status: str, error_message: Optional[str] = None,
                       error_details: Optional[str] = None, product_count: Optional[int] = None,
                       execution_time_ms: Optional[int] = None, products_per_second: Optional[float] = None,
-                      current_batch: Optional[int] = None, total_batches: Optional[int] = None):
+                      current_batch: Optional[int] = None, total_batches: Optional[int] = None,
+                      current_phase: Optional[int] = None, run_stats: Optional[Dict[str, Any]] = None):
     """
     Update the status and other details of a scraper run job in the database.
-    Handles connection checks internally.
+    Handles connection checks internally. The status update and any progress_messages
+    entries go out together in one round-trip.
     """
-    new_connection = False
-    cursor = None
     try:
         # Ensure connection is valid
         conn = validate_and_reconnect_if_needed(conn)
-        if new_connection is False:  # Only set to True if we created a new connection
-            new_connection = False
-
-        # Start building the SQL update query
-        update_fields = ["status = %s"]
-        params = [status]
-
-        # Add optional fields if they are provided
-        if error_message is not None:
-            update_fields.append("error_message = %s")
-            # Truncate error message if too long for DB column
-            params.append(error_message[:1000]) # Example limit, adjust based on schema
-        if product_count is not None:
-            update_fields.append("product_count = %s")
-            params.append(product_count)
-        if current_batch is not None:
-            update_fields.append("current_batch = %s")
-            params.append(current_batch)
-        if total_batches is not None:
-            update_fields.append("total_batches = %s")
-            params.append(total_batches)
-        if execution_time_ms is not None:
-            update_fields.append("execution_time_ms = %s")
-            params.append(execution_time_ms)
-        if products_per_second is not None:
-            update_fields.append("products_per_second = %s")
-            params.append(products_per_second)
-
-        # If status is 'completed' or 'failed', set completed_at
-        if status in ['completed', 'failed']:
-            update_fields.append("completed_at = NOW()")
-
-        # Store detailed error information in progress_messages if provided
-        if error_details is not None:
-            # Truncate error details if needed
-            truncated_details = error_details[:4000] # Example limit
-            error_log_entry = {
-                "ts": datetime.now(timezone.utc).isoformat(),
-                "type": "error_details", # Distinguish from regular logs
-                "details": truncated_details
-            }
-            error_log_entry_str = json.dumps(error_log_entry)
-            update_fields.append("progress_messages = array_append(COALESCE(progress_messages, ARRAY[]::text[]), %s)")
-            params.append(error_log_entry_str)
-
-        # Finalize the SQL query
-        sql = f"""
-            UPDATE scraper_runs
-            SET {", ".join(update_fields)}
-            WHERE id = %s
-        """
-        params.append(run_id)
-
-        # Execute the query
-        cursor = conn.cursor()
-        log_event("DEBUG", "DB_QUERY", run_id, f"Executing SQL: {sql} with params: {params}")
-        cursor.execute(sql, params)
-        conn.commit()
+        statements = run_status_statements(run_id, status, error_message=error_message, error_details=error_details,
+                                           product_count=product_count, execution_time_ms=execution_time_ms,
+                                           products_per_second=products_per_second, current_batch=current_batch,
+                                           total_batches=total_batches, current_phase=current_phase, run_stats=run_stats)
+        log_event("DEBUG", "DB_QUERY", run_id, f"Executing {', '.join(name for name, _ in statements)}")
+        execute_run_statements(conn, statements, [run_id])
 
         log_event("INFO", "JOB_STATUS_UPDATE", run_id, f"Updated job status to {status}")
         return True
@@ -472,23 +750,611 @@ def update_job_status(conn, run_id: str, status: str, error_message: Optional[st
         except Exception as rollback_error:
             log_event("ERROR", "DB_ROLLBACK", run_id, f"Failed to rollback transaction: {str(rollback_error)}")
         return False
-    finally:
-        if cursor:
-            try: cursor.close()
-            except Exception: pass
-        # Only close the connection if we created it specifically for this update
-        if new_connection and conn:
-            try: conn.close()
-            except Exception: pass
+
+
+# --- Progress Writer ---
+
+class ProgressWriter:
+    """
+    Debounced writer for 'running' progress updates of scraper_runs.
+
+    Job threads only record the latest product_count / current_batch / total_batches /
+    current_phase of their run in memory. A single flusher thread with its own connection
+    writes each changed run at most once per WORKER_PROGRESS_FLUSH_INTERVAL, so fast
+    scrapers no longer pay a DB round trip per progress event on their ingest thread.
+    The updates of all runs flushed together share one round trip.
+    The final state goes out with the run's final status update, after finish().
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._lock = threading.Lock() # Guards _pending/_stats
+        self._flush_lock = threading.Lock() # Held while a flush writes; finish() waits on it
+        self._pending: Dict[str, Dict[str, int]] = {} # run_id -> fields not yet written
+        self._stats: Dict[str, List[int]] = {} # run_id -> [reports, writes]
+        self._conn = None
+        self._thread = threading.Thread(target=self._flush_loop, name="progress-writer", daemon=True)
+        self._thread.start()
+
+    def report(self, run_id: str, **fields):
+        """Records the run's latest progress; fields with None values are ignored."""
+        with self._lock:
+            self._pending.setdefault(run_id, {}).update({k: v for k, v in fields.items() if v is not None})
+            self._stats.setdefault(run_id, [0, 0])[0] += 1
+        METRICS.incr('progress_reports')
+
+    def finish(self, run_id: str):
+        """
+        Drops the run's pending progress so no 'running' update can land after its final
+        status. Returns (reports, writes) for the run.
+        """
+        with self._flush_lock, self._lock:
+            self._pending.pop(run_id, None)
+            reports, writes = self._stats.pop(run_id, [0, 0])
+        if reports > writes:
+            METRICS.incr('progress_writes_saved', reports - writes)
+        return reports, writes
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.flush()
+            except Exception as e:
+                log_event("WARN", "PROGRESS_UPDATE", None, f"Progress flush failed: {e}")
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            if not pending:
+                return
+            try:
+                self._conn = validate_and_reconnect_if_needed(self._conn)
+                statements = [statement for run_id, fields in pending.items()
+                              for statement in run_status_statements(run_id, 'running', **fields)]
+                execute_run_statements(self._conn, statements, list(pending))
+            except Exception:
+                # Keep the updates for the next attempt unless newer ones arrived meanwhile
+                with self._lock:
+                    for run_id, fields in pending.items():
+                        self._pending[run_id] = {**fields, **self._pending.get(run_id, {})}
+                raise
+            METRICS.incr('progress_writes', len(pending))
+            with self._lock:
+                for run_id in pending:
+                    if run_id in self._stats:
+                        self._stats[run_id][1] += 1
+            log_event("DEBUG", "PROGRESS_UPDATE", None, f"Flushed progress of {len(pending)} run(s): {pending}")
+
+
+_progress_writer: Optional[ProgressWriter] = None
+_progress_writer_lock = threading.Lock()
+
+
+def get_progress_writer() -> ProgressWriter:
+    global _progress_writer
+    with _progress_writer_lock:
+        if _progress_writer is None:
+            _progress_writer = ProgressWriter(WORKER_PROGRESS_FLUSH_INTERVAL)
+        return _progress_writer
+
+
+# --- Filter Data Cache ---
+
+class FilterDataCache:
+    """
+    Per-user filter sets for scraper contexts (active brand names/ids, own-product EANs and
+    SKU/brand pairs, plus the OwnProductIndex the worker filters with) and the CatalogIndex the
+    writers match with, shared by all job slots of this process. Before an entry is reused, a
+    count/max(updated_at) probe over the user's rows must still match what was loaded, and the
+    entry must be younger than WORKER_FILTER_CACHE_TTL_SECONDS (edits that leave updated_at
+    alone are picked up then). Least recently used entries are evicted beyond
+    WORKER_FILTER_CACHE_MAX_MB. Cached lists are shared between runs and must not be mutated.
+    """
+
+    QUERIES = {
+        'active_brands': (
+            "SELECT count(*), count(*) FILTER (WHERE is_active), max(updated_at) FROM brands WHERE user_id = %(user_id)s",
+            "SELECT id, name FROM brands WHERE user_id = %(user_id)s AND is_active = TRUE",
+        ),
+        'own_products': (
+            "SELECT count(*), count(*) FILTER (WHERE is_active), max(updated_at) FROM products WHERE user_id = %(user_id)s",
+            "SELECT ean, sku, brand, brand_id FROM products WHERE user_id = %(user_id)s AND is_active = TRUE",
+        ),
+        'catalog': (
+            """
+            SELECT p.count, p.updated, b.count, b.updated, a.count, a.created, get_user_matching_settings(%(user_id)s)::text
+            FROM (SELECT count(*), max(updated_at) AS updated FROM products WHERE user_id = %(user_id)s) p,
+                 (SELECT count(*), max(updated_at) AS updated FROM brands WHERE user_id = %(user_id)s) b,
+                 (SELECT count(*), max(created_at) AS created FROM brand_aliases WHERE user_id = %(user_id)s) a
+            """,
+            (
+                "SELECT get_user_matching_settings(%(user_id)s) AS settings",
+                "SELECT id, name FROM brands WHERE user_id = %(user_id)s",
+                "SELECT brand_id, alias_name FROM brand_aliases WHERE user_id = %(user_id)s",
+                "SELECT id, ean, sku, brand, brand_id FROM products WHERE user_id = %(user_id)s",
+            ),
+        ),
+    }
+    SIZE_FACTORS = {'own_products': 2, 'catalog': 3} # Hashed indexes on top of the loaded rows
+
+    def __init__(self, max_bytes: int, ttl_seconds: float):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict() # (kind, user_id) -> (probe, loaded_at, size, data)
+        self._key_locks: Dict[tuple, list] = {} # key -> [lock, threads holding or waiting for it]
+        self._bytes = 0
+
+    def get(self, conn, kind: str, user_id: str):
+        """Returns the filter data of the given kind for the user, loading it on a miss."""
+        key = (kind, str(user_id))
+        # Concurrent runs of the same user wait for one load instead of each running it. A key lock
+        # only lives while a thread holds or waits for it, so locks of evicted users do not pile up.
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, [threading.Lock(), 0])
+            key_lock[1] += 1
+        try:
+            with key_lock[0]:
+                return self._probe_or_load(conn, kind, key, {'user_id': user_id})
+        finally:
+            with self._lock:
+                key_lock[1] -= 1
+                if key_lock[1] == 0:
+                    del self._key_locks[key]
+
+    def _probe_or_load(self, conn, kind: str, key: tuple, params: Dict[str, Any]):
+        probe_sql, load_sqls = self.QUERIES[kind]
+        with conn.cursor() as cur:
+            cur.execute(probe_sql, params)
+            probe = tuple(str(value) for value in cur.fetchone())
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == probe and time.time() - entry[1] < self.ttl_seconds:
+                self._entries.move_to_end(key)
+                METRICS.incr('filter_cache_hits')
+                return entry[3]
+        METRICS.incr('filter_cache_stale' if entry is not None else 'filter_cache_misses')
+        results = []
+        with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
+            for load_sql in ((load_sqls,) if isinstance(load_sqls, str) else load_sqls):
+                cur.execute(load_sql, params)
+                results.append(cur.fetchall())
+        data = self._build(kind, *results)
+        size = sum(self._estimate_size(rows) for rows in results) * self.SIZE_FACTORS.get(kind, 1)
+        self._store(key, (probe, time.time(), size, data))
+        return data
+
+    @staticmethod
+    def _build(kind: str, rows, *more):
+        if kind == 'active_brands':
+            return [row['name'] for row in rows], [row['id'] for row in rows]
+        if kind == 'catalog':
+            return CatalogIndex(rows[0]['settings'] if rows else None, *more)
+        eans = [row['ean'] for row in rows if row['ean']]
+        sku_brands = [{
+            'sku': row['sku'],
+            'brand': row['brand'],
+            'brand_id': row['brand_id']
+        } for row in rows if row['sku'] and (row['brand'] or row['brand_id'])]
+        return eans, sku_brands, OwnProductIndex(rows)
+
+    @staticmethod
+    def _estimate_size(rows) -> int:
+        # Rough in-memory footprint: string payloads plus per-object overhead
+        return sum(sum(len(str(value)) + 50 for value in row) + 100 for row in rows)
+
+    def _store(self, key, entry):
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[2]
+            if entry[2] > self.max_bytes:
+                return # Would evict everything else; serve this user uncached
+            self._entries[key] = entry
+            self._bytes += entry[2]
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted[2]
+                METRICS.incr('filter_cache_evictions')
+            METRICS.observe('filter_cache_kb', self._bytes / 1024)
+
+
+_filter_cache: Optional[FilterDataCache] = None
+_filter_cache_lock = threading.Lock()
+
+
+def get_filter_cache() -> FilterDataCache:
+    global _filter_cache
+    with _filter_cache_lock:
+        if _filter_cache is None:
+            _filter_cache = FilterDataCache(int(WORKER_FILTER_CACHE_MAX_MB * 1048576), WORKER_FILTER_CACHE_TTL_SECONDS)
+        return _filter_cache
+
+
+# --- Product Matching ---
+
+SKU_SEPARATORS_RE = re.compile(r'[^A-Z0-9]')
+CATALOG_KEY_SEP = "\x1f" # Joins brand and SKU into one dict key
+
+
+# UPPER() maps one character to one character; str.upper() would turn 'ß' into 'SS' and 'ﬁ' into 'FI'.
+# Only characters that uppercase to A-Z survive the separator removal, so only those are mapped.
+SKU_UPPER = str.maketrans({c: c.upper() for c in 'abcdefghijklmnopqrstuvwxyz\u0131\u017f'})
+
+
+def normalize_sku(sku: Optional[str]) -> Optional[str]:
+    """Python twin of the SQL normalize_sku(): uppercase with every separator removed."""
+    if sku is None or sku.strip(' ') == '':
+        return None
+    return SKU_SEPARATORS_RE.sub('', sku.strip(' ').translate(SKU_UPPER))
+
+
+class ProductDeduplicator:
+    """Drops products a run has already emitted, compared on WORKER_DEDUP_KEY (fields joined with '+')."""
+
+    def __init__(self, key_spec: str):
+        self.fields = [f.strip() for f in key_spec.split('+') if f.strip()] if key_spec.lower() != 'off' else []
+        self.duplicates = 0
+        self._seen: set = set()
+
+    @staticmethod
+    def _key_value(product: Dict[str, Any], field: str) -> str:
+        value = product.get(field)
+        if value is None:
+            return ''
+        value = str(value).strip()
+        if field == 'url':
+            # Same page reached through a tracking fragment or with a trailing slash
+            value = value.split('#', 1)[0].rstrip('/')
+        return value
+
+    def is_duplicate(self, product: Dict[str, Any]) -> bool:
+        if self.fields:
+            values = [self._key_value(product, field) for field in self.fields]
+            if any(values): # Products without any key value are never merged
+                digest = hashlib.blake2b('\x1f'.join(values).encode('utf-8', 'surrogatepass'), digest_size=8).digest()
+                if digest in self._seen:
+                    self.duplicates += 1
+                    return True
+                self._seen.add(digest)
+        return False
+
+
+def filter_key(value) -> Optional[str]:
+    """Brand names and EANs as the product filter compares them: trimmed, case-insensitive."""
+    if value is None:
+        return None
+    value = str(value).strip().casefold()
+    return value or None
+
+
+class OwnProductIndex:
+    """
+    Hashed lookups over a user's active products for the own-product filter: by EAN, by
+    normalized SKU + brand name, and by normalized SKU alone (with the product's brand_id).
+    Values are row positions, so the filter can tell when every own product has been seen.
+    """
+
+    def __init__(self, rows):
+        self.by_ean: Dict[str, int] = {}
+        self.by_sku_brand: Dict[str, int] = {}
+        self.by_sku: Dict[str, List[tuple]] = {} # norm_sku -> [(position, brand_id)]
+        self.size = 0
+        for row in rows:
+            ean, norm_sku, brand = filter_key(row['ean']), normalize_sku(row['sku']), filter_key(row['brand'])
+            if not ean and not (norm_sku and (brand or row['brand_id'])):
+                continue # Cannot be matched by any rule
+            position = self.size
+            self.size += 1
+            if ean:
+                self.by_ean.setdefault(ean, position)
+            if norm_sku and brand:
+                self.by_sku_brand.setdefault(f"{norm_sku}{CATALOG_KEY_SEP}{brand}", position)
+            if norm_sku and row['brand_id']:
+                self.by_sku.setdefault(norm_sku, []).append((position, str(row['brand_id'])))
+
+
+class ProductFilter:
+    """
+    Applies a run's filter_by_active_brands / scrape_only_own_products settings in the worker, so
+    rows a script should have skipped never reach the DB. Same rules as python_template.py, with
+    hashed lookups instead of the template's scan over own_product_sku_brands: the brand must be an
+    active brand, and an own product must match on EAN, on SKU + brand, or on the SKU of an own
+    product whose brand is active. SKUs compare like normalize_sku(), brands and EANs case-insensitively.
+    """
+
+    def __init__(self, active_brand_names: Optional[List[str]] = None, active_brand_ids: Optional[List[Any]] = None,
+                 own_index: Optional[OwnProductIndex] = None):
+        self.active_brands = {filter_key(name) for name in active_brand_names} if active_brand_names is not None else None
+        self.active_brand_ids = {str(brand_id) for brand_id in active_brand_ids or []}
+        self.own_index = own_index
+        self.filtered_brand = 0
+        self.filtered_not_own = 0
+        self._own_seen: set = set()
+
+    @property
+    def active(self) -> bool:
+        return self.active_brands is not None or self.own_index is not None
+
+    @property
+    def all_own_products_seen(self) -> bool:
+        return self.own_index is not None and self.own_index.size > 0 and len(self._own_seen) >= self.own_index.size
+
+    def accepts(self, product: Dict[str, Any]) -> bool:
+        if self.active_brands is not None and filter_key(product.get('brand')) not in self.active_brands:
+            self.filtered_brand += 1
+            return False
+        if self.own_index is not None:
+            position = self._own_position(product)
+            if position is None:
+                self.filtered_not_own += 1
+                return False
+            self._own_seen.add(position)
+        return True
+
+    def _own_position(self, product: Dict[str, Any]) -> Optional[int]:
+        index = self.own_index
+        ean = filter_key(product.get('ean'))
+        if ean and ean in index.by_ean:
+            return index.by_ean[ean]
+        norm_sku = normalize_sku(str(product['sku'])) if product.get('sku') is not None else None
+        if not norm_sku:
+            return None
+        brand = filter_key(product.get('brand'))
+        if brand:
+            position = index.by_sku_brand.get(f"{norm_sku}{CATALOG_KEY_SEP}{brand}")
+            if position is not None:
+                return position
+        for position, brand_id in index.by_sku.get(norm_sku, ()):
+            if brand_id in self.active_brand_ids:
+                return position
+        return None
+
+
+class CatalogIndex:
+    """
+    In-memory copy of the EAN and brand+SKU steps of find_product_with_fuzzy_matching() for one user.
+
+    Rows resolved here are inserted with product_id set, and record_price_change only runs
+    its matching (and find_or_create_brand) for rows that arrive without one. Rows that
+    need fuzzy name matching, whose product does not exist yet, or whose brand the user
+    does not have yet (so SQL still creates it) go through SQL. Built from the rows
+    FilterDataCache loads for the 'catalog' kind and shared by the runs of the user.
+    """
+
+    def __init__(self, settings: Optional[Dict[str, Any]], brands, aliases, products):
+        started = time.monotonic()
+        settings = settings or {}
+        # Same test as the SQL: (settings->>'ean_priority')::BOOLEAN = true
+        self.ean_priority = str(settings.get('ean_priority')).lower() == 'true'
+        self.sku_brand_fallback = str(settings.get('sku_brand_fallback')).lower() == 'true'
+        self._brand_ids: Dict[str, str] = {} # brands.name -> id
+        self._alias_brand_ids: Dict[str, str] = {} # brand_aliases.alias_name -> brand_id
+        self._by_ean: Dict[str, str] = {}
+        self._by_brand_id_sku: Dict[str, str] = {}
+        self._by_brand_sku: Dict[str, str] = {}
+        self._by_brand_id_norm_sku: Dict[str, str] = {}
+        self._by_brand_norm_sku: Dict[str, str] = {}
+        for brand_id, name in brands:
+            self._brand_ids.setdefault(name, str(brand_id))
+        for brand_id, alias in aliases:
+            self._alias_brand_ids.setdefault(alias, str(brand_id))
+        product_count = 0
+        for product_id, ean, sku, brand, brand_id in products:
+            product_count += 1
+            product_id = str(product_id)
+            if ean:
+                self._by_ean.setdefault(ean, product_id)
+            if not sku:
+                continue
+            norm_sku = normalize_sku(sku)
+            if brand_id:
+                self._by_brand_id_sku.setdefault(f"{brand_id}{CATALOG_KEY_SEP}{sku}", product_id)
+                if norm_sku is not None:
+                    self._by_brand_id_norm_sku.setdefault(f"{brand_id}{CATALOG_KEY_SEP}{norm_sku}", product_id)
+            if brand:
+                self._by_brand_sku.setdefault(f"{brand}{CATALOG_KEY_SEP}{sku}", product_id)
+                if norm_sku is not None:
+                    self._by_brand_norm_sku.setdefault(f"{brand}{CATALOG_KEY_SEP}{norm_sku}", product_id)
+        self.product_count = product_count
+        self.build_ms = (time.monotonic() - started) * 1000
+        METRICS.observe('catalog_build_ms', self.build_ms)
+
+    def resolve(self, ean: Optional[str], brand: Optional[str], sku: Optional[str]) -> Optional[str]:
+        """Returns the product id the SQL matcher would pick in its EAN / brand+SKU steps, or None."""
+        # find_or_create_brand(): exact brand name first, then alias
+        brand_id = (self._brand_ids.get(brand) or self._alias_brand_ids.get(brand)) if brand else None
+        if brand and brand_id is None:
+            return None # The trigger creates this brand before matching; leave the row to it
+        if self.ean_priority and ean:
+            product_id = self._by_ean.get(ean)
+            if product_id:
+                return product_id
+        if not (self.sku_brand_fallback and sku):
+            return None
+        if brand_id:
+            product_id = self._by_brand_id_sku.get(f"{brand_id}{CATALOG_KEY_SEP}{sku}")
+            if product_id:
+                return product_id
+        if brand:
+            product_id = self._by_brand_sku.get(f"{brand}{CATALOG_KEY_SEP}{sku}")
+            if product_id:
+                return product_id
+        norm_sku = normalize_sku(sku)
+        if norm_sku is None:
+            return None
+        if brand_id:
+            product_id = self._by_brand_id_norm_sku.get(f"{brand_id}{CATALOG_KEY_SEP}{norm_sku}")
+            if product_id:
+                return product_id
+        if brand:
+            return self._by_brand_norm_sku.get(f"{brand}{CATALOG_KEY_SEP}{norm_sku}")
+        return None
+
+
+class LastPriceCache:
+    """
+    Last staged price per product for one (user, competitor), kept in the SQLite file at
+    WORKER_PRICE_CACHE_PATH and shared by all runs of this worker host.
+
+    record_price_change only writes a price_changes row when the price differs from the latest
+    one for (competitor, product), so a pre-matched row with that same price changes nothing
+    but the staging table and can be skipped. Entries are trusted for WORKER_PRICE_CACHE_TTL_HOURS
+    after they were last confirmed against the DB. The cache is rebuilt from price_changes
+    whenever the count/latest changed_at of the competitor's price_changes differs from what
+    this cache saw at the end of its last run, i.e. after anything else wrote or deleted them.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS last_prices (
+            user_id TEXT NOT NULL, competitor_id TEXT NOT NULL, product_id TEXT NOT NULL,
+            price TEXT NOT NULL, currency TEXT, verified_at REAL NOT NULL,
+            PRIMARY KEY (user_id, competitor_id, product_id)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS price_sources (
+            user_id TEXT NOT NULL, competitor_id TEXT NOT NULL, probe TEXT NOT NULL,
+            PRIMARY KEY (user_id, competitor_id)
+        ) WITHOUT ROWID;
+    """
+    CENT = Decimal('0.01')
+
+    def __init__(self, conn, user_id: str, competitor_id: str):
+        self.user_id = user_id
+        self.competitor_id = competitor_id
+        self.suppressed = 0
+        self._ttl_seconds = WORKER_PRICE_CACHE_TTL_HOURS * 3600
+        self._prices: Dict[str, tuple] = {} # product_id -> (price, currency, verified_at)
+        self._dirty: Dict[str, tuple] = {}
+        self._db = sqlite3.connect(WORKER_PRICE_CACHE_PATH, timeout=30)
+        try:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.executescript(self.SCHEMA)
+            key = (user_id, competitor_id)
+            row = self._db.execute("SELECT probe FROM price_sources WHERE user_id = ? AND competitor_id = ?", key).fetchone()
+            self.warmed = row is None or row[0] != self._probe(conn)
+            if self.warmed:
+                self._warm(conn)
+            else:
+                for product_id, price, currency, verified_at in self._db.execute(
+                        "SELECT product_id, price, currency, verified_at FROM last_prices WHERE user_id = ? AND competitor_id = ?", key):
+                    self._prices[product_id] = (price, currency, verified_at)
+        except Exception:
+            self._db.close()
+            raise
+
+    def __len__(self) -> int:
+        return len(self._prices)
+
+    @classmethod
+    def price_key(cls, price) -> str:
+        """The price as numeric(10,2) stores it."""
+        return str(Decimal(str(price)).quantize(cls.CENT, ROUND_HALF_UP))
+
+    def _probe(self, conn) -> str:
+        with conn.cursor() as cur:
+            cur.execute("SELECT count(*), max(changed_at) FROM price_changes WHERE user_id = %s AND competitor_id = %s;",
+                        (self.user_id, self.competitor_id))
+            count, latest = cur.fetchone()
+        conn.commit()
+        return f"{count}|{latest.isoformat() if latest else ''}"
+
+    def _warm(self, conn):
+        """Reloads the latest price of every product from price_changes."""
+        now = time.time()
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT DISTINCT ON (product_id) product_id, new_price
+                FROM price_changes
+                WHERE user_id = %s AND competitor_id = %s
+                ORDER BY product_id, changed_at DESC;
+            """, (self.user_id, self.competitor_id))
+            # currency_code is not set for scraped prices; the first staged row fills it in
+            self._prices = {str(product_id): (self.price_key(price), None, now) for product_id, price in cur}
+        conn.commit()
+        METRICS.incr('price_cache_warms')
+        with self._db:
+            self._db.execute("DELETE FROM last_prices WHERE user_id = ? AND competitor_id = ?", (self.user_id, self.competitor_id))
+            self._db.executemany("INSERT INTO last_prices VALUES (?, ?, ?, ?, ?, ?)",
+                                 [(self.user_id, self.competitor_id, pid) + entry for pid, entry in self._prices.items()])
+
+    def is_unchanged(self, product_id: str, price: float, currency: Optional[str]) -> bool:
+        entry = self._prices.get(product_id)
+        if entry is None or time.time() - entry[2] > self._ttl_seconds:
+            return False
+        if entry[0] != self.price_key(price) or (entry[1] is not None and entry[1] != currency):
+            return False
+        self.suppressed += 1
+        return True
+
+    def record(self, rows: List[tuple]):
+        """Remembers the prices of committed rows that were inserted with a product_id."""
+        now = time.time()
+        for row in rows:
+            product_id = row[PRODUCT_ID_COLUMN]
+            if product_id is not None:
+                entry = (self.price_key(row[3]), row[4], now)
+                self._prices[product_id] = entry
+                self._dirty[product_id] = entry
+
+    def close(self, conn):
+        """Persists this run's prices together with the probe of price_changes after the run's own writes."""
+        try:
+            with self._db:
+                self._db.executemany("INSERT OR REPLACE INTO last_prices VALUES (?, ?, ?, ?, ?, ?)",
+                                     [(self.user_id, self.competitor_id, pid) + entry for pid, entry in self._dirty.items()])
+                self._db.execute("INSERT OR REPLACE INTO price_sources VALUES (?, ?, ?)",
+                                 (self.user_id, self.competitor_id, self._probe(conn)))
+        finally:
+            self._db.close()
 
 
 # --- Product Saving ---
 
-def save_temp_competitors_scraped_data(conn, run_id: str, user_id: str, competitor_id: str, products: List[Dict[str, Any]]) -> int:
+SCRAPED_DATA_COLUMNS = ("user_id", "competitor_id", "name", "price", "currency",
+                        "url", "image_url", "sku", "brand", "ean", "scraped_at", "product_id")
+PRODUCT_ID_COLUMN = SCRAPED_DATA_COLUMNS.index("product_id")
+COPY_SCRAPED_DATA_SQL = f"COPY temp_competitors_scraped_data ({', '.join(SCRAPED_DATA_COLUMNS)}) FROM STDIN"
+COPY_TEXT_ESCAPES = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r'})
+
+
+def copy_scraped_rows(cur, rows: List[tuple]):
+    """
+    Streams prepared rows into temp_competitors_scraped_data with one COPY (text format).
+    The buffer is built in memory with one translate() per field; row triggers such as
+    record_price_change fire for COPY just as they do for INSERT.
+    """
+    buf = io.StringIO()
+    write = buf.write
+    for row in rows:
+        write('\t'.join(['\\N' if v is None else str(v).translate(COPY_TEXT_ESCAPES) for v in row]))
+        write('\n')
+    buf.seek(0)
+    cur.copy_expert(COPY_SCRAPED_DATA_SQL, buf)
+
+
+class ProductsNotSavedError(Exception):
+    """Raised by save_temp_competitors_scraped_data when some rows could not be written; the others were."""
+
+    def __init__(self, inserted: int, not_saved: int, total: int):
+        super().__init__(f"{not_saved} of {total} products could not be saved")
+        self.inserted = inserted
+        self.not_saved = not_saved
+
+
+def save_temp_competitors_scraped_data(conn, run_id: str, user_id: str, competitor_id: str, products: List[Dict[str, Any]],
+                                       sizer: Optional["BatchSizer"] = None, catalog: Optional[CatalogIndex] = None,
+                                       price_cache: Optional[LastPriceCache] = None) -> int:
     """
     Saves a list of scraped products to the database with batching and retries.
-    Relies on DB trigger 'record_price_change' for product matching and price change recording.
-    Returns the number of successfully inserted products.
+    Relies on DB trigger 'record_price_change' for product matching and price change recording;
+    with a catalog, rows it can match are inserted with product_id already set, and with a price cache
+    matched rows whose price is unchanged are skipped.
+    With a sizer, chunk sizes follow sizer.batch_size and every commit and statement timeout is reported to it;
+    a statement timeout retries with a smaller chunk without using up an attempt, down to WORKER_WRITE_BATCH_MIN.
+    Returns the number of successfully inserted products; raises ProductsNotSavedError after writing
+    everything it could if some chunks still failed.
     """
     if not products:
         return 0
@@ -496,6 +1362,7 @@ def save_temp_competitors_scraped_data(conn, run_id: str, user_id: str, competit
     log_event("DEBUG", "DB_INSERT", run_id, f"Attempting to save {len(products)} products...")
 
     products_to_insert = []
+    matched = unmatched = suppressed = 0
     for p in products:
         # Basic validation/defaults before insertion
         if not isinstance(p, dict) or not p.get('name') or p.get('price') is None:
@@ -508,6 +1375,19 @@ def save_temp_competitors_scraped_data(conn, run_id: str, user_id: str, competit
              log_event("WARN", "DB_INSERT_PREP", run_id, f"Skipping product with invalid price '{p.get('price')}': {p.get('name')}")
              continue
 
+        product_id = None
+        if catalog is not None:
+            # Values are compared as text in SQL, whatever JSON type the script used
+            ean, brand, sku = (v if v is None or isinstance(v, str) else str(v) for v in (p.get('ean'), p.get('brand'), p.get('sku')))
+            product_id = catalog.resolve(ean, brand, sku)
+            if product_id is None:
+                unmatched += 1
+            else:
+                matched += 1
+                if price_cache is not None and price_cache.is_unchanged(product_id, price, p.get('currency', 'SEK')):
+                    suppressed += 1
+                    continue
+
         products_to_insert.append((
             user_id,
             # run_id, # Removed: scraper_run_id column does not exist in temp_competitors_scraped_data
@@ -520,14 +1400,22 @@ def save_temp_competitors_scraped_data(conn, run_id: str, user_id: str, competit
             p.get('sku'),
             p.get('brand'),
             p.get('ean'),
-            datetime.now(timezone.utc) # scraped_at timestamp
+            datetime.now(timezone.utc), # scraped_at timestamp
+            product_id # Pre-matched by the catalog index; NULL lets record_price_change match in SQL
         ))
 
+    if catalog is not None:
+        METRICS.incr('catalog_rows_matched', matched)
+        METRICS.incr('catalog_rows_unmatched', unmatched)
+    if suppressed:
+        METRICS.incr('price_cache_rows_suppressed', suppressed)
     if not products_to_insert:
-        log_event("WARN", "DB_INSERT", run_id, "No valid products found to insert after filtering/validation.")
+        if not suppressed:
+            log_event("WARN", "DB_INSERT", run_id, "No valid products found to insert after filtering/validation.")
         return 0
 
-    # Use DB_BATCH_SIZE defined globally
+    # One statement and commit per chunk: DB_BATCH_SIZE rows for INSERT, WORKER_COPY_BATCH_SIZE for COPY, unless a sizer decides
+    use_copy = WORKER_INGEST_MODE == "copy"
     MAX_RETRIES = 3
     RETRY_DELAY_S = 1
     inserted_count = 0
@@ -537,9 +1425,12 @@ def save_temp_competitors_scraped_data(conn, run_id: str, user_id: str, competit
         conn = validate_and_reconnect_if_needed(conn) # Ensure connection
 
         with conn.cursor() as cur:
-            for i in range(0, total_to_insert, DB_BATCH_SIZE):
-                chunk = products_to_insert[i:i + DB_BATCH_SIZE]
-                chunk_number = (i // DB_BATCH_SIZE) + 1
+            i = 0
+            chunk_number = 0
+            while i < total_to_insert:
+                chunk_size = sizer.batch_size if sizer else INGEST_BATCH_SIZE
+                chunk = products_to_insert[i:i + chunk_size]
+                chunk_number += 1
                 attempt = 0
                 success = False
 
@@ -547,21 +1438,42 @@ def save_temp_competitors_scraped_data(conn, run_id: str, user_id: str, competit
                     attempt += 1
                     try:
                         log_event("DEBUG", "DB_INSERT", run_id, f"Attempt {attempt}/{MAX_RETRIES} inserting chunk {chunk_number} ({len(chunk)} products)...")
-                        # Use execute_values for efficient batch insertion
-                        sql = """
-                            INSERT INTO temp_competitors_scraped_data (
-                                user_id, competitor_id, name, price, currency,
-                                url, image_url, sku, brand, ean, scraped_at
-                            ) VALUES %s
-                        """
-                        psycopg2.extras.execute_values(cur, sql, chunk, page_size=len(chunk))
+                        chunk_started = time.monotonic()
+                        if use_copy:
+                            copy_scraped_rows(cur, chunk)
+                        else:
+                            # Use execute_values for efficient batch insertion
+                            sql = """
+                                INSERT INTO temp_competitors_scraped_data (
+                                    user_id, competitor_id, name, price, currency,
+                                    url, image_url, sku, brand, ean, scraped_at, product_id
+                                ) VALUES %s
+                            """
+                            psycopg2.extras.execute_values(cur, sql, chunk, page_size=len(chunk))
                         conn.commit() # Commit after each successful chunk insert
+                        if sizer:
+                            sizer.record(len(chunk), time.monotonic() - chunk_started)
+                        if price_cache is not None:
+                            price_cache.record(chunk)
                         inserted_count += len(chunk)
                         log_event("INFO", "DB_INSERT", run_id, f"Successfully inserted chunk {chunk_number}. Total inserted so far: {inserted_count}")
                         success = True
                     except psycopg2.Error as e:
                         conn.rollback() # Rollback failed chunk insert
                         log_event("WARN", "DB_INSERT", run_id, f"Attempt {attempt} failed for chunk {chunk_number}: {e}")
+                        if sizer and e.pgcode == psycopg2.errorcodes.QUERY_CANCELED:
+                            # statement_timeout: retry with a smaller chunk, the rest moves on to the next one
+                            sizer.on_timeout(len(chunk))
+                            if sizer.batch_size < len(chunk):
+                                # Shrinking is not a failed attempt; only timeouts at the minimum size count
+                                chunk = chunk[:sizer.batch_size]
+                                attempt -= 1
+                                conn = validate_and_reconnect_if_needed(conn)
+                                cur = conn.cursor()
+                                continue
+                        elif catalog is not None and e.pgcode == psycopg2.errorcodes.FOREIGN_KEY_VIOLATION:
+                            # A pre-matched product was deleted or merged since the index was built; let SQL match again
+                            chunk = [row[:PRODUCT_ID_COLUMN] + (None,) + row[PRODUCT_ID_COLUMN + 1:] for row in chunk]
                         if attempt >= MAX_RETRIES:
                             log_event("ERROR", "DB_INSERT", run_id, f"Failed to insert chunk {chunk_number} after {MAX_RETRIES} attempts. Error: {e}")
                             # Decide whether to raise or just log and continue
@@ -580,6 +1492,7 @@ def save_temp_competitors_scraped_data(conn, run_id: str, user_id: str, competit
                         time.sleep(RETRY_DELAY_S * attempt)
                         conn = validate_and_reconnect_if_needed(conn)
                         cur = conn.cursor()
+                i += len(chunk)
 
     except Exception as outer_e:
          log_event("ERROR", "DB_INSERT", run_id, f"Outer error during product saving: {outer_e}")
@@ -589,9 +1502,874 @@ def save_temp_competitors_scraped_data(conn, run_id: str, user_id: str, competit
          except Exception: pass
 
     log_event("INFO", "DB_INSERT", run_id, f"Finished saving products. Total successfully inserted: {inserted_count}/{total_to_insert}")
+    if inserted_count < total_to_insert:
+        METRICS.incr('rows_not_saved', total_to_insert - inserted_count)
+        raise ProductsNotSavedError(inserted_count, total_to_insert - inserted_count, total_to_insert)
     return inserted_count
 
 
+class BatchSizer:
+    """
+    Picks the DB batch size and flush interval for one run's writer.
+
+    Insert cost is dominated by the per-row record_price_change trigger, so the per-row time of
+    each commit (statement plus trigger work) is tracked as a moving average and the batch is
+    sized to finish within WORKER_WRITE_TARGET_MS, between WORKER_WRITE_BATCH_MIN and
+    WORKER_WRITE_BATCH_MAX. Growth is capped at 2x per commit; a statement timeout halves it and
+    keeps it below 3/4 of the size that timed out for the rest of the run.
+    The flush interval (how long a partial batch may wait for more rows) follows the commit
+    latency, between WORKER_WRITE_FLUSH_MIN_SECONDS and WORKER_WRITE_FLUSH_MAX_SECONDS.
+    """
+
+    EWMA_WEIGHT = 0.3 # Weight of the newest commit in the moving averages
+
+    def __init__(self, run_id: str):
+        self.run_id = run_id
+        self.batch_size = self._clamp_size(INGEST_BATCH_SIZE)
+        self.flush_interval = WORKER_WRITE_FLUSH_MIN_SECONDS
+        self.timeouts = 0
+        self.commits = 0
+        self.smallest = self.largest = self.batch_size
+        self._ceiling = WORKER_WRITE_BATCH_MAX # Lowered below any size that hit statement_timeout
+        self._row_seconds: Optional[float] = None
+        self._commit_seconds: Optional[float] = None
+        log_event("INFO", "DB_BATCH_SAVE", run_id, f"Batch sizing: starting at {self.batch_size} rows "
+                  f"(bounds {WORKER_WRITE_BATCH_MIN}-{WORKER_WRITE_BATCH_MAX}, target {WORKER_WRITE_TARGET_MS} ms per commit)")
+
+    @staticmethod
+    def _clamp_size(size: int) -> int:
+        return max(WORKER_WRITE_BATCH_MIN, min(WORKER_WRITE_BATCH_MAX, int(size)))
+
+    def _ewma(self, average: Optional[float], sample: float) -> float:
+        return sample if average is None else average + self.EWMA_WEIGHT * (sample - average)
+
+    def record(self, rows: int, seconds: float):
+        """Feeds back one successful commit of `rows` rows that took `seconds`."""
+        self.commits += 1
+        self._row_seconds = self._ewma(self._row_seconds, seconds / rows)
+        self._commit_seconds = self._ewma(self._commit_seconds, seconds)
+        METRICS.observe('write_commit_ms', seconds * 1000)
+        METRICS.observe('write_row_ms', seconds / rows * 1000)
+        METRICS.observe('write_batch_size', rows)
+
+        # A partial batch carries the fixed per-statement cost over fewer rows; only let it shrink the size
+        target = WORKER_WRITE_TARGET_MS / 1000 / max(self._row_seconds, 1e-6)
+        if rows >= self.batch_size // 2 or target < self.batch_size:
+            self._resize(min(target, self.batch_size * 2, self._ceiling),
+                         f"commit {seconds * 1000:.0f} ms, {self._row_seconds * 1000:.2f} ms/row")
+
+        # Wait about four commits' worth for more rows, so trickling output spends little time in commits
+        self.flush_interval = max(WORKER_WRITE_FLUSH_MIN_SECONDS,
+                                  min(WORKER_WRITE_FLUSH_MAX_SECONDS, 4 * self._commit_seconds))
+
+    def on_timeout(self, rows: int):
+        """A chunk of `rows` rows hit statement_timeout."""
+        self.timeouts += 1
+        METRICS.incr('write_statement_timeouts')
+        self._ceiling = max(WORKER_WRITE_BATCH_MIN, min(self._ceiling, rows * 3 // 4))
+        self._resize(rows // 2, "statement timeout")
+
+    def _resize(self, size: float, reason: str):
+        size = self._clamp_size(size)
+        if size == self.batch_size:
+            return
+        log_event("INFO", "DB_BATCH_SAVE", self.run_id, f"Batch sizing: {self.batch_size} -> {size} rows ({reason})")
+        self.batch_size = size
+        self.smallest = min(self.smallest, size)
+        self.largest = max(self.largest, size)
+
+    def summary(self) -> str:
+        return (f"{self.commits} commits, batch size {self.batch_size} (range used {self.smallest}-{self.largest}), "
+                f"flush interval {self.flush_interval:.1f}s, {self.timeouts} statement timeouts")
+
+
+class ProductBatchWriter:
+    """
+    Background writer stage for one run's products.
+
+    The ingest loop hands over products with put() and goes straight back to draining the
+    script's pipes, while this writer inserts them on its own thread and connection, so scraping
+    and persistence overlap. Handed-over batches are regrouped into DB batches sized by a
+    BatchSizer; a partial batch is written once it has waited sizer.flush_interval seconds.
+    The hand-off queue holds WORKER_WRITE_QUEUE_BATCHES batches; when
+    the DB falls further behind, batches are spilled to a file under WORKER_WRITE_SPILL_DIR
+    (up to WORKER_WRITE_SPILL_MAX_MB) and written back in order. Only when the spill is full
+    does put() block, which in turn stalls the script on its stdout pipe.
+    """
+
+    def __init__(self, run_id: str, user_id: str, competitor_id: str):
+        self.run_id = run_id
+        self.user_id = user_id
+        self.competitor_id = competitor_id
+        self.inserted = 0
+        self.not_saved = 0 # Products lost to failed DB writes; the run fails if any
+        self.cpu_seconds = 0.0
+        self.error: Optional[Exception] = None
+        self.sizer = BatchSizer(run_id)
+        self.catalog: Optional[CatalogIndex] = None
+        self.price_cache: Optional[LastPriceCache] = None
+        self._catalog_loaded = not WORKER_CATALOG_MATCHING
+        self._pending: List[Dict[str, Any]] = [] # Products received but not yet written (writer thread only)
+        self._pending_enqueued: deque = deque() # [hand-over time, products still pending] per batch, for writer_lag_ms
+        self._queue: "queue.Queue" = queue.Queue(maxsize=WORKER_WRITE_QUEUE_BATCHES)
+        self._cond = threading.Condition() # Guards the spill state; signalled whenever the writer frees space
+        self._spill_writer = None
+        self._spill_reader = None
+        self._spill_path: Optional[str] = None
+        self._spilled_batches = 0
+        self._spill_bytes = 0
+        self._spill_bytes_total = 0
+        self._closing = False
+        self._backpressure_logged = False
+        self._conn = None
+        self._thread = threading.Thread(target=self._run, name=f"product-writer-{run_id[:8]}", daemon=True)
+        self._thread.start()
+
+    def put(self, products: List[Dict[str, Any]]):
+        """Queues a batch for insertion; spills it to disk if the queue is full and blocks only if the spill is full too."""
+        item = (time.monotonic(), products)
+        wait_started = None
+        with self._cond:
+            while True:
+                # Once batches are spilled, later ones queue up behind them on disk to keep the order
+                if not self._spilled_batches:
+                    try:
+                        self._queue.put_nowait(item)
+                        break
+                    except queue.Full:
+                        pass
+                if self._spill(item):
+                    break
+                if wait_started is None:
+                    wait_started = time.monotonic()
+                    if not self._backpressure_logged:
+                        self._backpressure_logged = True
+                        log_event("WARN", "DB_BATCH_SAVE", self.run_id, "Product writer and spill are full; pausing ingest until the DB catches up.")
+                self._cond.wait(1.0)
+        METRICS.observe('write_queue_depth', self._queue.qsize() + self._spilled_batches)
+        if wait_started is not None:
+            METRICS.observe('write_backpressure_ms', (time.monotonic() - wait_started) * 1000)
+
+    def _spill(self, item) -> bool:
+        """Appends a batch to the spill file. Caller holds the condition."""
+        line = json.dumps({"enqueued_at": item[0], "products": item[1]}) + "\n"
+        if self._spill_bytes + len(line) > WORKER_WRITE_SPILL_MAX_MB * 1024 * 1024:
+            return False
+        try:
+            if self._spill_writer is None:
+                fd, self._spill_path = tempfile.mkstemp(prefix=f"py-worker-spill-{self.run_id}-", suffix=".jsonl",
+                                                        dir=WORKER_WRITE_SPILL_DIR)
+                self._spill_writer = os.fdopen(fd, 'w', encoding='utf-8')
+                self._spill_reader = open(self._spill_path, 'r', encoding='utf-8')
+            self._spill_writer.write(line)
+            self._spill_writer.flush()
+        except OSError as e:
+            log_event("WARN", "DB_BATCH_SAVE", self.run_id, f"Cannot spill product batch to disk: {e}")
+            return False
+        if not self._spilled_batches and not self._spill_bytes_total:
+            log_event("WARN", "DB_BATCH_SAVE", self.run_id, f"DB writes are falling behind; spilling product batches to {self._spill_path}")
+        self._spilled_batches += 1
+        self._spill_bytes += len(line)
+        self._spill_bytes_total += len(line)
+        METRICS.incr('write_batches_spilled')
+        return True
+
+    def _take_spilled(self):
+        """Reads the oldest spilled batch back, or returns None if nothing is spilled."""
+        with self._cond:
+            if not self._spilled_batches:
+                return None
+            entry = json.loads(self._spill_reader.readline())
+            self._spilled_batches -= 1
+            if not self._spilled_batches:
+                # Spill drained: start over at the beginning of the file
+                self._spill_writer.seek(0)
+                self._spill_writer.truncate()
+                self._spill_reader.seek(0)
+                self._spill_bytes = 0
+            self._cond.notify_all()
+            return entry["enqueued_at"], entry["products"]
+
+    def _run(self):
+        cpu_started = time.thread_time()
+        try:
+            while True:
+                # Queued batches predate spilled ones; only sleep once both are empty
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    item = self._take_spilled()
+                    if item is None:
+                        waited = time.monotonic() - self._pending_enqueued[0][0] if self._pending else 0.0
+                        if self._pending and (self._closing or waited >= self.sizer.flush_interval):
+                            self._write(flush=True)
+                            continue
+                        if self._closing:
+                            break
+                        try:
+                            item = self._queue.get(timeout=min(0.2, max(0.01, self.sizer.flush_interval - waited)))
+                        except queue.Empty:
+                            continue
+                with self._cond:
+                    self._cond.notify_all()
+                self._pending_enqueued.append([item[0], len(item[1])])
+                self._pending.extend(item[1])
+                if len(self._pending) >= self.sizer.batch_size:
+                    self._write()
+        finally:
+            if self.price_cache is not None:
+                try:
+                    self.price_cache.close(self._conn)
+                except Exception as e:
+                    log_event("WARN", "DB_BATCH_SAVE", self.run_id, f"Could not save the price cache: {e}")
+            self.cpu_seconds = time.thread_time() - cpu_started
+            get_db_pool().putconn(self._conn)
+
+    def _write(self, flush: bool = False):
+        """Writes the full DB batches pending, or everything pending when flushing."""
+        size = self.sizer.batch_size
+        take = len(self._pending) if flush else len(self._pending) // size * size
+        products = self._pending[:take]
+        del self._pending[:take]
+        written_batches = []
+        while take and self._pending_enqueued:
+            batch = self._pending_enqueued[0]
+            if batch[1] > take:
+                batch[1] -= take
+                break
+            take -= batch[1]
+            written_batches.append(self._pending_enqueued.popleft()[0])
+        try:
+            log_event("INFO", "DB_BATCH_SAVE", self.run_id, f"Saving batch of {len(products)} products...")
+            self._conn = validate_and_reconnect_if_needed(self._conn) if self._conn is not None else get_db_pool().getconn()
+            if not self._catalog_loaded:
+                self._load_catalog()
+            inserted = save_temp_competitors_scraped_data(self._conn, self.run_id, self.user_id, self.competitor_id, products,
+                                                          sizer=self.sizer, catalog=self.catalog, price_cache=self.price_cache)
+            self.inserted += inserted
+            log_event("INFO", "DB_BATCH_SAVE", self.run_id, f"Successfully inserted {inserted} products.")
+        except ProductsNotSavedError as e:
+            self.inserted += e.inserted
+            self.not_saved += e.not_saved
+            log_event("ERROR", "DB_BATCH_SAVE", self.run_id, f"Product writer saved only part of a batch of {len(products)}: {e}")
+            if self.error is None:
+                self.error = e
+        except Exception as e:
+            self.not_saved += len(products)
+            log_event("ERROR", "DB_BATCH_SAVE", self.run_id, f"Product writer failed to save a batch of {len(products)}: {e}")
+            if self.error is None:
+                self.error = e
+        now = time.monotonic()
+        for enqueued_at in written_batches:
+            METRICS.observe('writer_lag_ms', (now - enqueued_at) * 1000)
+
+    def _load_catalog(self):
+        """Gets the user's catalog index from the filter cache on the writer's connection before the first batch."""
+        self._catalog_loaded = True
+        try:
+            self.catalog = get_filter_cache().get(self._conn, 'catalog', self.user_id)
+            self._conn.commit()
+            log_event("INFO", "DB_BATCH_SAVE", self.run_id, f"Catalog index: {self.catalog.product_count} products, built in "
+                      f"{self.catalog.build_ms:.0f} ms (ean_priority={self.catalog.ean_priority}, sku_brand_fallback={self.catalog.sku_brand_fallback})")
+        except Exception as e:
+            log_event("WARN", "DB_BATCH_SAVE", self.run_id, f"Could not build the catalog index, matching stays in SQL: {e}")
+            try: self._conn.rollback()
+            except Exception: pass
+            return
+        if not WORKER_PRICE_CACHE_PATH:
+            return
+        try:
+            self.price_cache = LastPriceCache(self._conn, self.user_id, self.competitor_id)
+            log_event("INFO", "DB_BATCH_SAVE", self.run_id, f"Price cache: {len(self.price_cache)} last prices "
+                      f"({'reloaded from price_changes' if self.price_cache.warmed else 'from cache'})")
+        except Exception as e:
+            log_event("WARN", "DB_BATCH_SAVE", self.run_id, f"Could not open the price cache, staging every row: {e}")
+            try: self._conn.rollback()
+            except Exception: pass
+
+    @property
+    def suppressed(self) -> int:
+        """Rows skipped because the price cache showed their price unchanged."""
+        return self.price_cache.suppressed if self.price_cache is not None else 0
+
+    def close(self) -> int:
+        """Waits until every queued and spilled batch is written and returns the number of inserted products."""
+        if self._closing:
+            return self.inserted
+        self._closing = True
+        self._thread.join()
+        log_event("INFO", "DB_BATCH_SAVE", self.run_id, f"Batch sizing: {self.sizer.summary()}")
+        if self.price_cache is not None:
+            log_event("INFO", "DB_BATCH_SAVE", self.run_id, f"Price cache: {self.suppressed} rows with unchanged prices were not staged")
+        with self._cond:
+            for f in (self._spill_writer, self._spill_reader):
+                if f is not None:
+                    try: f.close()
+                    except OSError: pass
+            self._spill_writer = self._spill_reader = None
+            if self._spill_path:
+                try: os.remove(self._spill_path)
+                except OSError: pass
+                self._spill_path = None
+        return self.inserted
+
+
+# --- Script Runner ---
+
+# Import names for pip requirement names that differ from them
+REQUIREMENT_MODULES = {
+    'beautifulsoup4': 'bs4',
+    'fake-useragent': 'fake_useragent',
+    'jsonpath-ng': 'jsonpath_ng',
+    'python-dateutil': 'dateutil',
+    'pyyaml': 'yaml',
+}
+# Libraries that are safe to import once in the fork server (no threads or sockets at import time).
+# Anything else listed in required_libraries is imported by the forked child as usual.
+FORKSERVER_PRELOADABLE = {
+    'requests', 'urllib3', 'bs4', 'lxml', 'html5lib', 'selectolax', 'parsel', 'pyquery',
+    'httpx', 'w3lib', 'extruct', 'jsonpath_ng', 'parse', 'fake_useragent', 'tqdm',
+    'numpy', 'pandas', 'dateutil', 'yaml',
+}
+
+_fork_server: Optional[ForkServerClient] = None
+_fork_server_lock = threading.Lock()
+
+
+def get_required_libraries(script_content: str) -> List[str]:
+    """
+    Reads get_metadata()["required_libraries"] from the script source without executing it.
+    Returns the import names of the listed libraries, or an empty list if they can't be determined.
+    """
+    try:
+        tree = ast.parse(script_content)
+    except SyntaxError:
+        return []
+    for node in tree.body:
+        if isinstance(node, ast.FunctionDef) and node.name == 'get_metadata':
+            for child in ast.walk(node):
+                if not isinstance(child, ast.Dict):
+                    continue
+                for key, value in zip(child.keys, child.values):
+                    if isinstance(key, ast.Constant) and key.value == 'required_libraries':
+                        try:
+                            libraries = ast.literal_eval(value)
+                        except ValueError:
+                            return []
+                        return [REQUIREMENT_MODULES.get(str(lib).lower(), str(lib).replace('-', '_'))
+                                for lib in libraries if isinstance(lib, str)]
+    return []
+
+
+def get_script_string_constants(script_content: str) -> set:
+    """
+    Returns the string literals in the script source. Used to detect optional worker features a
+    script supports, e.g. '--context-file' in its argument parser or the PRICETRACKER_PROGRESS_FD channel.
+    """
+    try:
+        tree = ast.parse(script_content)
+    except SyntaxError:
+        return set()
+    return {node.value for node in ast.walk(tree) if isinstance(node, ast.Constant) and isinstance(node.value, str)}
+
+
+def write_context_file(context_json: str) -> str:
+    """Writes a run's context to a private temporary file and returns its path. The caller removes it."""
+    fd, path = tempfile.mkstemp(prefix='py-worker-context-', suffix='.json')
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        f.write(context_json)
+    return path
+
+
+def get_fork_server() -> ForkServerClient:
+    global _fork_server
+    with _fork_server_lock:
+        if _fork_server is None:
+            _fork_server = ForkServerClient(WORKER_FORKSERVER_PRELOAD)
+        return _fork_server
+
+
+def start_script_process(run_id: str, script_path: str, args: List[str], cwd: str, env: Dict[str, str],
+                         required_libraries: List[str], progress_fd: Optional[int] = None,
+                         control_fd: Optional[int] = None):
+    """
+    Starts a scraper script and returns a Popen-like handle with text stdout/stderr pipes.
+    Uses the warm fork server when enabled and falls back to a fresh interpreter if it fails.
+    progress_fd is the write end of the run's progress pipe; the script finds it through
+    PRICETRACKER_PROGRESS_FD. control_fd is the read end of the run's control pipe, found
+    through PRICETRACKER_CONTROL_FD. The caller closes its own copies once the script has started.
+    """
+    channels = [(env_name, fd) for env_name, fd in ((PROGRESS_FD_ENV, progress_fd), (CONTROL_FD_ENV, control_fd)) if fd is not None]
+    if WORKER_SCRIPT_RUNNER == 'forkserver' and FORKSERVER_SUPPORTED:
+        preload = [lib for lib in required_libraries if lib in FORKSERVER_PRELOADABLE]
+        try:
+            spawn_started = time.perf_counter()
+            forked_env = dict(env)
+            for child_fd, (env_name, _) in enumerate(channels, start=3): # Extra fds of a forked child start at 3
+                forked_env[env_name] = str(child_fd)
+            process = get_fork_server().spawn(script_path, args, cwd, forked_env, preload=preload,
+                                              extra_fds=[fd for _, fd in channels] or None)
+            METRICS.observe('script_spawn_ms', (time.perf_counter() - spawn_started) * 1000)
+            METRICS.incr('forkserver_runs')
+            log_event("DEBUG", "SUBPROCESS_SETUP", run_id, f"Forked warm scraper process {process.pid} (preloaded: {preload})")
+            return process
+        except Exception as e:
+            METRICS.incr('forkserver_fallbacks')
+            log_event("WARN", "SUBPROCESS_SETUP", run_id, f"Fork server unavailable ({e}), starting a fresh interpreter instead.")
+
+    spawn_started = time.perf_counter()
+    if channels:
+        env = dict(env, **{env_name: str(fd) for env_name, fd in channels}) # pass_fds keeps the fd numbers
+    process = subprocess.Popen(
+        [sys.executable, script_path, *args],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        pass_fds=tuple(fd for _, fd in channels),
+        cwd=cwd,
+        env=env, # Pass the modified environment
+        text=True, # Read streams as text
+        encoding='utf-8', # Expect UTF-8 encoding
+        errors='strict' # Fail loudly if decoding error occurs
+    )
+    METRICS.observe('script_spawn_ms', (time.perf_counter() - spawn_started) * 1000)
+    METRICS.incr('subprocess_runs')
+    return process
+
+
+class ScriptControlChannel:
+    """
+    Worker end of a run's control pipe. Commands are JSON lines; so far the only one is
+    {"command": "stop", "reason": ...}, sent when the worker needs no more products from the run.
+    The worker closes its end right after, so the script also sees EOF. Scripts built from
+    python_template.py poll it with should_stop(); the worker kills other scripts once the
+    stop grace period is over.
+    """
+
+    def __init__(self, fd: int):
+        self._fd = fd
+        self.stop_reason: Optional[str] = None
+        self.stop_requested_at: Optional[float] = None
+        self.killed = False # The script outlived the grace period and was killed after the stop request
+
+    def request_stop(self, reason: str):
+        if self.stop_reason is not None:
+            return
+        self.stop_reason = reason
+        self.stop_requested_at = time.monotonic()
+        if self._fd is not None:
+            try:
+                os.set_blocking(self._fd, False)
+                os.write(self._fd, (json.dumps({"command": "stop", "reason": reason}) + "\n").encode('utf-8'))
+            except OSError:
+                pass # Script already gone or its pipe is full; the grace period still applies
+        self.close()
+
+    def close(self):
+        if self._fd is not None:
+            try: os.close(self._fd)
+            except OSError: pass
+            self._fd = None
+
+
+class ScriptOutputReader:
+    """
+    Event-driven reader for a script's stdout/stderr pipes (and its progress pipe, if any).
+
+    The pipes (and, where available, an fd that signals process exit) are watched with a
+    selector. Pipes are read in large binary chunks and split into lines in bulk, so ingest
+    costs no reader threads, queues or sleeps. Reading ends when all pipes reach EOF, or
+    shortly after the script exits if something it spawned still holds them open.
+    """
+    CHUNK_SIZE = 1 << 16
+    EXIT_DRAIN_SECONDS = 2.0 # How long to keep reading after exit if the pipes stay open
+    EXIT_POLL_SECONDS = 1.0 # Exit check interval when no exit fd is available
+
+    def __init__(self, process, progress_fd: Optional[int] = None):
+        self.process = process
+        self._selector = selectors.DefaultSelector()
+        self._decoders = {}
+        self._partial = {}
+        self._open_streams = 0
+        self._progress_fd = progress_fd
+        streams = [('stdout', process.stdout.fileno()), ('stderr', process.stderr.fileno())]
+        if progress_fd is not None:
+            streams.append(('progress', progress_fd))
+        for name, fd in streams:
+            os.set_blocking(fd, False)
+            self._selector.register(fd, selectors.EVENT_READ, name)
+            self._decoders[name] = codecs.getincrementaldecoder('utf-8')('strict') # Fail loudly like the text pipes did
+            self._partial[name] = ''
+            self._open_streams += 1
+
+        self._pidfd = None
+        exit_fd = process.exit_fd() if hasattr(process, 'exit_fd') else None
+        if exit_fd is None and hasattr(os, 'pidfd_open'):
+            try:
+                self._pidfd = exit_fd = os.pidfd_open(process.pid)
+            except OSError:
+                exit_fd = None # Kernel without pidfd support; fall back to periodic exit checks
+        self._watching_exit = exit_fd is not None
+        if self._watching_exit:
+            self._selector.register(exit_fd, selectors.EVENT_READ, 'exit')
+        self._exited_at: Optional[float] = None
+
+    @property
+    def done(self) -> bool:
+        if self._open_streams == 0:
+            return True
+        return self._exited_at is not None and time.monotonic() - self._exited_at > self.EXIT_DRAIN_SECONDS
+
+    def _stop_watching_exit(self):
+        if self._watching_exit:
+            self._watching_exit = False
+            for key in list(self._selector.get_map().values()):
+                if key.data == 'exit':
+                    self._selector.unregister(key.fd)
+        if self._pidfd is not None:
+            os.close(self._pidfd)
+            self._pidfd = None
+
+    def _check_exit(self):
+        if self._exited_at is None and self.process.poll() is not None:
+            self._exited_at = time.monotonic()
+            self._stop_watching_exit()
+
+    def read(self, timeout: float) -> Dict[str, List[str]]:
+        """Waits up to timeout for output and returns the lines read per stream ('stdout', 'stderr', 'progress'), without newlines."""
+        lines = {'stdout': [], 'stderr': [], 'progress': []}
+        if self._exited_at is not None:
+            timeout = min(timeout, max(0.0, self._exited_at + self.EXIT_DRAIN_SECONDS - time.monotonic()))
+        elif not self._watching_exit:
+            timeout = min(timeout, self.EXIT_POLL_SECONDS)
+
+        events = self._selector.select(max(0.0, timeout))
+        if not events:
+            self._check_exit()
+        for key, _ in events:
+            name = key.data
+            if name == 'exit':
+                self._check_exit()
+                continue
+            try:
+                data = os.read(key.fd, self.CHUNK_SIZE)
+            except BlockingIOError:
+                continue
+            if data:
+                text = self._partial[name] + self._decoders[name].decode(data)
+                parts = text.split('\n')
+                self._partial[name] = parts.pop()
+                lines[name].extend(parts)
+            else:
+                # EOF: hand over an unterminated last line too
+                tail = self._partial[name] + self._decoders[name].decode(b'', final=True)
+                self._partial[name] = ''
+                if tail:
+                    lines[name].append(tail)
+                self._selector.unregister(key.fd)
+                self._open_streams -= 1
+        return lines
+
+    def close(self):
+        self._stop_watching_exit()
+        self._selector.close()
+        for stream in (self.process.stdout, self.process.stderr):
+            try: stream.close()
+            except Exception: pass
+        if self._progress_fd is not None:
+            try: os.close(self._progress_fd)
+            except OSError: pass
+
+
+class RunOutputCapture:
+    """
+    Bounded record of a run's output. Recent stderr lines and script-reported errors are kept
+    in fixed-size ring buffers for error_details; with WORKER_RAW_CAPTURE_DIR set, the raw
+    stdout/stderr is also spilled to <run_id>.stdout.log / <run_id>.stderr.log there, up to
+    WORKER_RAW_CAPTURE_MAX_MB per stream. Worker memory stays flat however long the run.
+    """
+
+    def __init__(self, run_id: str):
+        self.run_id = run_id
+        self.stderr_tail = deque(maxlen=STDERR_TAIL_LINES)
+        self.script_errors = deque(maxlen=SCRIPT_ERRORS_KEPT)
+        self.script_error_count = 0
+        self._files = {}
+        self._written = {}
+        if WORKER_RAW_CAPTURE_DIR:
+            try:
+                os.makedirs(WORKER_RAW_CAPTURE_DIR, exist_ok=True)
+                for name in ('stdout', 'stderr'):
+                    path = os.path.join(WORKER_RAW_CAPTURE_DIR, f"{run_id}.{name}.log")
+                    self._files[name] = open(path, 'w', encoding='utf-8', newline='\n')
+                    self._written[name] = 0
+            except OSError as e:
+                log_event("WARN", "SUBPROCESS_SETUP", run_id, f"Raw output capture disabled: {e}")
+                self.close()
+
+    @staticmethod
+    def _clip(line: str) -> str:
+        return line if len(line) <= TAIL_LINE_MAX_CHARS else line[:TAIL_LINE_MAX_CHARS] + "...[truncated]"
+
+    def add_stderr_line(self, line: str):
+        self.stderr_tail.append(self._clip(line))
+
+    def add_script_error(self, error_line: str):
+        self.script_error_count += 1
+        self.script_errors.append(self._clip(error_line))
+
+    def script_errors_text(self) -> str:
+        omitted = self.script_error_count - len(self.script_errors)
+        prefix = f"({omitted} earlier errors omitted)\n" if omitted else ""
+        return prefix + "\n".join(self.script_errors)
+
+    def last_stderr_lines(self, count: int = 10) -> List[str]:
+        return list(self.stderr_tail)[-count:]
+
+    def write_raw(self, name: str, lines: List[str]):
+        f = self._files.get(name)
+        if f is None or not lines:
+            return
+        text = "\n".join(lines) + "\n"
+        limit = WORKER_RAW_CAPTURE_MAX_MB * 1024 * 1024
+        try:
+            if self._written[name] + len(text) > limit:
+                f.write(text[:max(0, limit - self._written[name])])
+                f.write(f"\n[raw capture stopped at {WORKER_RAW_CAPTURE_MAX_MB} MB]\n")
+                f.close()
+                del self._files[name]
+                return
+            f.write(text)
+            self._written[name] += len(text)
+        except OSError as e:
+            log_event("WARN", "SUBPROCESS_EXEC", self.run_id, f"Stopping raw {name} capture: {e}")
+            try: f.close()
+            except OSError: pass
+            del self._files[name]
+
+    def close(self):
+        for f in self._files.values():
+            try: f.close()
+            except OSError: pass
+        self._files = {}
+
+
+# --- Script Cache ---
+
+class CachedScript:
+    """A scraper script in the script cache. run_path is the bytecode file when the source compiles, else the source."""
+
+    def __init__(self, digest: str, source_path: str, run_path: str, size: int):
+        self.digest = digest
+        self.source_path = source_path
+        self.run_path = run_path
+        self.size = size
+        self.pins = 0 # Jobs currently running this entry; pinned entries are never evicted
+        self._required_libraries: Optional[List[str]] = None
+        self._accepts_context_file = False
+        self._uses_progress_channel = False
+        self._uses_control_channel = False
+
+    def analyze(self, source: Optional[str] = None):
+        """Reads what the worker needs to know about the script from its source (once)."""
+        if source is None:
+            try:
+                with open(self.source_path, 'r', encoding='utf-8') as f:
+                    source = f.read()
+            except OSError:
+                source = ""
+        self._required_libraries = get_required_libraries(source)
+        string_constants = get_script_string_constants(source)
+        self._accepts_context_file = '--context-file' in string_constants
+        self._uses_progress_channel = PROGRESS_FD_ENV in string_constants
+        self._uses_control_channel = CONTROL_FD_ENV in string_constants
+
+    @property
+    def required_libraries(self) -> List[str]:
+        if self._required_libraries is None:
+            self.analyze()
+        return self._required_libraries
+
+    @property
+    def accepts_context_file(self) -> bool:
+        if self._required_libraries is None:
+            self.analyze()
+        return self._accepts_context_file
+
+    @property
+    def uses_progress_channel(self) -> bool:
+        """True if the script reports progress as JSON frames (report_progress in python_template.py)."""
+        if self._required_libraries is None:
+            self.analyze()
+        return self._uses_progress_channel
+
+    @property
+    def uses_control_channel(self) -> bool:
+        """True if the script listens for worker commands such as stop (should_stop in python_template.py)."""
+        if self._required_libraries is None:
+            self.analyze()
+        return self._uses_control_channel
+
+
+class ScriptCache:
+    """
+    Local on-disk cache of scraper scripts, keyed by the SHA-256 of their source.
+
+    Each entry is <digest>.py plus its compiled bytecode <digest>.<cache_tag>.pyc, which both
+    script runners execute directly. A scraper keeps pointing at its digest for as long as
+    scrapers.updated_at is unchanged, so repeat runs skip fetching python_script, writing a
+    temporary file and compiling it. Entries are evicted least recently used first once the
+    files exceed max_bytes.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, CachedScript]" = OrderedDict() # digest -> entry, least recently used first
+        self._scrapers: Dict[str, tuple] = {} # scraper_id -> (updated_at, digest)
+        self._total_bytes = 0
+        os.makedirs(cache_dir, exist_ok=True)
+        self._adopt_existing_files()
+
+    def _paths(self, digest: str):
+        base = os.path.join(self.cache_dir, digest)
+        return f"{base}.py", f"{base}.{sys.implementation.cache_tag}.pyc"
+
+    def _adopt_existing_files(self):
+        """Picks up entries left by a previous worker process so they count towards the size bound."""
+        sources = []
+        for name in os.listdir(self.cache_dir):
+            digest, ext = os.path.splitext(name)
+            if ext == '.py' and len(digest) == 64:
+                sources.append((os.path.getmtime(os.path.join(self.cache_dir, name)), digest))
+        for _, digest in sorted(sources):
+            source_path, code_path = self._paths(digest)
+            run_path = code_path if os.path.exists(code_path) else source_path
+            size = sum(os.path.getsize(path) for path in {source_path, run_path})
+            self._entries[digest] = CachedScript(digest, source_path, run_path, size)
+            self._total_bytes += size
+        with self._lock:
+            self._evict()
+
+    def _write_atomic(self, path: str, data: bytes):
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except Exception:
+            try: os.remove(tmp_path)
+            except OSError: pass
+            raise
+
+    def _evict(self):
+        """Removes least recently used, unpinned entries until the cache fits. Caller holds the lock."""
+        for digest in list(self._entries):
+            if self._total_bytes <= self.max_bytes:
+                break
+            entry = self._entries[digest]
+            if entry.pins:
+                continue
+            del self._entries[digest]
+            self._total_bytes -= entry.size
+            for path in {entry.source_path, entry.run_path}:
+                try: os.remove(path)
+                except OSError: pass
+            METRICS.incr('script_cache_evictions')
+        self._scrapers = {scraper_id: known for scraper_id, known in self._scrapers.items() if known[1] in self._entries}
+
+    def _pin(self, scraper_id: str, updated_at, entry: CachedScript) -> CachedScript:
+        """Marks entry as in use and most recently used. Caller holds the lock."""
+        entry.pins += 1
+        self._entries.move_to_end(entry.digest)
+        self._scrapers[scraper_id] = (updated_at, entry.digest)
+        return entry
+
+    def lookup(self, scraper_id: str, updated_at) -> Optional[CachedScript]:
+        """Returns the pinned entry for scraper_id if it was stored for the same updated_at, else None."""
+        with self._lock:
+            known = self._scrapers.get(scraper_id)
+            entry = self._entries.get(known[1]) if known and known[0] == updated_at else None
+            if entry is not None and os.path.exists(entry.run_path):
+                METRICS.incr('script_cache_hits')
+                return self._pin(scraper_id, updated_at, entry)
+        METRICS.incr('script_cache_misses')
+        return None
+
+    def store(self, scraper_id: str, updated_at, source: str) -> CachedScript:
+        """Caches source and its bytecode (unless the same content is already cached) and returns the pinned entry."""
+        source_bytes = source.encode('utf-8')
+        digest = hashlib.sha256(source_bytes).hexdigest()
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is not None and os.path.exists(entry.run_path):
+                return self._pin(scraper_id, updated_at, entry)
+
+        # Written outside the lock; concurrent stores of the same digest write identical files
+        source_path, code_path = self._paths(digest)
+        self._write_atomic(source_path, source_bytes)
+        run_path = source_path
+        try:
+            code = compile(source_bytes, source_path, 'exec', dont_inherit=True)
+            # Unchecked hash-based pyc (PEP 552): the digest already ties it to the source
+            header = importlib.util.MAGIC_NUMBER + (0b01).to_bytes(4, 'little') + importlib.util.source_hash(source_bytes)
+            self._write_atomic(code_path, header + marshal.dumps(code))
+            run_path = code_path
+        except (SyntaxError, ValueError):
+            pass # Run the source so the script reports its own syntax error, as before
+        METRICS.incr('script_cache_stores')
+
+        entry = CachedScript(digest, source_path, run_path, sum(os.path.getsize(path) for path in {source_path, run_path}))
+        entry.analyze(source)
+        with self._lock:
+            existing = self._entries.get(digest)
+            if existing is not None:
+                entry = existing
+            else:
+                self._entries[digest] = entry
+                self._total_bytes += entry.size
+            self._pin(scraper_id, updated_at, entry)
+            self._evict()
+        return entry
+
+    def release(self, entry: CachedScript):
+        """Unpins an entry once its run has finished."""
+        with self._lock:
+            entry.pins = max(0, entry.pins - 1)
+            self._evict()
+
+
+_script_cache: Optional[ScriptCache] = None
+_script_cache_lock = threading.Lock()
+
+
+def get_script_cache() -> ScriptCache:
+    global _script_cache
+    with _script_cache_lock:
+        if _script_cache is None:
+            _script_cache = ScriptCache(WORKER_SCRIPT_CACHE_DIR, WORKER_SCRIPT_CACHE_MAX_MB * 1024 * 1024)
+        return _script_cache
+
+
+def get_scraper_script(conn, run_id: str, scraper_id: str, updated_at) -> Optional[CachedScript]:
+    """
+    Returns the pinned cache entry for the scraper's current script, fetching python_script
+    only when the cache has nothing for this updated_at. Release the entry when the run ends.
+    """
+    cache = get_script_cache()
+    entry = cache.lookup(scraper_id, updated_at)
+    if entry is not None:
+        log_event("DEBUG", "SETUP", run_id, f"Script cache hit for scraper {scraper_id} ({entry.digest[:12]})")
+        return entry
+
+    scraper_details = fetch_scraper_details(conn, scraper_id)
+    if not scraper_details or not scraper_details.get('python_script'):
+        return None
+    entry = cache.store(scraper_id, scraper_details['updated_at'], scraper_details['python_script'])
+    log_event("DEBUG", "SETUP", run_id, f"Script cache miss for scraper {scraper_id}, cached as {entry.digest[:12]}")
+    return entry
+
+
 # --- Job Processing ---
 
 def process_job(conn, job):
@@ -609,7 +2387,9 @@ def process_job(conn, job):
     error_details = None
     product_count = 0
     products_buffer = []
-    tmp_script_path = None # Initialize to ensure it's defined in finally block
+    run_stats = {} # Ingest counts reported with the final status
+    cached_script = None # Pinned script cache entry, released before the final status update
+    capture = None # Bounded stderr tail / script errors (and optional raw capture) of the run
 
     # Ensure DB connection is active at the start
     try:
@@ -630,16 +2410,16 @@ def process_job(conn, job):
         return # Cannot proceed without DB
 
     try:
-        # 1. Fetch scraper details (script content and config)
-        scraper_details = fetch_scraper_details(conn, scraper_id) # fetch_scraper_details includes retries
-        if not scraper_details or not scraper_details.get('python_script'):
+        # 1. Fetch scraper config and the script (from the local script cache unless updated_at changed)
+        scraper_details = fetch_scraper_details(conn, scraper_id, include_script=False) # fetch_scraper_details includes retries
+        cached_script = get_scraper_script(conn, run_id, scraper_id, scraper_details['updated_at']) if scraper_details else None
+        if not cached_script:
             error_msg = f"Failed to fetch script for scraper {scraper_id}"
             log_event("ERROR", "SETUP", run_id, error_msg)
             # Update status and return
             update_job_status(conn, run_id, 'failed', error_message=error_msg)
             return
 
-        script_content = scraper_details['python_script']
         filter_by_active_brands = scraper_details.get('filter_by_active_brands', False)
         scrape_only_own_products = scraper_details.get('scrape_only_own_products', False)
 
@@ -647,6 +2427,7 @@ def process_job(conn, job):
         active_brand_names = []
         own_product_eans = []
         own_product_sku_brands = []
+        own_index = None
 
         # Re-check connection before fetching filter data
         try:
@@ -654,35 +2435,29 @@ def process_job(conn, job):
         except Exception as e:
             raise ConnectionError(f"DB connection lost before fetching filter data: {e}") # Raise to be caught by main try-except
 
+        # Both filter sets come from the worker-wide cache, shared by runs of the same user
         if filter_by_active_brands:
             try:
-                with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
-                    # Fetch both name and id for active brands
-                    cur.execute("SELECT id, name FROM brands WHERE user_id = %s AND is_active = TRUE;", (user_id,))
-                    brands = cur.fetchall()
-                    active_brand_names = [row['name'] for row in brands]
-                    active_brand_ids = [row['id'] for row in brands]
-                    log_event("INFO", "SETUP", run_id, f"Fetched {len(active_brand_names)} active brands for filtering.")
+                active_brand_names, active_brand_ids = get_filter_cache().get(conn, 'active_brands', user_id)
+                log_event("INFO", "SETUP", run_id, f"Fetched {len(active_brand_names)} active brands for filtering.")
             except Exception as e:
                 log_event("WARN", "SETUP", run_id, f"Failed to fetch active brands: {e}. Proceeding without brand filter.")
-                # Consider reconnecting if connection error
-                active_brand_ids = []
+                try: conn.rollback()
+                except Exception: pass
+                # An empty brand list would drop every product, in the script and in ProductFilter alike
+                filter_by_active_brands = False
+                active_brand_names, active_brand_ids = [], []
 
         if scrape_only_own_products:
             try:
-                with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
-                    cur.execute("SELECT ean, sku, brand, brand_id FROM products WHERE user_id = %s AND is_active = TRUE;", (user_id,))
-                    products = cur.fetchall()
-                    own_product_eans = [row['ean'] for row in products if row['ean']]
-                    own_product_sku_brands = [{
-                        'sku': row['sku'],
-                        'brand': row['brand'],
-                        'brand_id': row['brand_id']
-                    } for row in products if row['sku'] and (row['brand'] or row['brand_id'])]
-                    log_event("INFO", "SETUP", run_id, f"Fetched {len(own_product_eans)} EANs and {len(own_product_sku_brands)} SKU/Brand pairs for filtering.")
+                own_product_eans, own_product_sku_brands, own_index = get_filter_cache().get(conn, 'own_products', user_id)
+                log_event("INFO", "SETUP", run_id, f"Fetched {len(own_product_eans)} EANs and {len(own_product_sku_brands)} SKU/Brand pairs for filtering.")
             except Exception as e:
                 log_event("WARN", "SETUP", run_id, f"Failed to fetch own products: {e}. Proceeding without own product filter.")
-                # Consider reconnecting if connection error
+                try: conn.rollback()
+                except Exception: pass
+                scrape_only_own_products = False
+                own_product_eans, own_product_sku_brands, own_index = [], [], None
 
         # Initialize active_brand_ids if not already defined
         if 'active_brand_ids' not in locals():
@@ -709,230 +2484,309 @@ def process_job(conn, job):
         except TypeError as json_err:
              raise ValueError(f"Failed to serialize context to JSON: {json_err}")
 
-        log_event("DEBUG", "SETUP", run_id, f"Prepared script context")
+        context_bytes = len(context_json.encode('utf-8'))
+        METRICS.observe('context_bytes', context_bytes)
+        log_event("DEBUG", "SETUP", run_id, f"Prepared script context ({context_bytes} bytes)")
 
         # 3. Execute script as subprocess
-        # Use try-finally to ensure temporary file cleanup
+        # Use try-finally to ensure the script never outlives its run and its context file is removed
+        process = None
+        context_file_path = None
+        writer = None
+        control = None
         try:
-            # Create a temporary file to hold the script content
-            # delete=False is important on Windows to allow the subprocess to open it
-            with tempfile.NamedTemporaryFile(mode='w+', suffix='.py', delete=False, encoding='utf-8') as tmp_script:
-                tmp_script_path = tmp_script.name
-                tmp_script.write(script_content)
-                # Ensure file is written before closing the 'with' block implicitly
-                tmp_script.flush()
-                os.fsync(tmp_script.fileno()) # Ensure OS writes buffer to disk
-
-            log_event("INFO", "SUBPROCESS_EXEC", run_id, f"Executing script: {tmp_script_path}")
-            command = [sys.executable, tmp_script_path, 'scrape', f"--context={context_json}"]
+            script_path = cached_script.run_path
+            log_event("INFO", "SUBPROCESS_EXEC", run_id, f"Executing script: {script_path} (runner: {WORKER_SCRIPT_RUNNER})")
+            if context_bytes > WORKER_CONTEXT_ARGV_MAX_BYTES and cached_script.accepts_context_file:
+                # Large contexts (own product EANs/SKUs) are read from a file instead of being parsed out of argv
+                context_file_path = write_context_file(context_json)
+                script_args = ['scrape', f"--context-file={context_file_path}"]
+                METRICS.incr('context_file_runs')
+            else:
+                if context_bytes > ARGV_MAX_ARG_BYTES:
+                    log_event("WARN", "SUBPROCESS_SETUP", run_id, f"Context is {context_bytes} bytes but the script does not accept --context-file; a fresh interpreter cannot take an argument this large. Update the script from python_template.py.")
+                script_args = ['scrape', f"--context={context_json}"]
             # Debug: log working directory and environment proxies
             log_event("DEBUG", "SUBPROCESS_SETUP", run_id, f"CWD: {os.getcwd()}, HTTP_PROXY={os.environ.get('HTTP_PROXY')}, HTTPS_PROXY={os.environ.get('HTTPS_PROXY')}")
             # Use project root as cwd for subprocess to ensure network/config consistency
             project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../..'))
-            log_event("DEBUG", "SUBPROCESS_SETUP", run_id, f"Spawning subprocess with cwd={project_root}, command={command}")
+            log_event("DEBUG", "SUBPROCESS_SETUP", run_id, f"Spawning subprocess with cwd={project_root}, script={script_path}")
             # Ensure the subprocess environment forces UTF-8 I/O
             sub_env = os.environ.copy()
             sub_env['PYTHONIOENCODING'] = 'utf-8'
-
-            process = subprocess.Popen(
-                command,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                cwd=project_root,
-                env=sub_env, # Pass the modified environment
-                text=True, # Read streams as text
-                encoding='utf-8', # Expect UTF-8 encoding
-                errors='strict' # Fail loudly if decoding error occurs
-            )
-
-            # 4. Process stdout (product JSONs) and stderr (logs) in real-time
-            import threading
-            import queue
-
-            # Create queues for stdout and stderr
-            stdout_queue = queue.Queue()
-            stderr_queue = queue.Queue()
-            script_errors = []
-
-            # Create threads to read from stdout and stderr
-            def read_stream(stream, queue):
-                for line in iter(stream.readline, ''):
-                    queue.put(line)
-                stream.close()
-
-            # Start threads to read from stdout and stderr
-            stdout_thread = threading.Thread(target=read_stream, args=(process.stdout, stdout_queue))
-            stderr_thread = threading.Thread(target=read_stream, args=(process.stderr, stderr_queue))
-            stdout_thread.daemon = True
-            stderr_thread.daemon = True
-            stdout_thread.start()
-            stderr_thread.start()
-
-            # Initialize variables
-            stdout_data = ""
-            stderr_data = ""
-            stderr_lines = []
+            if WORKER_HTTP_CACHE_DIR:
+                # fetch_page in python_template.py revalidates pages from earlier runs of this scraper
+                os.makedirs(WORKER_HTTP_CACHE_DIR, exist_ok=True)
+                sub_env['PRICETRACKER_HTTP_CACHE'] = os.path.join(WORKER_HTTP_CACHE_DIR, f"{scraper_id}.sqlite3")
+                sub_env['PRICETRACKER_HTTP_CACHE_MAX_MB'] = str(WORKER_HTTP_CACHE_MAX_MB)
+
+            # Every run gets a progress pipe and a control pipe; scripts built from the current template use both
+            progress_r, progress_w = os.pipe()
+            control_r, control_w = os.pipe()
+            try:
+                process = start_script_process(run_id, script_path, script_args, project_root, sub_env,
+                                               cached_script.required_libraries, progress_fd=progress_w, control_fd=control_r)
+            except Exception:
+                os.close(progress_r)
+                os.close(control_w)
+                raise
+            finally:
+                os.close(progress_w) # The script holds its own copies
+                os.close(control_r)
+            control = ScriptControlChannel(control_w)
+
+            # 4. Process stdout (product JSONs), progress frames and stderr (logs) in real-time
+            reader = ScriptOutputReader(process, progress_fd=progress_r)
+            capture = RunOutputCapture(run_id)
+            # Batches are inserted on the writer's own thread and connection while we keep reading
+            writer = ProductBatchWriter(run_id, user_id, competitor_id)
+            # Variants, category overlaps and redirects make scripts emit the same product more than once
+            dedup = ProductDeduplicator(WORKER_DEDUP_KEY)
+            # Brand/own-product filters and the product limit hold even for scripts that skip them
+            if WORKER_ENFORCE_FILTERS:
+                product_filter = ProductFilter(active_brand_names if filter_by_active_brands else None, active_brand_ids,
+                                               own_index if scrape_only_own_products else None)
+                limit_products = context['limit_products']
+            else:
+                product_filter, limit_products = ProductFilter(), None
+            products_over_limit = 0
+            http_stats = {}
+            throttle_backoffs = 0
+            # Scripts without the control channel cannot stop themselves
+            stop_grace_seconds = WORKER_SCRIPT_STOP_GRACE_SECONDS if cached_script.uses_control_channel else 0.0
+            # Free-text PROGRESS lines are only parsed for scripts without the progress channel
+            parse_legacy_progress = not cached_script.uses_progress_channel
+            phase_batch_info = {}
+            progress_writer = get_progress_writer()
+            reported_product_count = 0
 
             # Initialize variables for timeout tracking
             start_time = time.time()
-            last_output_time = start_time
-
-            # Process output in real-time until process completes or times out
-            while process.poll() is None:
-                # Check if we've exceeded the timeout
-                current_time = time.time()
-                if current_time - start_time > SCRIPT_TIMEOUT_SECONDS:
-                    process.kill()
-                    log_event("ERROR", "SUBPROCESS_TIMEOUT", run_id, f"Script execution timed out after {SCRIPT_TIMEOUT_SECONDS} seconds.")
-                    raise TimeoutError(f"Script execution timed out after {SCRIPT_TIMEOUT_SECONDS} seconds.")
+            deadline = time.monotonic() + SCRIPT_TIMEOUT_SECONDS
+            last_output_time = time.monotonic()
+            ingest_cpu_started = time.thread_time()
+            handover_due = None # Slow scripts: hand a partial batch to the writer after WORKER_WRITE_FLUSH_MIN_SECONDS
 
-                # Check for inactivity timeout (5 minutes without output)
-                if current_time - last_output_time > 300:  # 5 minutes
-                    process.kill()
-                    log_event("ERROR", "SUBPROCESS_TIMEOUT", run_id, f"Subprocess killed due to inactivity (no output for 5 minutes)")
-                    break
-
-                # Process stdout
-                try:
-                    while True:
-                        line = stdout_queue.get_nowait()
-                        if line:
-                            last_output_time = current_time
-                            stdout_data += line
-                            line = line.strip()
-
-                            if not line:
-                                continue
-
-                            try:
-                                product = json.loads(line)
-                                # Basic validation of product structure
-                                if isinstance(product, dict) and product.get('name') and product.get('price') is not None:
-                                    products_buffer.append(product)
-                                    product_count += 1
-
-                                    # Update progress in database every 10 products
-                                    if product_count % 10 == 0:
-                                        try:
-                                            conn = validate_and_reconnect_if_needed(conn)
-                                            update_job_status(conn, run_id, 'running', product_count=product_count)
-                                            log_event("INFO", "PROGRESS_UPDATE", run_id, f"Updated product count in database: {product_count}")
-                                        except Exception as count_update_err:
-                                            log_event("WARN", "PROGRESS_UPDATE", run_id, f"Failed to update product count in database: {count_update_err}")
-
-                                    # Save products in batches to the database
-                                    if len(products_buffer) >= DB_BATCH_SIZE:
-                                        log_event("INFO", "DB_BATCH_SAVE", run_id, f"Saving batch of {len(products_buffer)} products...")
-                                        # Ensure connection is valid before saving batch
-                                        conn = validate_and_reconnect_if_needed(conn)
-                                        inserted = save_temp_competitors_scraped_data(conn, run_id, user_id, competitor_id, products_buffer)
-                                        log_event("INFO", "DB_BATCH_SAVE", run_id, f"Successfully inserted {inserted} products.")
-                                        products_buffer = [] # Clear buffer after saving
-
-                                        # Update product count in database after each batch
-                                        try:
-                                            update_job_status(conn, run_id, 'running', product_count=product_count)
-                                            log_event("INFO", "PROGRESS_UPDATE", run_id, f"Updated product count in database: {product_count}")
-                                        except Exception as count_update_err:
-                                            log_event("WARN", "PROGRESS_UPDATE", run_id, f"Failed to update product count in database: {count_update_err}")
-                                else:
-                                    log_event("WARN", "SCRIPT_STDOUT", run_id, f"Skipping invalid product JSON structure: {line[:100]}...")
-                            except json.JSONDecodeError:
-                                log_event("WARN", "SCRIPT_STDOUT", run_id, f"Failed to decode JSON from stdout: {line[:100]}...")
-                except queue.Empty:
-                    pass
-
-                # Process stderr
-                try:
-                    while True:
-                        line = stderr_queue.get_nowait()
-                        if line:
-                            last_output_time = current_time
-                            stderr_data += line
-                            line = line.strip()
-
-                            if not line:
-                                continue
-
-                            stderr_lines.append(line)
-
-                            if line.startswith("PROGRESS:"):
-                                progress_msg = line[len("PROGRESS:"):].strip()
-                                log_event("INFO", "SCRIPT_LOG", run_id, progress_msg)
-
-                                # Check if the progress message contains product count information
-                                import re
-                                log_event("DEBUG", "PROGRESS_PARSING", run_id, f"Checking progress message: {progress_msg}")
+            # Process output as it arrives until both pipes are drained or a timer fires
+            try:
+                while not reader.done:
+                    # Check if we've exceeded the timeout
+                    current_time = time.monotonic()
+                    if current_time >= deadline:
+                        process.kill()
+                        log_event("ERROR", "SUBPROCESS_TIMEOUT", run_id, f"Script execution timed out after {SCRIPT_TIMEOUT_SECONDS} seconds.")
+                        raise TimeoutError(f"Script execution timed out after {SCRIPT_TIMEOUT_SECONDS} seconds.")
+
+                    # Check for inactivity timeout (5 minutes without output)
+                    if current_time - last_output_time > SCRIPT_INACTIVITY_TIMEOUT_SECONDS:
+                        process.kill()
+                        log_event("ERROR", "SUBPROCESS_TIMEOUT", run_id, f"Subprocess killed due to inactivity (no output for 5 minutes)")
+                        break
 
+                    # A script asked to stop gets the grace period to wind down, then it is killed
+                    stop_due = control.stop_requested_at + stop_grace_seconds if control.stop_requested_at is not None else None
+                    if stop_due is not None and current_time >= stop_due and not control.killed and process.poll() is None:
+                        process.kill()
+                        control.killed = True
+                        log_event("INFO", "SUBPROCESS_EXEC", run_id, f"Stopped script after '{control.stop_reason}'")
+                        stop_due = None
+
+                    # Sleep in the selector until output arrives or the nearest timer is due
+                    new_lines = reader.read(
+                        min(deadline, last_output_time + SCRIPT_INACTIVITY_TIMEOUT_SECONDS, handover_due or deadline,
+                            stop_due if stop_due is not None and not control.killed else deadline) - current_time + 0.01)
+                    new_stdout_lines, new_stderr_lines = new_lines['stdout'], new_lines['stderr']
+                    if new_stdout_lines or new_stderr_lines or new_lines['progress']:
+                        last_output_time = time.monotonic()
+                    capture.write_raw('stdout', new_stdout_lines)
+                    capture.write_raw('stderr', new_stderr_lines)
+                    # Batch progress reported during this read, phase -> (current, total); written to the DB once below
+                    progress_updates = {}
+                    latest_progress_phase = None
+
+                    # Process stdout
+                    for line in new_stdout_lines:
+                        line = line.strip()
+
+                        if not line:
+                            continue
+
+                        try:
+                            product = json.loads(line)
+                            # Basic validation of product structure
+                            if isinstance(product, dict) and product.get('name') and product.get('price') is not None:
+                                if not product_filter.accepts(product) or dedup.is_duplicate(product):
+                                    continue
+                                if limit_products is not None and product_count >= limit_products:
+                                    products_over_limit += 1
+                                    continue
+                                products_buffer.append(product)
+                                product_count += 1
+
+                                # Hand full batches to the writer stage
+                                if len(products_buffer) >= DB_BATCH_SIZE:
+                                    writer.put(products_buffer)
+                                    products_buffer = []
+                            else:
+                                log_event("WARN", "SCRIPT_STDOUT", run_id, f"Skipping invalid product JSON structure: {line[:100]}...")
+                        except json.JSONDecodeError:
+                            log_event("WARN", "SCRIPT_STDOUT", run_id, f"Failed to decode JSON from stdout: {line[:100]}...")
+                    # Tell the script once nothing more it could emit would be kept
+                    if control.stop_reason is None:
+                        if limit_products is not None and product_count >= limit_products:
+                            control.request_stop('limit_products')
+                        elif product_filter.all_own_products_seen:
+                            control.request_stop('own_products_complete')
+                        if control.stop_reason is not None:
+                            log_event("INFO", "SUBPROCESS_EXEC", run_id, f"Asked script to stop ({control.stop_reason}, {product_count} products kept)")
+                    if products_buffer and handover_due is None:
+                        handover_due = time.monotonic() + WORKER_WRITE_FLUSH_MIN_SECONDS
+                    elif products_buffer and time.monotonic() >= handover_due:
+                        writer.put(products_buffer)
+                        products_buffer = []
+                    if not products_buffer:
+                        handover_due = None
+
+                    # Process progress frames: {"phase": 2, "current": 10, "total": 50, "products": 8, "message": "..."}
+                    for line in new_lines['progress']:
+                        try:
+                            frame = json.loads(line)
+                            frame_phase = int(frame.get('phase') or 1)
+                        except (ValueError, TypeError, AttributeError):
+                            log_event("WARN", "SCRIPT_PROGRESS", run_id, f"Ignoring malformed progress frame: {line[:100]}...")
+                            continue
+                        if frame.get('message'):
+                            log_event("INFO", "SCRIPT_LOG", run_id, f"Phase {frame_phase}: {frame['message']}")
+                        if isinstance(frame.get('current'), int) and isinstance(frame.get('total'), int):
+                            progress_updates[frame_phase] = (frame['current'], frame['total'])
+                            latest_progress_phase = frame_phase
+                        if frame.get('products') is not None:
+                            log_event("DEBUG", "SCRIPT_PROGRESS", run_id, f"Script reports {frame['products']} products so far ({product_count} received)")
+                        if isinstance(frame.get('http'), dict):
+                            # Connection reuse and latency of the template's shared HTTP client (report_http_stats)
+                            http_stats = {f"http_{key}": value for key, value in frame['http'].items() if isinstance(value, (int, float))}
+                        if isinstance(frame.get('throttle'), dict):
+                            # Rate/concurrency decisions of the template's per-host HostThrottle
+                            log_event("INFO", "SCRIPT_THROTTLE", run_id, json.dumps(frame['throttle']))
+                            if frame['throttle'].get('action') == 'decrease':
+                                throttle_backoffs += 1
+
+                    # Process stderr
+                    for line in new_stderr_lines:
+                        line = line.strip()
+
+                        if not line:
+                            continue
+
+                        capture.add_stderr_line(line)
+
+                        if line.startswith("PROGRESS:"):
+                            progress_msg = line[len("PROGRESS:"):].strip()
+                            log_event("INFO", "SCRIPT_LOG", run_id, progress_msg)
+
+                            if parse_legacy_progress:
                                 # Check for phase indicator in progress message
-                                phase_match = re.search(r'Phase (\d+):', progress_msg)
+                                phase_match = LEGACY_PHASE_RE.search(progress_msg)
                                 current_phase = int(phase_match.group(1)) if phase_match else 1
 
                                 # Look for progress pattern like X/Y
-                                product_progress_match = re.search(r'\b(\d+)\s*\/\s*(\d+)\b', progress_msg)
+                                product_progress_match = LEGACY_PROGRESS_RE.search(progress_msg)
                                 if product_progress_match:
-                                    current_batch = int(product_progress_match.group(1))
-                                    total_batches = int(product_progress_match.group(2))
-
-                                    # Store the phase-specific batch information
-                                    # This ensures we maintain consistent batch counts per phase
-                                    if 'phase_batch_info' not in locals():
-                                        phase_batch_info = {}
-
-                                    phase_batch_info[current_phase] = {
-                                        'current_batch': current_batch,
-                                        'total_batches': total_batches
-                                    }
-
-                                    # For database updates, always use the current phase's information
-                                    # Update progress in database
-                                    try:
-                                        # Ensure connection is valid
-                                        conn = validate_and_reconnect_if_needed(conn)
-                                        update_job_status(
-                                            conn, run_id, 'running',
-                                            product_count=product_count,
-                                            current_batch=current_batch,
-                                            total_batches=total_batches
-                                        )
-                                        log_event("INFO", "PROGRESS_UPDATE", run_id, f"Updated progress in database: Phase {current_phase}: {current_batch}/{total_batches}")
-                                    except Exception as progress_update_err:
-                                        log_event("WARN", "PROGRESS_UPDATE", run_id, f"Failed to update progress in database: {progress_update_err}")
-                            elif line.startswith("ERROR:"):
-                                error_line = line[len("ERROR:"):].strip()
-                                log_event("ERROR", "SCRIPT_LOG", run_id, error_line)
-                                script_errors.append(error_line) # Collect script-reported errors
-                            else:
-                                # Log other potentially useful stderr output at DEBUG level
-                                log_event("DEBUG", "SCRIPT_STDERR", run_id, line)
-                except queue.Empty:
-                    pass
-
-                # Sleep a bit to avoid busy waiting
-                time.sleep(0.1)
+                                    progress_updates[current_phase] = (int(product_progress_match.group(1)), int(product_progress_match.group(2)))
+                                    latest_progress_phase = current_phase
+                        elif line.startswith("ERROR:"):
+                            error_line = line[len("ERROR:"):].strip()
+                            log_event("ERROR", "SCRIPT_LOG", run_id, error_line)
+                            capture.add_script_error(error_line) # Collect script-reported errors
+                        else:
+                            # Log other potentially useful stderr output at DEBUG level
+                            log_event("DEBUG", "SCRIPT_STDERR", run_id, line)
+
+                    if progress_updates:
+                        # Store the phase-specific batch information
+                        # This ensures we maintain consistent batch counts per phase
+                        for phase, (current_batch, total_batches) in progress_updates.items():
+                            phase_batch_info[phase] = {
+                                'current_batch': current_batch,
+                                'total_batches': total_batches
+                            }
+
+                        # For database updates, always use the latest reported phase's information
+                        current_batch, total_batches = progress_updates[latest_progress_phase]
+                        progress_writer.report(run_id, current_batch=current_batch, total_batches=total_batches,
+                                               current_phase=latest_progress_phase)
+                        log_event("DEBUG", "PROGRESS_UPDATE", run_id, f"Progress: Phase {latest_progress_phase}: {current_batch}/{total_batches}")
+
+                    # Coalesced by the progress writer; written to the DB at most every WORKER_PROGRESS_FLUSH_INTERVAL
+                    if product_count != reported_product_count:
+                        progress_writer.report(run_id, product_count=product_count)
+                        reported_product_count = product_count
+            finally:
+                reader.close()
+                capture.close()
+                control.close()
+
+            # Pipes are drained; collect the exit status (immediate unless the script closed its pipes early)
+            try:
+                process.wait(timeout=max(0.0, deadline - time.monotonic()))
+            except subprocess.TimeoutExpired:
+                process.kill()
+                raise TimeoutError(f"Script execution timed out after {SCRIPT_TIMEOUT_SECONDS} seconds.")
 
             # We've already processed the output in real-time, so we don't need to process it again
             # Just log that we're done processing the output
             log_event("INFO", "SUBPROCESS_EXEC", run_id, f"Finished processing output from subprocess")
 
-            # Save any remaining products in the buffer after processing stdout
+            # Save any remaining products in the buffer, then wait for the writer to finish all batches
             if products_buffer:
-                log_event("INFO", "DB_BATCH_SAVE", run_id, f"Saving final batch of {len(products_buffer)} products...")
-                # Ensure connection is valid before saving final batch
-                conn = validate_and_reconnect_if_needed(conn)
-                inserted = save_temp_competitors_scraped_data(conn, run_id, user_id, competitor_id, products_buffer)
-                log_event("INFO", "DB_BATCH_SAVE", run_id, f"Successfully inserted {inserted} products.")
+                writer.put(products_buffer)
+                products_buffer = []
+            inserted_total = writer.close()
+            log_event("INFO", "DB_BATCH_SAVE", run_id, f"Product writer finished: {inserted_total}/{product_count} products inserted"
+                      f"{f', {writer.suppressed} unchanged prices skipped' if writer.suppressed else ''}.")
+            if writer.error is not None:
+                if writer.not_saved:
+                    # Rows are missing from the run; it must not end as completed
+                    raise RuntimeError(f"{writer.not_saved} of {product_count} products could not be saved "
+                                       f"({inserted_total} were); first error: {writer.error}")
+                raise writer.error
+            run_stats.update(products_kept=product_count, duplicates_skipped=dedup.duplicates, dedup_key=WORKER_DEDUP_KEY,
+                             rows_staged=inserted_total, unchanged_prices_skipped=writer.suppressed)
+            if product_filter.active:
+                run_stats.update(filtered_inactive_brand=product_filter.filtered_brand, filtered_not_own_product=product_filter.filtered_not_own)
+                if product_filter.filtered_brand or product_filter.filtered_not_own:
+                    log_event("INFO", "SCRIPT_STDOUT", run_id, f"Filtered out {product_filter.filtered_brand} products of inactive brands and {product_filter.filtered_not_own} that are not own products.")
+            if products_over_limit:
+                run_stats['products_over_limit'] = products_over_limit
+            if control.stop_reason is not None:
+                run_stats['stopped_early'] = control.stop_reason
+            run_stats.update(http_stats)
+            if throttle_backoffs:
+                run_stats['throttle_backoffs'] = throttle_backoffs
+            if dedup.duplicates:
+                log_event("INFO", "SCRIPT_STDOUT", run_id, f"Skipped {dedup.duplicates} duplicate products (key: {WORKER_DEDUP_KEY}); {product_count} kept.")
+
+            # Worker CPU spent ingesting this run's output (parsing, batching, and the writer's DB round trips)
+            ingest_cpu_seconds = time.thread_time() - ingest_cpu_started + writer.cpu_seconds
+            if product_count:
+                cpu_per_million = ingest_cpu_seconds / product_count * 1_000_000
+                METRICS.observe('ingest_cpu_seconds_per_1m_products', cpu_per_million)
+                log_event("INFO", "SUBPROCESS_EXEC", run_id, f"Ingest used {ingest_cpu_seconds:.2f}s worker CPU for {product_count} products ({cpu_per_million:.1f}s per 1M products)")
 
             # 5. Check exit code after processing all output
             exit_code = process.returncode
             log_event("INFO", "SUBPROCESS_EXEC", run_id, f"Script finished with exit code: {exit_code}")
+            if control.killed and exit_code != 0:
+                # The run already has everything it needs; the kill is not a script failure
+                log_event("INFO", "SUBPROCESS_EXEC", run_id, f"Exit code {exit_code} comes from stopping the script early ({control.stop_reason})")
+                exit_code = 0
 
             if exit_code == 0:
                 # Even with exit code 0, check if the script logged errors to stderr
-                if script_errors:
+                if capture.script_error_count:
                     final_status = 'failed' # Mark as failed if script explicitly reported errors
                     error_msg = f"Script finished successfully (exit code 0) but reported errors via stderr."
-                    error_details = "\n".join(script_errors)
+                    error_details = capture.script_errors_text()
                     log_event("ERROR", "JOB_COMPLETION", run_id, error_msg)
                 else:
                     final_status = 'completed'
@@ -943,19 +2797,29 @@ def process_job(conn, job):
                 error_msg = f"Script failed with exit code {exit_code}."
                 log_event("ERROR", "JOB_COMPLETION", run_id, error_msg)
                 # Capture last ~10 lines of stderr for error_details
-                last_stderr_lines = stderr_lines[-10:] # Get last 10 lines
+                last_stderr_lines = capture.last_stderr_lines(10) # Get last 10 lines
                 error_details = f"Exit Code: {exit_code}\n---\nLast stderr lines:\n" + "\n".join(last_stderr_lines).strip()
                 if error_details:
                      log_event("ERROR", "JOB_COMPLETION", run_id, f"Stderr Snippet:\n{error_details}")
 
         finally:
-            # Ensure temporary file is deleted regardless of execution outcome
-            if tmp_script_path and os.path.exists(tmp_script_path):
+            # A worker error mid-run must not leave the script running after its cache entry is released
+            if process is not None and process.poll() is None:
+                log_event("WARN", "CLEANUP", run_id, f"Killing script process {process.pid} left running after a worker error")
                 try:
-                    os.remove(tmp_script_path)
-                    log_event("DEBUG", "CLEANUP", run_id, f"Removed temporary script: {tmp_script_path}")
+                    process.kill()
                 except OSError as e:
-                    log_event("WARN", "CLEANUP", run_id, f"Error removing temporary script {tmp_script_path}: {e}")
+                    log_event("WARN", "CLEANUP", run_id, f"Error killing script process {process.pid}: {e}")
+            if control is not None:
+                control.close()
+            # Batches already handed over are still written, as they were when saving inline
+            if writer is not None:
+                writer.close()
+            if context_file_path:
+                try:
+                    os.remove(context_file_path)
+                except OSError as e:
+                    log_event("WARN", "CLEANUP", run_id, f"Error removing context file {context_file_path}: {e}")
 
 
     except TimeoutError as e:
@@ -963,7 +2827,7 @@ def process_job(conn, job):
         final_status = 'failed'
         error_msg = f"Script execution timed out after {SCRIPT_TIMEOUT_SECONDS} seconds."
         # Capture last ~10 lines of stderr before timeout if available
-        last_stderr_lines = stderr_data.strip().splitlines()[-10:] if stderr_data else []
+        last_stderr_lines = capture.last_stderr_lines(10) if capture else []
         error_details = f"Timeout: {SCRIPT_TIMEOUT_SECONDS}s\n---\nLast stderr lines before timeout:\n" + "\n".join(last_stderr_lines).strip()
         log_event("ERROR", "JOB_TIMEOUT", run_id, error_msg)
         if error_details:
@@ -977,6 +2841,9 @@ def process_job(conn, job):
         log_event("ERROR", "JOB_PROCESSING", run_id, f"{error_msg}: {e}") # Log full exception message here
         log_event("ERROR", "JOB_PROCESSING", run_id, f"Traceback:\n{traceback.format_exc()}") # Log traceback separately
 
+    if cached_script is not None:
+        get_script_cache().release(cached_script)
+
     # 6. Final status update
     end_time = time.time()
     execution_time_ms = int((end_time - start_time) * 1000)
@@ -984,12 +2851,18 @@ def process_job(conn, job):
     products_per_second = (product_count / (execution_time_ms / 1000.0)) if execution_time_ms > 0 else 0
 
     try:
+        # No debounced 'running' progress write may land after the final status; the final update carries the latest state
+        progress_reports, progress_writes = get_progress_writer().finish(run_id)
+        if progress_reports:
+            log_event("INFO", "PROGRESS_UPDATE", run_id, f"Coalesced {progress_reports} progress updates into {progress_writes} DB writes (+1 final)")
+
         # Ensure connection is valid before final update
         conn = validate_and_reconnect_if_needed(conn)
 
         # Extract current_batch and total_batches from progress messages if available
         current_batch = None
         total_batches = None
+        current_phase = None
 
         # Use the phase batch info if available from earlier processing
         if 'phase_batch_info' in locals() and phase_batch_info:
@@ -997,15 +2870,16 @@ def process_job(conn, job):
             latest_phase = max(phase_batch_info.keys())
             current_batch = phase_batch_info[latest_phase]['current_batch']
             total_batches = phase_batch_info[latest_phase]['total_batches']
+            current_phase = latest_phase
             log_event("INFO", "FINAL_STATUS", run_id, f"Using batch info from phase {latest_phase}: {current_batch}/{total_batches}")
         else:
             # Fallback: Look for the last progress message that contains batch information
             log_event("INFO", "FINAL_STATUS", run_id, "No phase batch info available, looking in stderr lines")
-            for line in reversed(stderr_lines) if 'stderr_lines' in locals() else []:
+            legacy_progress_lines = reversed(capture.stderr_tail) if capture and not cached_script.uses_progress_channel else []
+            for line in legacy_progress_lines:
                 if line.startswith("PROGRESS:"):
                     progress_msg = line[len("PROGRESS:"):].strip()
-                    import re
-                    product_progress_match = re.search(r'\b(\d+)\s*\/\s*(\d+)\b', progress_msg)
+                    product_progress_match = LEGACY_PROGRESS_RE.search(progress_msg)
                     if product_progress_match:
                         current_batch = int(product_progress_match.group(1))
                         total_batches = int(product_progress_match.group(2))
@@ -1020,17 +2894,169 @@ def process_job(conn, job):
             execution_time_ms=execution_time_ms,
             products_per_second=products_per_second,
             current_batch=current_batch,
-            total_batches=total_batches
+            total_batches=total_batches,
+            current_phase=current_phase,
+            run_stats=run_stats or None
         )
+        log_event("INFO", "FINAL_STATUS", run_id, f"Status and progress writes used {pop_status_round_trips(run_id)} DB round-trip(s)")
     except Exception as update_err:
         log_event("ERROR", "JOB_STATUS_UPDATE", run_id, f"Critical error updating final job status: {update_err}")
 
 
+# --- Job Wake-up (LISTEN/NOTIFY) ---
+
+class JobWakeup:
+    """
+    Listens on JOB_NOTIFY_CHANNEL with a dedicated autocommit connection and wakes the
+    dispatcher as soon as a run is queued. A generation counter makes sure a
+    notification that arrives between a claim attempt and the following wait is not lost.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._generation = 0
+        self.listening = False
+        self.notifications_received = 0
+        self._thread = threading.Thread(target=self._listen_loop, name="job-wakeup", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def generation(self) -> int:
+        with self._cond:
+            return self._generation
+
+    def wake(self):
+        with self._cond:
+            self._generation += 1
+            self._cond.notify_all()
+
+    def wait(self, since_generation: int, timeout: float) -> bool:
+        """Waits until a notification newer than since_generation arrives. Returns False on timeout."""
+        with self._cond:
+            return self._cond.wait_for(lambda: self._generation != since_generation, timeout=timeout)
+
+    def _listen_loop(self):
+        backoff = 1
+        while True:
+            listen_conn = None
+            try:
+                listen_conn = get_db_connection()
+                listen_conn.set_session(autocommit=True)
+                with listen_conn.cursor() as cur:
+                    cur.execute(f"LISTEN {JOB_NOTIFY_CHANNEL};")
+                self.listening = True
+                backoff = 1
+                log_event("INFO", "JOB_WAKEUP", None, f"Listening for '{JOB_NOTIFY_CHANNEL}' notifications.")
+                # Jobs queued while we were not listening are picked up right away
+                self.wake()
+
+                while True:
+                    # Block on the socket until the server sends something
+                    readable, _, _ = select.select([listen_conn], [], [], 60)
+                    if not readable:
+                        continue
+                    listen_conn.poll()
+                    relevant = False
+                    while listen_conn.notifies:
+                        notify = listen_conn.notifies.pop(0)
+                        self.notifications_received += 1
+                        try:
+                            payload = json.loads(notify.payload) if notify.payload else {}
+                        except ValueError:
+                            payload = {}
+                        # scraper_runs.scraper_type may be NULL for Python runs, so only skip known other types
+                        if payload.get('scraper_type') not in (None, 'python'):
+                            continue
+                        relevant = True
+                    if relevant:
+                        self.wake()
+            except Exception as e:
+                self.listening = False
+                log_event("WARN", "JOB_WAKEUP", None, f"Notification listener failed: {e}. Falling back to polling every {WORKER_POLL_INTERVAL}s, retrying in {backoff}s.")
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 60)
+            finally:
+                if listen_conn is not None:
+                    try: listen_conn.close()
+                    except Exception: pass
+
+
+# --- Job Slots ---
+
+class JobSlotPool:
+    """
+    Runs claimed jobs on a fixed number of slot threads so one worker process can
+    execute several scraper scripts at once. Each slot thread keeps its own DB
+    connection, and process_job keeps all per-run accounting local to its call.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self._free = threading.Semaphore(size)
+        self._lock = threading.Lock()
+        self._active: Dict[str, float] = {} # run_id -> start time
+        self._local = threading.local()
+        self._executor = ThreadPoolExecutor(max_workers=size, thread_name_prefix="job-slot")
+
+    def reserve(self, timeout: Optional[float] = None) -> bool:
+        """Blocks until a slot is free and reserves it. Returns False on timeout."""
+        return self._free.acquire(timeout=timeout)
+
+    def reserve_more(self, max_extra: int) -> int:
+        """Reserves up to max_extra additional slots without blocking. Returns how many were reserved."""
+        reserved = 0
+        while reserved < max_extra and self._free.acquire(blocking=False):
+            reserved += 1
+        return reserved
+
+    def release(self, count: int = 1):
+        """Returns reserved slots that ended up not being used."""
+        for _ in range(count):
+            self._free.release()
+
+    def active_count(self) -> int:
+        with self._lock:
+            return len(self._active)
+
+    def submit(self, job):
+        """Starts a claimed job on the slot reserved by the caller."""
+        with self._lock:
+            self._active[job['id']] = time.time()
+        self._executor.submit(self._run, job)
+
+    def _run(self, job):
+        run_id = job['id']
+        try:
+            # Each slot thread owns one connection and reuses it across jobs
+            conn = validate_and_reconnect_if_needed(getattr(self._local, 'conn', None))
+            self._local.conn = conn
+            log_event("INFO", "JOB_FOUND", run_id, f"Processing job for scraper {job['scraper_id']} in {threading.current_thread().name}")
+            process_job(conn, job)
+        except Exception as job_proc_err:
+            # Log any unhandled exceptions during job processing itself
+            error_details = traceback.format_exc()
+            log_event("ERROR", "JOB_PROCESSING", run_id, f"Unhandled error during process_job call: {job_proc_err}")
+            log_event("ERROR", "JOB_PROCESSING", run_id, f"Error details: {error_details}")
+            # Attempt to mark job as failed
+            try:
+                update_job_status(getattr(self._local, 'conn', None), run_id, 'failed',
+                                  error_message=f"Worker error during process_job: {job_proc_err}",
+                                  error_details=error_details)
+            except Exception as update_err:
+                log_event("ERROR", "JOB_STATUS_UPDATE", run_id, f"Failed to update job status after process_job error: {update_err}")
+        finally:
+            pop_status_round_trips(run_id) # Runs that failed early never logged theirs
+            with self._lock:
+                self._active.pop(run_id, None)
+            self._free.release()
+
+
 # --- Main Worker Loop ---
 
 def main():
-    """Main worker function that polls for jobs and processes them."""
-    log_event("INFO", "SETUP", None, f"Python Worker ({WORKER_ID}) starting...")
+    """Main worker function that polls for jobs and dispatches them to job slots."""
+    log_event("INFO", "SETUP", None, f"Python Worker ({WORKER_ID}) starting with {WORKER_MAX_CONCURRENT_JOBS} job slot(s), ingest mode '{WORKER_INGEST_MODE}'...")
 
     # Validate initial database connection with retries
     max_init_retries = 5
@@ -1039,9 +3065,9 @@ def main():
 
     while init_retry_count < max_init_retries and not init_success:
         try:
-            conn_check = get_db_connection()
+            conn_check = get_db_pool().getconn()
             log_event("INFO", "SETUP", None, "Initial database connection successful.")
-            conn_check.close()
+            get_db_pool().putconn(conn_check) # The first loop iteration reuses it
             init_success = True
         except Exception as e:
             init_retry_count += 1
@@ -1056,6 +3082,12 @@ def main():
         log_event("CRITICAL", "SETUP", None, f"All {max_init_retries} initial database connection attempts failed. Worker cannot start.")
         return  # Exit if cannot connect initially
 
+    slots = JobSlotPool(WORKER_MAX_CONCURRENT_JOBS)
+
+    wakeup = JobWakeup()
+    if WORKER_LISTEN_NOTIFY:
+        wakeup.start()
+
     # Track consecutive failures to implement backoff
     consecutive_failures = 0
     max_backoff_seconds = 60 # Increased max backoff
@@ -1065,23 +3097,28 @@ def main():
     inactivity_check_interval = 300  # Check for long inactivity every 5 minutes
     last_inactivity_check = time.time()
 
-    # Main worker loop
+    # Main worker loop: wait for free slots, claim one job per free slot, hand them off
     while True:
         conn = None # Ensure conn is reset each loop iteration
-        job = None # Ensure job is reset
         run_id = None # Ensure run_id is reset
+
+        # Wait until a slot is free, waking up periodically for health checks
+        slots_reserved = 1 if slots.reserve(timeout=inactivity_check_interval) else 0
+
         current_time = time.time()
 
         # Periodically check for long periods of inactivity and log health status
         if current_time - last_inactivity_check > inactivity_check_interval:
             inactivity_duration = current_time - last_job_time
             log_event("INFO", "WORKER_HEALTH", None,
-                     f"Worker health check: {inactivity_duration:.1f} seconds since last job processed. Worker is still running.")
+                     f"Worker health check: {inactivity_duration:.1f} seconds since last job claimed, "
+                     f"{slots.active_count()}/{slots.size} slots busy. Worker is still running.")
+            log_event("INFO", "WORKER_METRICS", None, f"Worker metrics: {json.dumps(METRICS.snapshot())}")
 
             # If it's been more than 30 minutes since the last job, check for pending jobs that might be stuck
             if inactivity_duration > 1800:  # 30 minutes
                 try:
-                    check_conn = get_db_connection()
+                    check_conn = get_db_pool().getconn()
                     with check_conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
                         cur.execute("""
                             SELECT COUNT(*) as pending_count
@@ -1094,46 +3131,39 @@ def main():
                         if result and result['pending_count'] > 0:
                             log_event("WARN", "WORKER_HEALTH", None,
                                     f"Found {result['pending_count']} pending Python jobs but worker has been inactive for {inactivity_duration:.1f} seconds. Possible issue with job pickup.")
-                    check_conn.close()
+                    get_db_pool().putconn(check_conn)
                 except Exception as e:
                     log_event("ERROR", "WORKER_HEALTH", None, f"Error checking for pending jobs during health check: {e}")
 
             last_inactivity_check = current_time
 
+        if not slots_reserved:
+            continue # All slots still busy
+
         try:
-            # Get a database connection for this iteration
-            conn = validate_and_reconnect_if_needed(None)
+            # Check out a pooled database connection for this iteration
+            conn = get_db_pool().getconn()
+
+            # Remember which notifications this claim attempt already covers
+            seen_generation = wakeup.generation()
 
-            # Find and claim a job
-            job = find_and_claim_job(conn)
+            # Claim one job for every free slot in a single round-trip
+            slots_reserved += slots.reserve_more(slots.size - 1)
+            jobs = claim_jobs(conn, max_jobs=slots_reserved)
 
-            if job:
+            if jobs:
                 # Update last job time whenever we successfully claim a job
                 last_job_time = time.time()
 
-                run_id = job['id'] # Set run_id as soon as job is claimed
-                scraper_id = job['scraper_id']
-                log_event("INFO", "JOB_FOUND", run_id, f"Processing job for scraper {scraper_id}")
-
-                try:
-                    # Process the job using the same connection
-                    process_job(conn, job)
-                    # Reset consecutive failures on successful job processing attempt (even if script failed)
-                    consecutive_failures = 0
-                except Exception as job_proc_err:
-                    # Log any unhandled exceptions during job processing itself
-                    error_details = traceback.format_exc()
-                    log_event("ERROR", "JOB_PROCESSING", run_id, f"Unhandled error during process_job call: {job_proc_err}")
-                    log_event("ERROR", "JOB_PROCESSING", run_id, f"Error details: {error_details}")
-                    # Attempt to mark job as failed
-                    try:
-                        update_job_status(conn, run_id, 'failed',
-                                         error_message=f"Worker error during process_job: {job_proc_err}",
-                                         error_details=error_details)
-                    except Exception as update_err:
-                        log_event("ERROR", "JOB_STATUS_UPDATE", run_id, f"Failed to update job status after process_job error: {update_err}")
-                    consecutive_failures += 1 # Count this as a failure for backoff
+                for job in jobs:
+                    run_id = job['id'] # Set run_id as soon as job is claimed
+                    # The slot thread takes over the reservation and releases it when the job ends
+                    slots.submit(job)
+                    slots_reserved -= 1
+                consecutive_failures = 0
             else:
+                slots.release(slots_reserved)
+                slots_reserved = 0
                 # No job found, wait before checking again
                 # Apply backoff only if there were recent failures finding/claiming jobs
                 if consecutive_failures > 0:
@@ -1141,9 +3171,10 @@ def main():
                     log_event("INFO", "WORKER_BACKOFF", None, f"No job found. Backing off for {backoff_time} seconds due to {consecutive_failures} recent failures.")
                     time.sleep(backoff_time)
                 else:
-                    # Normal polling interval if no recent failures
-                    # log_event("DEBUG", "JOB_SEARCH", None, f"No pending job found. Sleeping for {WORKER_POLL_INTERVAL}s.")
-                    time.sleep(WORKER_POLL_INTERVAL)
+                    # Wait for a notification; the poll only remains as a slow fallback while listening
+                    poll_interval = WORKER_NOTIFY_FALLBACK_INTERVAL if wakeup.listening else WORKER_POLL_INTERVAL
+                    # log_event("DEBUG", "JOB_SEARCH", None, f"No pending job found. Waiting up to {poll_interval}s.")
+                    wakeup.wait(seen_generation, timeout=poll_interval)
                 # Reset failure count if no job was found (wait period is the backoff)
                 consecutive_failures = 0
 
@@ -1164,12 +3195,15 @@ def main():
             time.sleep(backoff_time)
 
         finally:
-            # Always close the database connection if it was opened
-            if conn and not conn.closed:
+            # Give back reservations that were not handed to a slot
+            if slots_reserved:
+                slots.release(slots_reserved)
+            # Return the connection to the pool; a broken one is closed instead
+            if conn is not None:
                 try:
-                    conn.close()
+                    get_db_pool().putconn(conn)
                 except Exception as close_err:
-                     log_event("WARN", "DB_CONNECTION", run_id, f"Error closing DB connection: {close_err}")
+                     log_event("WARN", "DB_CONNECTION", run_id, f"Error returning DB connection: {close_err}")
             # Short sleep to prevent tight looping in case of continuous errors
             time.sleep(0.1)
 
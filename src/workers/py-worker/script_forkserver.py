@@ -0,0 +1,406 @@
+# pricetracker/src/workers/py-worker/script_forkserver.py
+"""
+Warm fork server for running Python scraper scripts.
+
+Starting a fresh interpreter per job and importing requests/urllib3/bs4 costs far
+more than most small scheduled scrapers spend scraping. The fork server is started
+once by the worker, preloads the heavy libraries, and forks an isolated child per
+run. The child gets the run's stdout/stderr pipes as fds 1/2 (and any extra channels,
+such as the progress pipe, as fds 3, 4, ...) and executes the script as __main__, so
+the JSONL stdout / PROGRESS-stderr contract is unchanged.
+
+Protocol (one Unix socket connection per run):
+    client -> server: 4-byte big-endian length + JSON request, with the child's
+                      stdout/stderr (+ extra) fds attached via SCM_RIGHTS
+    server -> client: {"pid": <pid>}\n once forked, {"returncode": <rc>}\n on exit
+
+Run as: python script_forkserver.py <socket_path> [module_to_preload ...]
+"""
+
+import os
+import sys
+import atexit
+import shutil
+import json
+import time
+import signal
+import select
+import socket
+import struct
+import fcntl
+import selectors
+import subprocess
+import tempfile
+import threading
+from typing import Dict, Any, List, Optional
+
+MAX_PASSED_FDS = 8 # stdout, stderr and any extra channels a run hands to the child
+REQUEST_READ_TIMEOUT_SECONDS = 10
+
+
+# --- Server ---
+
+def _preload(module_name: str, preloaded: set):
+    if module_name in preloaded:
+        return
+    try:
+        __import__(module_name)
+        preloaded.add(module_name)
+    except Exception as e:
+        print(f"forkserver: failed to preload {module_name}: {e}", file=sys.stderr, flush=True)
+        preloaded.add(module_name) # Don't retry on every run
+
+
+def kill_run(pid: int):
+    """Kills a run's process group, or just the process if it has not called setsid() yet."""
+    for kill in (os.killpg, os.kill):
+        try:
+            kill(pid, signal.SIGKILL)
+            return
+        except (ProcessLookupError, PermissionError):
+            continue
+
+
+def _read_request(conn: socket.socket):
+    """Reads one length-prefixed JSON request and the fds attached to it."""
+    conn.settimeout(REQUEST_READ_TIMEOUT_SECONDS)
+    header, fds, _, _ = socket.recv_fds(conn, 4, MAX_PASSED_FDS)
+    while len(header) < 4:
+        chunk = conn.recv(4 - len(header))
+        if not chunk:
+            raise ConnectionError("Client closed connection while sending request header")
+        header += chunk
+    (length,) = struct.unpack(">I", header)
+    payload = bytearray()
+    while len(payload) < length:
+        chunk = conn.recv(min(length - len(payload), 1 << 20))
+        if not chunk:
+            raise ConnectionError("Client closed connection while sending request")
+        payload += chunk
+    conn.settimeout(None)
+    return json.loads(payload.decode("utf-8")), fds
+
+
+def _send_message(conn: socket.socket, message: Dict[str, Any]):
+    try:
+        conn.sendall((json.dumps(message) + "\n").encode("utf-8"))
+    except OSError:
+        pass # Client went away; nothing left to report to
+
+
+def serve(socket_path: str, preload: List[str]):
+    """
+    Runs the fork server loop. Returns (request, fds) in a forked child so the caller
+    can execute the script outside of the server's stack; never returns in the server.
+    """
+    preloaded: set = set()
+    for module_name in preload:
+        _preload(module_name, preloaded)
+
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(socket_path)
+    os.chmod(socket_path, 0o600)
+    listener.listen(64)
+
+    # SIGCHLD only writes to the wake-up socket; children are reaped in the loop
+    wake_r, wake_w = socket.socketpair()
+    wake_r.setblocking(False)
+    wake_w.setblocking(False)
+    signal.set_wakeup_fd(wake_w.fileno())
+    signal.signal(signal.SIGCHLD, lambda signum, frame: None)
+
+    sel = selectors.DefaultSelector()
+    sel.register(listener, selectors.EVENT_READ, "accept")
+    sel.register(wake_r, selectors.EVENT_READ, "sigchld")
+    sel.register(sys.stdin.fileno(), selectors.EVENT_READ, "parent")
+
+    children: Dict[int, socket.socket] = {} # pid -> client connection
+    conn_pids: Dict[socket.socket, int] = {}
+
+    def shutdown():
+        for pid in list(children):
+            kill_run(pid)
+        try: os.unlink(socket_path)
+        except OSError: pass
+        os._exit(0)
+
+    while True:
+        for key, _ in sel.select():
+            if key.data == "parent":
+                # The worker holds our stdin; EOF means it has gone away
+                if not os.read(key.fd, 4096):
+                    shutdown()
+
+            elif key.data == "sigchld":
+                try:
+                    while wake_r.recv(4096):
+                        pass
+                except (BlockingIOError, InterruptedError):
+                    pass
+                while True:
+                    try:
+                        pid, status = os.waitpid(-1, os.WNOHANG)
+                    except ChildProcessError:
+                        break
+                    if pid == 0:
+                        break
+                    conn = children.pop(pid, None)
+                    if conn is not None:
+                        conn_pids.pop(conn, None)
+                        _send_message(conn, {"returncode": os.waitstatus_to_exitcode(status)})
+                        sel.unregister(conn)
+                        conn.close()
+
+            elif key.data == "accept":
+                conn, _ = listener.accept()
+                fds: List[int] = []
+                try:
+                    request, fds = _read_request(conn)
+                    for module_name in request.get("preload") or []:
+                        _preload(module_name, preloaded)
+                    pid = os.fork()
+                except Exception as e:
+                    for fd in fds:
+                        try: os.close(fd)
+                        except OSError: pass
+                    _send_message(conn, {"error": f"{type(e).__name__}: {e}"})
+                    conn.close()
+                    continue
+
+                if pid == 0:
+                    # Child: drop every server resource before running the script
+                    signal.set_wakeup_fd(-1)
+                    signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+                    sel.close()
+                    for sock in [listener, wake_r, wake_w, conn, *conn_pids]:
+                        sock.close()
+                    return request, fds
+
+                for fd in fds:
+                    os.close(fd)
+                children[pid] = conn
+                conn_pids[conn] = pid
+                sel.register(conn, selectors.EVENT_READ, "client")
+                _send_message(conn, {"pid": pid})
+
+            else:
+                # The only thing a client sends after the request is EOF: it gave up on the run
+                conn = key.fileobj
+                try:
+                    data = conn.recv(4096)
+                except OSError:
+                    data = b""
+                if not data:
+                    pid = conn_pids.pop(conn, None)
+                    if pid is not None:
+                        kill_run(pid)
+                        # Keep the pid in children so it is still reaped, but stop reporting to the client
+                        children[pid] = None
+                    sel.unregister(conn)
+                    conn.close()
+
+
+def run_child(request: Dict[str, Any], fds: List[int]):
+    """Turns the forked child into the scraper process described by request and runs the script."""
+    import runpy
+
+    # Own process group, so killing the run also kills anything the script spawned
+    os.setsid()
+
+    # Move the passed fds out of the way first so placing one can't clobber another
+    first_spare_fd = 10 + len(fds)
+    moved = []
+    for fd in fds:
+        moved.append(fcntl.fcntl(fd, fcntl.F_DUPFD_CLOEXEC, first_spare_fd))
+        os.close(fd)
+    devnull = os.open(os.devnull, os.O_RDONLY)
+    os.dup2(devnull, 0)
+    for target, fd in enumerate(moved, start=1):
+        os.dup2(fd, target) # stdout, stderr, then extra channels from fd 3 up
+    for fd in [devnull, *moved]:
+        if fd > len(moved):
+            os.close(fd)
+
+    os.chdir(request["cwd"])
+    os.environ.clear()
+    os.environ.update(request["env"])
+
+    # Fresh UTF-8 streams on the new fds, matching a subprocess started with PYTHONIOENCODING=utf-8
+    sys.stdin = open(0, "r", encoding="utf-8", closefd=False)
+    sys.stdout = open(1, "w", encoding="utf-8", closefd=False)
+    sys.stderr = open(2, "w", encoding="utf-8", buffering=1, closefd=False)
+
+    # Siblings must not share the server's random state
+    if "random" in sys.modules:
+        sys.modules["random"].seed()
+
+    script_path = request["script_path"]
+    sys.argv = [script_path, *request.get("args", [])]
+    sys.path[0] = os.path.dirname(os.path.abspath(script_path))
+    runpy.run_path(script_path, run_name="__main__")
+
+
+# --- Client ---
+
+class ForkedProcess:
+    """Popen-like handle for a script process started by the fork server."""
+
+    def __init__(self, sock: socket.socket, pid: int, stdout, stderr):
+        self._sock = sock
+        self._buffer = b""
+        self.pid = pid
+        self.stdout = stdout
+        self.stderr = stderr
+        self.returncode: Optional[int] = None
+
+    def _read_messages(self, timeout: Optional[float]):
+        readable, _, _ = select.select([self._sock], [], [], timeout)
+        if not readable:
+            return
+        data = self._sock.recv(4096)
+        if not data:
+            # Server died before reporting; treat like a killed process
+            if self.returncode is None:
+                self.returncode = -signal.SIGKILL
+            return
+        self._buffer += data
+        while b"\n" in self._buffer:
+            line, self._buffer = self._buffer.split(b"\n", 1)
+            message = json.loads(line.decode("utf-8"))
+            if "returncode" in message:
+                self.returncode = message["returncode"]
+                self._sock.close()
+
+    def exit_fd(self) -> Optional[int]:
+        """An fd that becomes readable when the fork server reports the exit, or None once it has."""
+        return None if self.returncode is not None else self._sock.fileno()
+
+    def poll(self) -> Optional[int]:
+        if self.returncode is None:
+            self._read_messages(0)
+        return self.returncode
+
+    def wait(self, timeout: Optional[float] = None) -> int:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.returncode is None:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            if remaining == 0.0:
+                raise subprocess.TimeoutExpired(self.pid, timeout)
+            self._read_messages(remaining)
+        return self.returncode
+
+    def kill(self):
+        if self.returncode is None:
+            kill_run(self.pid)
+
+
+class ForkServerClient:
+    """Starts the fork server on first use and spawns scraper processes through it."""
+
+    def __init__(self, preload: List[str]):
+        self._preload = list(preload)
+        self._lock = threading.Lock()
+        self._server: Optional[subprocess.Popen] = None
+        self._socket_dir: Optional[str] = None # One directory for the client's lifetime, removed by close()
+        self._socket_path: Optional[str] = None
+        atexit.register(self.close)
+
+    def _ensure_server(self):
+        with self._lock:
+            if self._server is not None and self._server.poll() is None:
+                return
+            if self._socket_dir is None:
+                self._socket_dir = tempfile.mkdtemp(prefix="py-worker-forkserver-")
+                self._socket_path = os.path.join(self._socket_dir, "forkserver.sock")
+            # A server that died without cleaning up leaves its socket behind
+            try: os.unlink(self._socket_path)
+            except FileNotFoundError: pass
+            self._server = subprocess.Popen(
+                [sys.executable, os.path.abspath(__file__), self._socket_path, *self._preload],
+                stdin=subprocess.PIPE,
+                close_fds=True,
+            )
+            # Wait for the server to finish preloading and start listening
+            deadline = time.monotonic() + 60
+            while time.monotonic() < deadline:
+                if self._server.poll() is not None:
+                    raise RuntimeError(f"Fork server exited during startup with code {self._server.returncode}")
+                if os.path.exists(self._socket_path):
+                    return
+                time.sleep(0.05)
+            self._server.kill()
+            raise RuntimeError("Fork server did not start listening within 60 seconds")
+
+    def close(self):
+        """Stops the fork server (its running children are killed) and removes the socket directory."""
+        with self._lock:
+            if self._server is not None and self._server.poll() is None:
+                # EOF on its stdin makes the server shut down
+                try: self._server.stdin.close()
+                except OSError: pass
+                try:
+                    self._server.wait(timeout=5)
+                except subprocess.TimeoutExpired:
+                    self._server.kill()
+                    self._server.wait()
+            self._server = None
+            if self._socket_dir is not None:
+                shutil.rmtree(self._socket_dir, ignore_errors=True)
+                self._socket_dir = self._socket_path = None
+
+    def spawn(self, script_path: str, args: List[str], cwd: str, env: Dict[str, str],
+              preload: Optional[List[str]] = None, extra_fds: Optional[List[int]] = None) -> ForkedProcess:
+        """
+        Forks a warm child that runs script_path with args; stdout/stderr are text pipes like Popen(text=True).
+        extra_fds are handed to the child as fds 3, 4, ...; the caller keeps (and closes) its own copies.
+        """
+        self._ensure_server()
+        stdout_r, stdout_w = os.pipe()
+        stderr_r, stderr_w = os.pipe()
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(self._socket_path)
+            payload = json.dumps({
+                "script_path": script_path,
+                "args": args,
+                "cwd": cwd,
+                "env": env,
+                "preload": preload or [],
+            }).encode("utf-8")
+            socket.send_fds(sock, [struct.pack(">I", len(payload))], [stdout_w, stderr_w, *(extra_fds or [])])
+            sock.sendall(payload)
+
+            # First reply is the child's pid (or an error)
+            buffer = b""
+            while b"\n" not in buffer:
+                chunk = sock.recv(4096)
+                if not chunk:
+                    raise RuntimeError("Fork server closed the connection before starting the run")
+                buffer += chunk
+            line, rest = buffer.split(b"\n", 1)
+            reply = json.loads(line.decode("utf-8"))
+            if "error" in reply:
+                raise RuntimeError(f"Fork server failed to start the run: {reply['error']}")
+        except Exception:
+            sock.close()
+            for fd in (stdout_r, stderr_r):
+                os.close(fd)
+            raise
+        finally:
+            # The child holds its own copies of the write ends
+            for fd in (stdout_w, stderr_w):
+                try: os.close(fd)
+                except OSError: pass
+
+        process = ForkedProcess(
+            sock, reply["pid"],
+            open(stdout_r, "r", encoding="utf-8", errors="strict"),
+            open(stderr_r, "r", encoding="utf-8", errors="strict"),
+        )
+        process._buffer = rest
+        return process
+
+
+if __name__ == "__main__":
+    # serve() only returns in forked children; the script then runs as if started with `python script.py ...`
+    run_child(*serve(sys.argv[1], sys.argv[2:]))
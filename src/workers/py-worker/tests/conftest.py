@@ -0,0 +1,22 @@
+import os
+import sys
+
+import pytest
+
+# The worker is a set of top-level modules run from its own directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+
+
+@pytest.fixture
+def pg_conn():
+    """A connection to a scratch Postgres (TEST_DATABASE_URL); tests using it are skipped without one."""
+    if not TEST_DATABASE_URL:
+        pytest.skip("TEST_DATABASE_URL is not set")
+    import psycopg2
+    conn = psycopg2.connect(TEST_DATABASE_URL)
+    try:
+        yield conn
+    finally:
+        conn.close()
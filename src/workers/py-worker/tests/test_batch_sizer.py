@@ -0,0 +1,58 @@
+import pytest
+
+import main
+
+
+@pytest.fixture
+def sizer(monkeypatch):
+    """A BatchSizer starting at 100 rows, bounded to 20-5000 and tuned for 2 s commits."""
+    monkeypatch.setattr(main, "INGEST_BATCH_SIZE", 100)
+    monkeypatch.setattr(main, "WORKER_WRITE_BATCH_MIN", 20)
+    monkeypatch.setattr(main, "WORKER_WRITE_BATCH_MAX", 5000)
+    monkeypatch.setattr(main, "WORKER_WRITE_TARGET_MS", 2000.0)
+    monkeypatch.setattr(main, "WORKER_WRITE_FLUSH_MIN_SECONDS", 1.0)
+    monkeypatch.setattr(main, "WORKER_WRITE_FLUSH_MAX_SECONDS", 15.0)
+    return main.BatchSizer("run-1")
+
+
+def test_fast_commits_grow_the_batch_at_most_twofold(sizer):
+    sizes = []
+    for _ in range(4):
+        sizer.record(sizer.batch_size, sizer.batch_size * 0.0001)
+        sizes.append(sizer.batch_size)
+    assert sizes == [200, 400, 800, 1600]
+
+
+def test_slow_commits_shrink_the_batch_down_to_the_minimum(sizer):
+    sizer.record(100, 4.0) # 40 ms per row: 50 rows fit in the target
+    assert sizer.batch_size == 50
+    sizer.record(50, 50.0)
+    assert sizer.batch_size == 20
+
+
+def test_partial_batches_do_not_grow_the_batch(sizer):
+    sizer.record(10, 0.001)
+    assert sizer.batch_size == 100
+
+
+def test_timeout_halves_the_batch_and_caps_later_growth(sizer):
+    sizer.record(100, 0.01)
+    sizer.record(200, 0.02)
+    assert sizer.batch_size == 400
+    sizer.on_timeout(400)
+    assert sizer.batch_size == 200
+    for _ in range(5):
+        sizer.record(sizer.batch_size, 0.001)
+    assert sizer.batch_size == 300 # 3/4 of the size that timed out
+    assert sizer.timeouts == 1
+    assert (sizer.smallest, sizer.largest) == (100, 400)
+
+
+def test_flush_interval_follows_commit_latency_within_bounds(sizer):
+    sizer.record(100, 0.1)
+    assert sizer.flush_interval == 1.0
+    sizer.record(100, 2.0)
+    assert sizer.flush_interval == pytest.approx(4 * (0.1 + 0.3 * 1.9))
+    for _ in range(10):
+        sizer.record(sizer.batch_size, 10.0)
+    assert sizer.flush_interval == 15.0
@@ -0,0 +1,83 @@
+import io
+import uuid
+from datetime import datetime, timezone, timedelta
+from decimal import Decimal
+
+import psycopg2.extras
+
+import main
+from bench_ingest import TEMP_TABLE_SQL
+
+
+class RecordingCursor:
+    def __init__(self):
+        self.sql = None
+        self.data = None
+
+    def copy_expert(self, sql, buf):
+        self.sql, self.data = sql, buf.read()
+
+
+def copy_text(rows):
+    cur = RecordingCursor()
+    main.copy_scraped_rows(cur, rows)
+    return cur.data
+
+
+def test_copy_text_escapes_special_characters():
+    assert copy_text([("a\\b", "c\td", "e\nf", "g\rh", None, "\\N")]) == "a\\\\b\tc\\td\te\\nf\tg\\rh\t\\N\t\\\\N\n"
+
+
+def test_copy_text_uses_str_of_values():
+    scraped_at = datetime(2024, 5, 1, 12, 30, 15, 250000, tzinfo=timezone.utc)
+    product_id = uuid.UUID("12345678-1234-5678-1234-567812345678")
+    assert copy_text([(Decimal("19.90"), 9.5, scraped_at, product_id)]) == (
+        "19.90\t9.5\t2024-05-01 12:30:15.250000+00:00\t12345678-1234-5678-1234-567812345678\n")
+
+
+def test_copy_uses_the_insert_column_order():
+    cur = RecordingCursor()
+    main.copy_scraped_rows(cur, [])
+    assert cur.sql == main.COPY_SCRAPED_DATA_SQL
+    assert cur.sql.index("(user_id, competitor_id, name, price,") > 0
+
+
+def tricky_rows():
+    user_id, competitor_id = str(uuid.uuid4()), str(uuid.uuid4())
+    scraped_at = datetime(2024, 5, 1, 12, 30, 15, 250000, tzinfo=timezone(timedelta(hours=2)))
+    names = ["plain", "back\\slash", "tab\there", "new\nline", "carriage\rreturn", "\\N", "\\t literal",
+             "trailing backslash \\", "ünïcödé €", "quote ' and \" and ,"]
+    rows = []
+    for i, name in enumerate(names):
+        rows.append((user_id, competitor_id, name, Decimal("19.90") if i % 2 else 1234.5, "SEK",
+                     None if i % 3 == 0 else f"https://shop.example.com/p/{i}?a=1&b=\\2", None,
+                     f"SKU\t{i}", None if i % 4 == 0 else "Brand\\X", "\\N" if i == 5 else None,
+                     scraped_at, uuid.uuid4() if i % 2 else None))
+    return rows
+
+
+def fetch_rows(conn):
+    with conn.cursor() as cur:
+        cur.execute(f"SELECT {', '.join(main.SCRAPED_DATA_COLUMNS)} FROM temp_competitors_scraped_data ORDER BY name")
+        return cur.fetchall()
+
+
+def test_copy_round_trip_matches_insert(pg_conn):
+    psycopg2.extras.register_uuid()
+    rows = tricky_rows()
+    with pg_conn.cursor() as cur:
+        cur.execute(TEMP_TABLE_SQL)
+        psycopg2.extras.execute_values(
+            cur, f"INSERT INTO temp_competitors_scraped_data ({', '.join(main.SCRAPED_DATA_COLUMNS)}) VALUES %s", rows)
+    inserted = fetch_rows(pg_conn)
+    with pg_conn.cursor() as cur:
+        cur.execute("TRUNCATE temp_competitors_scraped_data")
+        main.copy_scraped_rows(cur, rows)
+    copied = fetch_rows(pg_conn)
+
+    assert copied == inserted
+    assert len(copied) == len(rows)
+    by_name = {row[2]: row for row in copied}
+    assert by_name["new\nline"][7] == "SKU\t3"
+    assert by_name["\\N"][9] == "\\N"  # The string, not NULL
+    assert by_name["plain"][9] is None
@@ -0,0 +1,66 @@
+import threading
+import time
+
+import main
+
+
+class BrandsConnection:
+    """Answers the active_brands probe and load with canned rows, slowly enough for threads to overlap."""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.loads = 0
+        self._lock = threading.Lock()
+
+    def cursor(self, cursor_factory=None):
+        return BrandsCursor(self)
+
+
+class BrandsCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self._rows = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params):
+        if sql.startswith("SELECT count(*)"):
+            self._rows = [(1, 1, "2026-01-01")]
+        else:
+            time.sleep(self.conn.delay)
+            with self.conn._lock:
+                self.conn.loads += 1
+            self._rows = [{"id": 1, "name": f"Brand of {params['user_id']}"}]
+
+    def fetchone(self):
+        return self._rows[0]
+
+    def fetchall(self):
+        return self._rows
+
+
+def test_concurrent_gets_load_once_and_leave_no_key_locks():
+    cache = main.FilterDataCache(1 << 20, 60)
+    conn = BrandsConnection(delay=0.05)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get(conn, "active_brands", "u1"))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert conn.loads == 1
+    assert results == [(["Brand of u1"], [1])] * 4
+    assert cache._key_locks == {}
+
+
+def test_key_locks_do_not_grow_with_users():
+    cache = main.FilterDataCache(400, 60) # Room for about one entry: every new user evicts the last
+    conn = BrandsConnection()
+    for i in range(200):
+        cache.get(conn, "active_brands", f"user-{i}")
+    assert len(cache._entries) <= 1
+    assert cache._key_locks == {}
@@ -0,0 +1,99 @@
+import uuid
+
+import psycopg2
+import pytest
+
+import main
+from conftest import TEST_DATABASE_URL
+
+SCRAPER_RUNS_SQL = """
+    DROP SCHEMA IF EXISTS prepared_test CASCADE;
+    CREATE SCHEMA prepared_test;
+    CREATE TABLE prepared_test.scraper_runs (
+        id uuid PRIMARY KEY,
+        status text,
+        completed_at timestamp with time zone,
+        product_count integer,
+        current_batch integer,
+        total_batches integer,
+        current_phase integer,
+        error_message text,
+        progress_messages text[],
+        execution_time_ms bigint,
+        products_per_second numeric(10,2)
+    );
+"""
+
+
+@pytest.fixture
+def worker_conn(pg_conn, monkeypatch):
+    """A WorkerConnection with prepared statements on, seeing a scratch scraper_runs table."""
+    monkeypatch.setattr(main, "WORKER_PREPARED_STATEMENTS", True)
+    with pg_conn.cursor() as cur:
+        cur.execute(SCRAPER_RUNS_SQL)
+    pg_conn.commit()
+    conn = psycopg2.connect(TEST_DATABASE_URL, connection_factory=main.WorkerConnection,
+                            options="-c search_path=prepared_test")
+    try:
+        yield conn
+    finally:
+        conn.close()
+        with pg_conn.cursor() as cur:
+            cur.execute("DROP SCHEMA prepared_test CASCADE")
+        pg_conn.commit()
+
+
+def server_prepared(conn):
+    with conn.cursor() as cur:
+        cur.execute("SELECT name FROM pg_prepared_statements")
+        names = {row[0] for row in cur.fetchall()}
+    conn.rollback()
+    return names
+
+
+def drop_behind_worker(conn):
+    """What DISCARD ALL or a pooler handing over another backend looks like to the worker."""
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        cur.execute("DEALLOCATE ALL")
+    conn.autocommit = False
+
+
+def update_run(conn, run_id, product_count):
+    main.execute_run_statements(conn, main.run_status_statements(run_id, "running", product_count=product_count), [run_id])
+    with conn.cursor() as cur:
+        cur.execute("SELECT status, product_count FROM scraper_runs WHERE id = %s", (run_id,))
+        row = cur.fetchone()
+    conn.rollback()
+    return row
+
+
+def test_statements_are_prepared_again_after_deallocate_all(worker_conn):
+    run_id = str(uuid.uuid4())
+    with worker_conn.cursor() as cur:
+        cur.execute("INSERT INTO scraper_runs (id, status) VALUES (%s, 'pending')", (run_id,))
+    worker_conn.commit()
+
+    assert update_run(worker_conn, run_id, 1) == ("running", 1)
+    assert worker_conn.prepared_statements == {"worker_run_progress"}
+    assert server_prepared(worker_conn) == {"worker_run_progress"}
+
+    drop_behind_worker(worker_conn)
+    assert update_run(worker_conn, run_id, 2) == ("running", 2)
+    assert worker_conn.prepared_statements_lost == 1
+    assert worker_conn.prepared_enabled
+    assert server_prepared(worker_conn) == {"worker_run_progress"}
+
+    # Losing them again turns them off for this connection only
+    drop_behind_worker(worker_conn)
+    assert update_run(worker_conn, run_id, 3) == ("running", 3)
+    assert not worker_conn.prepared_enabled
+    assert server_prepared(worker_conn) == set()
+    assert update_run(worker_conn, run_id, 4) == ("running", 4)
+    assert server_prepared(worker_conn) == set()
+
+    other = psycopg2.connect(TEST_DATABASE_URL, connection_factory=main.WorkerConnection)
+    try:
+        assert other.prepared_enabled
+    finally:
+        other.close()
@@ -0,0 +1,74 @@
+import main
+
+
+def own_index(*rows):
+    return main.OwnProductIndex([{"ean": ean, "sku": sku, "brand": brand, "brand_id": brand_id}
+                                 for ean, sku, brand, brand_id in rows])
+
+
+def test_active_brands_compare_trimmed_and_case_insensitive():
+    product_filter = main.ProductFilter(active_brand_names=["Acme", "Globex "])
+    assert product_filter.accepts({"brand": " ACME"})
+    assert product_filter.accepts({"brand": "globex"})
+    assert not product_filter.accepts({"brand": "Initech"})
+    assert not product_filter.accepts({"brand": None})
+    assert product_filter.filtered_brand == 2
+
+
+def test_inactive_filter_accepts_everything():
+    product_filter = main.ProductFilter()
+    assert not product_filter.active
+    assert product_filter.accepts({"brand": "Anything"})
+
+
+def test_own_products_match_on_ean_sku_brand_or_sku_of_an_active_brand():
+    index = own_index(
+        ("4006381333931", None, None, None),
+        (None, "AB-12", "Acme", None),
+        (None, "X 9", None, "b-1"),
+        (None, "Y-7", None, "b-2"),
+    )
+    product_filter = main.ProductFilter(active_brand_ids=["b-1"], own_index=index)
+    assert product_filter.accepts({"ean": " 4006381333931 "})
+    assert product_filter.accepts({"sku": "ab 12", "brand": "ACME"})
+    assert not product_filter.accepts({"sku": "ab 12", "brand": "Globex"})
+    assert product_filter.accepts({"sku": "x-9", "brand": "Whoever"})
+    assert not product_filter.accepts({"sku": "Y7"}) # Own product, but its brand is not active
+    assert not product_filter.accepts({"name": "No keys"})
+    assert product_filter.filtered_not_own == 3
+
+
+def test_all_own_products_seen_once_every_matchable_product_was_accepted():
+    index = own_index(("111", None, None, None), (None, "S-1", "Acme", None), (None, None, "Acme", None))
+    assert index.size == 2 # The last row cannot be matched by any rule
+    product_filter = main.ProductFilter(own_index=index)
+    product_filter.accepts({"ean": "111"})
+    product_filter.accepts({"ean": "111"})
+    assert not product_filter.all_own_products_seen
+    product_filter.accepts({"sku": "s1", "brand": "acme"})
+    assert product_filter.all_own_products_seen
+
+
+def test_deduplicator_ignores_url_fragments_and_trailing_slashes():
+    dedup = main.ProductDeduplicator("url")
+    assert not dedup.is_duplicate({"url": "https://shop.example/p/1"})
+    assert dedup.is_duplicate({"url": "https://shop.example/p/1/#reviews"})
+    assert not dedup.is_duplicate({"url": "https://shop.example/p/2"})
+    assert dedup.duplicates == 1
+
+
+def test_deduplicator_compares_all_key_fields():
+    dedup = main.ProductDeduplicator("ean+sku")
+    assert not dedup.is_duplicate({"ean": "1", "sku": "A"})
+    assert not dedup.is_duplicate({"ean": "1", "sku": "B"})
+    assert dedup.is_duplicate({"ean": " 1", "sku": "A "})
+
+
+def test_products_without_key_values_and_dedup_off_are_never_merged():
+    dedup = main.ProductDeduplicator("url+ean")
+    assert not dedup.is_duplicate({"name": "Plain"})
+    assert not dedup.is_duplicate({"name": "Plain"})
+    off = main.ProductDeduplicator("off")
+    assert not off.is_duplicate({"url": "https://shop.example/p/1"})
+    assert not off.is_duplicate({"url": "https://shop.example/p/1"})
+    assert dedup.duplicates == off.duplicates == 0
@@ -0,0 +1,69 @@
+import psycopg2
+import pytest
+
+import main
+
+
+class StatementTimeout(psycopg2.Error):
+    pgcode = psycopg2.errorcodes.QUERY_CANCELED
+
+
+class SlowTableConnection:
+    """Accepts COPYs of at most max_rows rows; larger ones hit statement_timeout."""
+
+    def __init__(self, max_rows):
+        self.max_rows = max_rows
+        self.copies = []
+        self.rows = 0
+
+    def cursor(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def copy_expert(self, sql, buf):
+        rows = buf.read().count("\n")
+        self.copies.append(rows)
+        if rows > self.max_rows:
+            raise StatementTimeout("canceling statement due to statement timeout")
+        self.rows += rows
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+@pytest.fixture
+def copy_mode(monkeypatch):
+    monkeypatch.setattr(main, "WORKER_INGEST_MODE", "copy")
+    monkeypatch.setattr(main, "INGEST_BATCH_SIZE", 400)
+    monkeypatch.setattr(main, "validate_and_reconnect_if_needed", lambda conn: conn)
+    monkeypatch.setattr(main.time, "sleep", lambda seconds: None)
+
+
+def products(count):
+    return [{"name": f"Product {i}", "price": 10 + i, "sku": f"SKU-{i}"} for i in range(count)]
+
+
+def test_statement_timeouts_shrink_the_chunk_without_using_up_attempts(copy_mode):
+    conn = SlowTableConnection(max_rows=25)
+    sizer = main.BatchSizer("run")
+    # 400 -> 200 -> 100 -> 50 -> 25: four timeouts on the first chunk, more than MAX_RETRIES
+    assert main.save_temp_competitors_scraped_data(conn, "run", "user", "competitor", products(1000), sizer=sizer) == 1000
+    assert conn.rows == 1000
+    assert conn.copies[:5] == [400, 200, 100, 50, 25]
+    assert sizer.batch_size <= 25
+
+
+def test_rows_that_cannot_be_written_are_reported(copy_mode):
+    conn = SlowTableConnection(max_rows=main.WORKER_WRITE_BATCH_MIN - 1)
+    with pytest.raises(main.ProductsNotSavedError) as raised:
+        main.save_temp_competitors_scraped_data(conn, "run", "user", "competitor", products(100), sizer=main.BatchSizer("run"))
+    assert raised.value.inserted == 0
+    assert raised.value.not_saved == 100
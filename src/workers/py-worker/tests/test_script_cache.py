@@ -0,0 +1,56 @@
+import os
+import subprocess
+import sys
+
+import main
+
+SCRIPT = "print('hello from the cache')\n"
+
+
+def test_lookup_hits_only_for_the_updated_at_it_was_stored_for(tmp_path):
+    cache = main.ScriptCache(str(tmp_path), 1 << 20)
+    assert cache.lookup("s1", "t1") is None
+    stored = cache.store("s1", "t1", SCRIPT)
+    assert cache.lookup("s1", "t1") is stored
+    assert cache.lookup("s1", "t2") is None
+    assert cache.lookup("s2", "t1") is None
+
+
+def test_entries_run_from_bytecode_and_broken_scripts_from_source(tmp_path):
+    cache = main.ScriptCache(str(tmp_path), 1 << 20)
+    entry = cache.store("s1", "t1", SCRIPT)
+    assert entry.run_path.endswith(".pyc")
+    result = subprocess.run([sys.executable, entry.run_path], capture_output=True, text=True, check=True)
+    assert result.stdout == "hello from the cache\n"
+
+    broken = cache.store("s2", "t1", "def broken(:\n")
+    assert broken.run_path == broken.source_path
+
+
+def test_scrapers_with_the_same_source_share_one_entry(tmp_path):
+    cache = main.ScriptCache(str(tmp_path), 1 << 20)
+    first = cache.store("s1", "t1", SCRIPT)
+    second = cache.store("s2", "t9", SCRIPT)
+    assert second is first
+    assert first.pins == 2
+    assert len(os.listdir(tmp_path)) == 2 # One source and one bytecode file
+
+
+def test_pinned_entries_survive_eviction_until_released(tmp_path):
+    cache = main.ScriptCache(str(tmp_path), 1) # Every unpinned entry is over the bound
+    entry = cache.store("s1", "t1", SCRIPT)
+    assert os.path.exists(entry.run_path)
+    cache.release(entry)
+    assert not os.path.exists(entry.run_path)
+    assert not os.path.exists(entry.source_path)
+    assert cache.lookup("s1", "t1") is None
+
+
+def test_a_new_process_adopts_existing_files(tmp_path):
+    entry = main.ScriptCache(str(tmp_path), 1 << 20).store("s1", "t1", SCRIPT)
+    cache = main.ScriptCache(str(tmp_path), 1 << 20)
+    assert cache.lookup("s1", "t1") is None # Scraper bindings are not persisted
+    adopted = cache.store("s1", "t1", SCRIPT)
+    assert adopted.digest == entry.digest
+    assert adopted.run_path == entry.run_path
+    assert cache._total_bytes == adopted.size